@@ -16,6 +16,7 @@ setup(
     url='https://github.com/fdieulle/treebuilder',
     packages=find_packages(),
     install_requires=['sly'],
+    extras_require={'lxml': ['lxml'], 'arrow': ['pyarrow'], 'zstd': ['zstandard']},
     zip_safe=False,
     classifiers=[
         "License :: OSI Approved :: MIT License",
@@ -114,4 +114,32 @@ def test_attribute():
     tokens = [{'type': tok.type, 'value': tok.value} for tok in lexer.tokenize(syntax)]
     
     assert ['ATTR', 'ID', 'EQ', 'ID'] == [tok['type'] for tok in tokens]
-    assert ['@', 'Name', '=', 'Value'] == [tok['value'] for tok in tokens]
\ No newline at end of file
+    assert ['@', 'Name', '=', 'Value'] == [tok['value'] for tok in tokens]
+
+def test_comparison_operators():
+    lexer = FilterLexer()
+
+    syntax = 'a<1 and b<=2 and c>3 and d>=-4.5'
+    tokens = [{'type': tok.type, 'value': tok.value} for tok in lexer.tokenize(syntax)]
+    
+    assert ['ID', 'LT', 'NUMBER', 'AND', 'ID', 'LE', 'NUMBER', 'AND', 'ID', 'GT', 'NUMBER', 'AND', 'ID', 'GE', 'NUMBER'] == [tok['type'] for tok in tokens]
+    assert ['a', '<', '1', 'and', 'b', '<=', '2', 'and', 'c', '>', '3', 'and', 'd', '>=', '-4.5'] == [tok['value'] for tok in tokens]
+
+
+def test_in_and_not_operators():
+    lexer = FilterLexer()
+
+    syntax = 'not Name in (foo, "bar", 10)'
+    tokens = [{'type': tok.type, 'value': tok.value} for tok in lexer.tokenize(syntax)]
+    
+    assert ['NOT', 'ID', 'IN', 'LPAREN', 'ID', 'COMMA', 'TEXT', 'COMMA', 'NUMBER', 'RPAREN'] == [tok['type'] for tok in tokens]
+    assert ['not', 'Name', 'in', '(', 'foo', ',', 'bar', ',', '10', ')'] == [tok['value'] for tok in tokens]
+
+
+def test_in_and_not_as_names():
+    lexer = FilterLexer()
+
+    syntax = 'in=1 and not != x and not in (1) and status=not'
+    tokens = [{'type': tok.type, 'value': tok.value} for tok in lexer.tokenize(syntax)]
+    
+    assert ['ID', 'EQ', 'NUMBER', 'AND', 'ID', 'NE', 'ID', 'AND', 'ID', 'IN', 'LPAREN', 'NUMBER', 'RPAREN', 'AND', 'ID', 'EQ', 'ID'] == [tok['type'] for tok in tokens]
@@ -115,3 +115,129 @@ class TestFilterParser:
         syntax = '@title=other and @xsi:type = BarType'
         result = parser.parse(self.lexer.tokenize(syntax))
         assert [False, False, True] == result
+
+    def test_numbers(self):
+        parser = FilterParser()
+        parser.items = [
+            { 'Name': 'foo', 'Value': 10, 'Price': 9.99 },
+            { 'Name': 'bar', 'Value': '20', 'Price': '19.99' },
+            { 'Name': 'other', 'Value': 'twenty' }
+        ]
+
+        syntax = 'Value=10'
+        result = parser.parse(self.lexer.tokenize(syntax))
+        assert [True, False, False] == result
+
+        syntax = 'Value=20'
+        result = parser.parse(self.lexer.tokenize(syntax))
+        assert [False, True, False] == result
+
+        syntax = 'Price=9.99 or Price=19.99'
+        result = parser.parse(self.lexer.tokenize(syntax))
+        assert [True, True, False] == result
+
+        syntax = 'Value != 10'
+        result = parser.parse(self.lexer.tokenize(syntax))
+        assert [False, True, True] == result
+
+    def test_comparisons(self):
+        parser = FilterParser()
+        parser.items = [
+            { 'Name': 'foo', 'Value': 10, 'Price': 9.99 },
+            { 'Name': 'bar', 'Value': '20', 'Price': '19.99' },
+            { 'Name': 'other', 'Value': 'twenty' }
+        ]
+
+        syntax = 'Price > 10'
+        result = parser.parse(self.lexer.tokenize(syntax))
+        assert [False, True, False] == result
+
+        syntax = 'Price >= 9.99'
+        result = parser.parse(self.lexer.tokenize(syntax))
+        assert [True, True, False] == result
+
+        syntax = 'Value < 20'
+        result = parser.parse(self.lexer.tokenize(syntax))
+        assert [True, False, False] == result
+
+        syntax = 'Value <= 20 and Price < 15'
+        result = parser.parse(self.lexer.tokenize(syntax))
+        assert [True, False, False] == result
+
+        syntax = 'Name < foo'
+        result = parser.parse(self.lexer.tokenize(syntax))
+        assert [False, True, False] == result
+
+    def test_in_operator(self):
+        parser = FilterParser()
+        parser.items = self.items
+
+        syntax = 'Name in (foo, "bar")'
+        result = parser.parse(self.lexer.tokenize(syntax))
+        assert [True, True, False] == result
+
+        syntax = 'Value in (10, 30)'
+        result = parser.parse(self.lexer.tokenize(syntax))
+        assert [True, False, False] == result
+
+    def test_not_operator(self):
+        parser = FilterParser()
+        parser.items = self.items
+
+        syntax = 'not Name=foo'
+        result = parser.parse(self.lexer.tokenize(syntax))
+        assert [False, True, True] == result
+
+        syntax = 'not Name=foo and Value=20'
+        result = parser.parse(self.lexer.tokenize(syntax))
+        assert [False, True, True] == result
+
+        syntax = 'not (Name=foo or title=bar)'
+        result = parser.parse(self.lexer.tokenize(syntax))
+        assert [False, False, False] == result
+
+    def test_missing_attributes(self):
+        parser = FilterParser()
+        parser.items = [
+            { 'Name': 'foo', ATTRIBUTES: { 'lang': 'en' } },
+            { 'Name': 'bar' }
+        ]
+
+        syntax = '@lang=en'
+        result = parser.parse(self.lexer.tokenize(syntax))
+        assert [True, False] == result
+
+    def test_booleans_are_not_numbers(self):
+        parser = FilterParser()
+        parser.items = [
+            { 'in_stock': True },
+            { 'in_stock': 1 },
+            { 'in_stock': False },
+        ]
+
+        syntax = 'in_stock=1'
+        result = parser.parse(self.lexer.tokenize(syntax))
+        assert [False, True, False] == result
+
+        syntax = 'in_stock>0'
+        result = parser.parse(self.lexer.tokenize(syntax))
+        assert [False, True, False] == result
+
+        syntax = 'in_stock in (0, 1)'
+        result = parser.parse(self.lexer.tokenize(syntax))
+        assert [False, True, False] == result
+
+    def test_elements_named_as_keywords(self):
+        parser = FilterParser()
+        parser.items = [
+            { 'in': 'foo', 'not': '10' },
+            { 'in': 'bar', 'not': '20' },
+        ]
+
+        syntax = 'in=foo or not in (20)'
+        result = parser.parse(self.lexer.tokenize(syntax))
+        assert [True, True] == result
+
+        syntax = 'not in=bar'
+        result = parser.parse(self.lexer.tokenize(syntax))
+        assert [True, False] == result
@@ -0,0 +1,95 @@
+import gzip
+import os
+from treebuilder.TreeBuilder import TreeBuilder
+from treebuilder.SqliteTreeBuilder import SqliteTreeBuilder
+
+
+def __build_bookstore(builder):
+    builder.set('bookstore/@xmlns:xsi', 'http://www.w3.org/2001/XMLSchema-instance')
+    builder.expand('bookstore/book/title', ['Sapiens', 'Harry Potter', 'A Time of Mercy'])
+    builder.set('bookstore/book/@lang', 'en')
+    builder.expand('bookstore/book/price', [9.99, 19.99, 29.99])
+    builder.set('bookstore/book[price>10]/@lang', 'fr')
+    builder.cross('bookstore/book/copy', [1, 2])
+    builder.nest('bookstore/book/details/pages', [100, 200])
+    builder.set('bookstore/book/is_in_stock', True)
+    builder.set('bookstore/book[copy=2]/borrowers', [{'name': 'Bob'}, {'name': 'Alice'}])
+    builder.set('bookstore/book/borrowers/@active', True)
+    return builder
+
+
+def test_build_like_tree_builder():
+    expected = __build_bookstore(TreeBuilder())
+
+    with __build_bookstore(SqliteTreeBuilder()) as builder:
+        assert builder.root == expected.root
+
+        for xpath in ['bookstore/book/title', 'bookstore/book/@lang', 'bookstore/book[price>10]/copy',
+                      'bookstore/book/details', 'bookstore/book/borrowers/name', 'bookstore/book[title=Unknown]/copy']:
+            assert builder.get_items(xpath) == expected.get_items(xpath)
+        assert builder.get_items('bookstore/book/details', unlist=False) == expected.get_items('bookstore/book/details', unlist=False)
+
+        builder.set('bookstore/book[title=Sapiens]/tags', ['history', 'essay'])
+        expected.set('bookstore/book[title=Sapiens]/tags', ['history', 'essay'])
+        assert builder.get_items('bookstore/book/tags', unlist=False) == expected.get_items('bookstore/book/tags', unlist=False)
+
+
+def test_serializations_are_streamed_from_the_database(tmpdir):
+    expected = __build_bookstore(TreeBuilder())
+
+    with __build_bookstore(SqliteTreeBuilder()) as builder:
+        for name, pretty in [('bookstore.xml', True), ('bookstore.json', False), ('bookstore.xml.gz', True)]:
+            expected_file, test_file = os.path.join(tmpdir, f'expected_{name}'), os.path.join(tmpdir, name)
+            serialize = 'to_xml' if '.xml' in name else 'to_json'
+            getattr(expected, serialize)(expected_file, pretty=pretty)
+            getattr(builder, serialize)(test_file, pretty=pretty)
+
+            open_file = gzip.open if name.endswith('.gz') else open
+            with open_file(expected_file, mode='rb') as e, open_file(test_file, mode='rb') as t:
+                assert t.read() == e.read()
+
+
+def test_overwrite_node_list_with_a_value():
+    expected = TreeBuilder()
+    with SqliteTreeBuilder() as builder:
+        for b in [expected, builder]:
+            b.set('bookstore/book/details/pages', 100)
+            b.cross('bookstore/book/copy', [1, 2])
+            b.set('bookstore/book/details', 'none')
+
+        assert builder.root == expected.root
+
+
+def test_updated_entries_keep_their_position():
+    expected = TreeBuilder()
+    with SqliteTreeBuilder() as builder:
+        for b in [expected, builder]:
+            b.expand('bookstore/book/title', ['Sapiens', 'Harry Potter'])
+            b.set('bookstore/book/price', 9.99)
+            b.set('bookstore/book/is_in_stock', True)
+            b.set('bookstore/book[title=Sapiens]/price', 19.99)
+
+        assert [list(x) for x in builder.get_items('bookstore/book')] == [list(x) for x in expected.get_items('bookstore/book')]
+        assert builder.get_items('bookstore/book/price') == [19.99, 9.99]
+
+
+def test_database_is_reopened(tmpdir):
+    path = os.path.join(tmpdir, 'bookstore.sqlite')
+    expected = __build_bookstore(TreeBuilder())
+
+    __build_bookstore(SqliteTreeBuilder(path)).close()
+    with SqliteTreeBuilder(path) as builder:
+        assert builder.root == expected.root
+
+        builder.set('bookstore/book/@lang', 'de')
+        expected.set('bookstore/book/@lang', 'de')
+        assert builder.root == expected.root
+
+
+def test_temporary_database_is_removed():
+    builder = SqliteTreeBuilder()
+    path = builder._SqliteTreeBuilder__path
+    assert os.path.exists(path)
+
+    builder.close()
+    assert not os.path.exists(path)
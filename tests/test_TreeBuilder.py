@@ -1,10 +1,16 @@
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from itertools import repeat
+import copy
 import json
 import xml.etree.ElementTree as ET
 from treebuilder.constants import ATTRIBUTES, PARENT
 import os
+import subprocess
+import sys
+import pytest
 from treebuilder.TreeBuilder import TreeBuilder
+from treebuilder.cross import FactorizedCross
 from treebuilder.xml import to_xml_string
 
 
@@ -542,4 +548,590 @@ def test_node_no_parent_remains_with_cross():
     assert root['bookstore'][0]['book'][1]['details'][0][ATTRIBUTES]['lang'] == 'en'
     assert root['bookstore'][0]['book'][1]['details'][0]['copy_number'] == 1
     assert PARENT not in root['bookstore'][0]['book'][1]
-    assert len(root['bookstore'][0]['book']) == 2
\ No newline at end of file
+    assert len(root['bookstore'][0]['book']) == 2
+
+
+def test_get_items_does_not_modify_the_tree():
+    builder = TreeBuilder()
+
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+
+    assert builder.get_items('/bookstore/book/details/count') == [None, None]
+    assert builder.get_items('/bookstore/book[title=Dune]/title') == [None]
+    assert builder.get_items('/library/book/title') == [None]
+    assert 'library' not in builder.root
+    assert len(builder.root['bookstore'][0]['book']) == 2
+    assert all(['details' not in x for x in builder.root['bookstore'][0]['book']])
+
+
+def test_concurrent_queries_and_modifications(tmpdir):
+    builder = TreeBuilder()
+
+    # Wide enough levels so the reads are still walking them when a modification comes
+    titles = [f'Book {i}' for i in range(2000)]
+    prices = [float(i) for i in range(2000)]
+    builder.expand('/bookstore/book/title', titles)
+    builder.expand('/bookstore/book/@lang', ['en', 'fr'])
+    builder.expand('/bookstore/book/price', prices)
+
+    def query(i):
+        title = titles[i % len(titles)]
+        assert builder.get_items(f'/bookstore/book[title="{title}"]/price') == [float(i % len(titles))]
+        assert builder.get_items('/bookstore/book[@lang=fr]/title') == titles[1::2]
+        assert builder.get_items('/bookstore/book[@lang=en and title != "Book 0"]/title') == titles[2::2]
+        assert builder.aggregate('/bookstore/book/price', 'sum') == sum(prices)
+        assert builder.query('/bookstore/book/title', limit=10).fetch() == titles[0:10]
+        # A modification is seen on all the books or on none of them
+        assert builder.aggregate(f'/bookstore/book/stock_{i % 50}', 'count') in (0, len(titles))
+        if i % 10 == 0:
+            builder.to_json(os.path.join(tmpdir, f'bookstore_{i}.json'))
+        return True
+
+    def modify(i):
+        # The read nodes gain entries and attributes, and their levels are rebuilt
+        builder.set(f'/bookstore/book/stock_{i}', i)
+        builder.set(f'/bookstore/book/@tag_{i}', 'new')
+        builder.expand('/bookstore/book/price', prices)
+        builder.set(f'/bookstore/book/details/count_{i}', i)
+        builder.set(f'/library/shelf/book_{i}/title', titles[i])
+        builder.cross(f'/library/shelf/book_{i}/copy', [1, 2])
+        return True
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        queries = [executor.submit(query, i) for i in range(100)]
+        modifications = [executor.submit(modify, i) for i in range(50)]
+        assert all([x.result() for x in queries + modifications])
+
+    for book in builder.root['bookstore'][0]['book']:
+        assert [book[f'stock_{i}'] for i in range(50)] == list(range(50))
+
+    shelf = builder.root['library'][0]['shelf'][0]
+    for i in range(50):
+        assert [x['copy'] for x in shelf[f'book_{i}']] == [1, 2]
+        assert [x['title'] for x in shelf[f'book_{i}']] == [titles[i], titles[i]]
+
+    stack = [builder.root]
+    while len(stack) > 0:
+        node = stack.pop()
+        assert PARENT not in node
+        [stack.extend(x) for x in node.values() if isinstance(x, list)]
+
+
+def test_reads_dont_wait_for_the_modifications():
+    builder, other = TreeBuilder(), TreeBuilder()
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+    other.expand('/bookstore/book/title', ['Sapiens'])
+    builder.set('/bookstore/book/price', 9.99)
+    # The first read after a modification publishes its snapshot
+    assert builder.get_items('/bookstore/book/price') == [9.99, 9.99]
+
+    # The lock is held as by a long modification, the next reads use the published snapshot
+    executor = ThreadPoolExecutor(max_workers=1)
+    with builder._TreeBuilder__lock:
+        assert executor.submit(builder.get_items, '/bookstore/book/title').result(timeout=5) == ['Sapiens', 'Harry Potter']
+        assert executor.submit(builder.aggregate, '/bookstore/book/price', 'sum').result(timeout=5) == 2 * 9.99
+        assert executor.submit(lambda: builder.query('/bookstore/book/title').fetch()).result(timeout=5) == ['Sapiens', 'Harry Potter']
+        assert len(executor.submit(other.diff, builder).result(timeout=5)) == 2
+    executor.shutdown()
+
+
+def test_snapshot_and_rollback():
+    builder = TreeBuilder()
+
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+    builder.set('/bookstore/book/@lang', 'en')
+    builder.set('/bookstore/book/details/published_year', 2014)
+    builder.set('/library/name', 'City library')
+    expected = copy.deepcopy(builder.root)
+
+    snapshot = builder.snapshot()
+    assert snapshot.root is builder.root
+
+    builder.cross('/bookstore/book/copy_number', [1, 2])
+    builder.set('/bookstore/book[title=Sapiens]/@lang', 'fr')
+    builder.set('/bookstore/book/details/published_year', 2005)
+    builder.expand('/bookstore/book/details/copy_number', [1, 2, 3, 4], from_ancestor='book')
+
+    assert snapshot.root == expected
+    assert len(builder.root['bookstore'][0]['book']) == 4
+    assert builder.get_items('/bookstore/book/@lang') == ['fr', 'en', 'fr', 'en']
+
+    # Not modified paths are shared
+    assert builder.root['library'] is snapshot.root['library']
+
+    builder.rollback(snapshot)
+    assert builder.root == expected
+    assert builder.get_items('/bookstore/book/title') == ['Sapiens', 'Harry Potter']
+
+    # The snapshot remains valid after a rollback
+    builder.set('/bookstore/book/price', 9.99)
+    assert snapshot.root == expected
+    builder.rollback(snapshot)
+    assert builder.root == expected
+
+
+def test_nested_snapshots():
+    builder = TreeBuilder()
+
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+    first = builder.snapshot()
+    builder.set('/bookstore/book/price', 9.99)
+    second = builder.snapshot()
+    builder.cross('/bookstore/book/copy_number', [1, 2])
+
+    builder.rollback(second)
+    assert builder.get_items('/bookstore/book/price') == [9.99, 9.99]
+    assert builder.get_items('/bookstore/book/copy_number') == [None, None]
+
+    builder.rollback(first)
+    assert builder.get_items('/bookstore/book/price') == [None, None]
+
+
+def test_expand_from_ancestor_with_several_parents():
+    builder = TreeBuilder()
+
+    builder.expand('/stores/store/name', ['A', 'B'])
+    builder.expand('/stores/store[name=A]/book/title', ['a1', 'a2'])
+    builder.expand('/stores/store[name=B]/book/title', ['b1'])
+    builder.expand('/stores/store/book/details/copy_number', [1, 2, 3, 4, 5], from_ancestor='book')
+
+    books = builder.root['stores'][0]['store'][0]['book']
+    assert [x['title'] for x in books] == ['a1', 'a2', 'a1', 'a2']
+    assert [x['details'][0]['copy_number'] for x in books] == [1, 2, 3, 4]
+    books = builder.root['stores'][0]['store'][1]['book']
+    assert [x['title'] for x in books] == ['b1']
+    assert [x['details'][0]['copy_number'] for x in books] == [5]
+
+
+def test_cross_from_ancestor_with_several_parents():
+    builder = TreeBuilder()
+
+    builder.expand('/stores/store/name', ['A', 'B'])
+    builder.expand('/stores/store[name=A]/book/title', ['a1', 'a2'])
+    builder.expand('/stores/store[name=B]/book/title', ['b1'])
+    builder.cross('/stores/store/book/details/copy_number', [1, 2], from_ancestor='book')
+
+    books = builder.root['stores'][0]['store'][0]['book']
+    assert [x['title'] for x in books] == ['a1', 'a2', 'a1', 'a2']
+    assert [x['details'][0]['copy_number'] for x in books] == [1, 1, 2, 2]
+    books = builder.root['stores'][0]['store'][1]['book']
+    assert [x['title'] for x in books] == ['b1', 'b1']
+    assert [x['details'][0]['copy_number'] for x in books] == [1, 2]
+
+
+def test_set_with_numeric_filters():
+    builder = TreeBuilder()
+
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter', 'A Time of Mercy'])
+    builder.nest('/bookstore/book/price', [39.95, 9.99, 12.99])
+    builder.set('/bookstore/book[price > 10]/expensive', True)
+    builder.set('/bookstore/book[price <= 10]/expensive', False)
+
+    assert builder.get_items('/bookstore/book/expensive') == [True, False, True]
+    assert builder.get_items('/bookstore/book[price=9.99]/title') == ['Harry Potter']
+    assert builder.get_items('/bookstore/book[title in (Sapiens, "Harry Potter")]/price') == [39.95, 9.99]
+    assert builder.get_items('/bookstore/book[not price < 20]/title') == ['Sapiens']
+
+
+def __build_pipeline(builder):
+    builder.expand('/stores/store/name', ['A', 'B'])
+    builder.expand('/stores/store/book/title', ['Sapiens', 'Harry Potter', 'A Time of Mercy'])
+    builder.expand('/stores/store/book/id', [1, 2, 3, 4])
+    builder.set('/stores/store/book/@lang', 'en')
+    builder.nest('/stores/store/book/price', [39.95, 9.99])
+    builder.cross('/stores/store/book/copy_number', [1, 2])
+    builder.expand('/stores/store/book/@type', ['paper', 'ebook', 'audio'])
+    builder.set('/stores/store/book[price > 10]/expensive', True)
+    builder.set('/stores/store/book/details/count', 3)
+    builder.expand('/stores/store/book/details/year', [2014, 2005])
+    builder.cross('/stores/store/book/borrower/name', ['x', 'y'], from_ancestor='book')
+    builder.cross('/stores/store/book/empty', [])
+    builder.set('/stores/store/book/is_in_stock', True)
+    return builder
+
+
+def test_lazy_builder_gives_the_same_tree():
+    eager = __build_pipeline(TreeBuilder())
+    lazy = __build_pipeline(TreeBuilder(lazy=True))
+
+    assert lazy.root == eager.root
+    assert json.dumps(lazy.root) == json.dumps(eager.root)
+
+
+def test_lazy_builder_executes_on_read():
+    builder = TreeBuilder(lazy=True)
+
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+    builder.set('/bookstore/book/price', 9.99)
+    assert builder.get_items('/bookstore/book/title') == ['Sapiens', 'Harry Potter']
+
+    builder.cross('/bookstore/book/copy_number', [1, 2])
+    assert len(builder.root['bookstore'][0]['book']) == 4
+
+    snapshot = builder.snapshot()
+    builder.set('/bookstore/book/price', 19.99)
+    builder.rollback(snapshot)
+    assert builder.get_items('/bookstore/book/price') == [9.99, 9.99, 9.99, 9.99]
+
+
+def __build_crossed_tree(factorize):
+    builder = TreeBuilder()
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+    builder.set('/bookstore/book/@lang', 'en')
+    builder.cross('/bookstore/book/copy_number', [1, 2], factorize=factorize)
+    builder.cross('/bookstore/book/format', ['paper', 'ebook'], factorize=factorize)
+    builder.set('/bookstore/book/details/published_year', 2014)
+    builder.cross('/bookstore/book/details/shelf/id', ['A', 'B', 'C'], factorize=factorize)
+    return builder
+
+
+def test_factorized_cross(tmpdir):
+    factorized = __build_crossed_tree(True)
+    expected = __build_crossed_tree(False)
+
+    books = factorized.root['bookstore'][0]['book']
+    assert isinstance(books, FactorizedCross)
+    assert len(books) == 8
+
+    assert factorized.root == expected.root
+    assert factorized.get_items('/bookstore/book/format') == expected.get_items('/bookstore/book/format')
+    assert factorized.get_items('/bookstore/book[copy_number=2]/details/shelf/id') == ['A', 'B', 'C'] * 4
+
+    factorized_file, expected_file = os.path.join(tmpdir, 'factorized.xml'), os.path.join(tmpdir, 'expected.xml')
+    factorized.to_xml(factorized_file)
+    expected.to_xml(expected_file)
+    with open(factorized_file) as f, open(expected_file) as g:
+        assert f.read() == g.read()
+
+    factorized_file, expected_file = os.path.join(tmpdir, 'factorized.json'), os.path.join(tmpdir, 'expected.json')
+    factorized.to_json(factorized_file)
+    expected.to_json(expected_file)
+    with open(factorized_file) as f, open(expected_file) as g:
+        assert f.read() == g.read()
+
+
+def test_factorized_cross_is_materialized_by_modifications():
+    factorized = __build_crossed_tree(True)
+    expected = __build_crossed_tree(False)
+
+    factorized.set('/bookstore/book[format=ebook]/price', 9.99)
+    expected.set('/bookstore/book[format=ebook]/price', 9.99)
+
+    assert type(factorized.root['bookstore'][0]['book']) is list
+    assert factorized.root == expected.root
+
+
+@pytest.mark.parametrize('xpath', [
+    '/bookstore/book[title=Dune]/author/name',
+    '/bookstore/book[title=Sapiens]/author/name',
+    '/bookstore[name=Gibert]/book/author/name',
+])
+def test_factorized_cross_with_filtered_ancestors(xpath):
+    factorized, expected = TreeBuilder(), TreeBuilder()
+    for builder, factorize in [(factorized, True), (expected, False)]:
+        builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+        builder.cross(xpath, ['Harari', 'Rowling'], factorize=factorize)
+
+    assert factorized.root == expected.root
+
+
+def test_import_does_not_load_unused_modules():
+    # Optional modules and the ones of features not used by a simple build
+    modules = ['sly', 'xml.dom.minidom', 'xml.etree.ElementTree', 'asyncio', 'lxml', 'zstandard', 'pyarrow', 
+               'threading', 'queue', 'tempfile', 'sqlite3']
+    script = 'import sys, time; start = time.perf_counter(); import treebuilder; ' \
+        'print(time.perf_counter() - start); ' \
+        f'print(" ".join(m for m in {modules} if m in sys.modules))'
+    output = subprocess.run([sys.executable, '-c', script], stdout=subprocess.PIPE, universal_newlines=True, 
+                            check=True).stdout.splitlines()
+
+    assert float(output[0]) < 1
+    assert output[1] == ''
+
+    builder = TreeBuilder()
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+    builder.set('/bookstore/book[title=Sapiens]/price', 9.99)
+    assert builder.get_items('/bookstore/book[price=9.99]/title') == ['Sapiens']
+
+
+def test_get_items_cache_is_invalidated_by_modifications():
+    builder = TreeBuilder()
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+    builder.set('/bookstore/book/@lang', 'en')
+
+    items = builder.get_items('/bookstore/book[@lang=en]/title')
+    assert items == ['Sapiens', 'Harry Potter']
+    items.append('Dune')
+    assert builder.get_items('/bookstore/book[@lang=en]/title') == ['Sapiens', 'Harry Potter']
+
+    builder.set('/bookstore/book[title=Sapiens]/@lang', 'fr')
+    assert builder.get_items('/bookstore/book[@lang=en]/title') == ['Harry Potter']
+
+    builder.cross('/bookstore/book/copy_number', [1, 2])
+    assert builder.get_items('/bookstore/book[@lang=en]/title') == ['Harry Potter', 'Harry Potter']
+
+    builder.set('/bookstore/book/details/year', 2014)
+    assert builder.get_items('/bookstore/book/details') == [{'year': 2014}] * 4
+
+    snapshot = builder.snapshot()
+    builder.set('/bookstore/book/details/year', 2015)
+    assert builder.get_items('/bookstore/book/details') == [{'year': 2015}] * 4
+    builder.rollback(snapshot)
+    assert builder.get_items('/bookstore/book/details') == [{'year': 2014}] * 4
+
+
+@pytest.mark.parametrize('get_nodes', [
+    lambda x: x.get_items('/bookstore/book'),
+    lambda x: x.query('/bookstore/book').fetch(),
+    lambda x: x.root['bookstore'][0]['book'],
+])
+def test_get_items_cache_is_disabled_by_nodes_given_to_the_caller(get_nodes):
+    builder = TreeBuilder()
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+
+    assert builder.get_items('/bookstore/book/title') == ['Sapiens', 'Harry Potter']
+    books = get_nodes(builder)
+    assert builder.get_items('/bookstore/book/title') == ['Sapiens', 'Harry Potter']
+
+    # The nodes are modified without the builder, the next queries see it
+    books[0]['title'] = 'Dune'
+    assert builder.get_items('/bookstore/book/title') == ['Dune', 'Harry Potter']
+    books[1]['title'] = 'Emma'
+    assert builder.get_items('/bookstore/book/title') == ['Dune', 'Emma']
+
+
+def test_get_items_cache_is_kept_by_unrelated_modifications(monkeypatch):
+    walks = []
+    query_items = TreeBuilder._TreeBuilder__query_items
+    monkeypatch.setattr(TreeBuilder, '_TreeBuilder__query_items', lambda self, *args: walks.append(args) or query_items(self, *args))
+
+    builder = TreeBuilder()
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+    builder.expand('/bookstore/magazine/title', ['Time', 'Wired'])
+
+    assert builder.get_items('/bookstore/book/title') == ['Sapiens', 'Harry Potter']
+    assert builder.get_items('/bookstore/book/title') == ['Sapiens', 'Harry Potter']
+    builder.cross('/bookstore/magazine/issue', [1, 2])
+    builder.set('/bookstore/book/price', 9.99)
+    assert builder.get_items('/bookstore/book/title') == ['Sapiens', 'Harry Potter']
+    assert len(walks) == 1
+
+    builder.expand('/bookstore/book/price', [9.99, 19.99, 29.99])
+    assert builder.get_items('/bookstore/book/title') == ['Sapiens', 'Harry Potter', 'Sapiens']
+    assert len(walks) == 2
+
+
+def test_cross_product():
+    builder = TreeBuilder()
+    builder.expand('/catalog/item/name', ['T-shirt', 'Jacket'])
+    builder.cross_product('/catalog/item', {'size': ['S', 'M'], 'color': ['red', 'blue', 'green'], '@region': ['EU', 'US']})
+
+    expected = TreeBuilder()
+    expected.expand('/catalog/item/name', ['T-shirt', 'Jacket'])
+    expected.cross('/catalog/item/size', ['S', 'M'])
+    expected.cross('/catalog/item/color', ['red', 'blue', 'green'])
+    expected.cross('/catalog/item/@region', ['EU', 'US'])
+
+    assert builder.root == expected.root
+    assert len(builder.get_items('/catalog/item')) == 24
+    assert builder.get_items('/catalog/item[name=Jacket and size=M]/@region') == ['EU', 'EU', 'EU', 'US', 'US', 'US']
+
+
+def test_cross_product_with_filter_and_lazy_builder():
+    builder = TreeBuilder(lazy=True)
+    builder.expand('/catalog/item/name', ['T-shirt', 'Jacket'])
+    builder.cross_product('/catalog/item[name=Jacket]', {'size': ['S', 'M'], 'color': [], 'region': ['EU', 'US']})
+
+    assert builder.get_items('/catalog/item/name') == ['T-shirt', 'Jacket', 'Jacket', 'Jacket', 'Jacket']
+    assert builder.get_items('/catalog/item/size') == [None, 'S', 'M', 'S', 'M']
+    assert builder.get_items('/catalog/item/color') == [None] * 5
+
+
+def test_cross_with_duplicated_values():
+    builder = TreeBuilder()
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+    builder.cross('/bookstore/book/copy', ['paper', 'paper'])
+
+    assert builder.get_items('/bookstore/book/copy') == ['paper'] * 4
+
+
+def test_expand_columns():
+    builder = TreeBuilder()
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+    builder.expand_columns('/bookstore/book', {'id': [1, 2, 3], '@lang': ['en', 'fr'], 'price': [9.99]})
+
+    expected = TreeBuilder()
+    expected.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+    expected.expand('/bookstore/book/id', [1, 2, 3])
+    expected.expand('/bookstore/book/@lang', ['en', 'fr'])
+    expected.expand('/bookstore/book/price', [9.99])
+
+    assert builder.root == expected.root
+    assert builder.get_items('/bookstore/book[@lang=en]/id') == [1, 3]
+
+
+def __build_stores():
+    builder = TreeBuilder()
+    builder.expand('/library/store/name', ['Paris', 'London'])
+    builder.expand('/library/store[name=Paris]/book/title', ['Sapiens', 'Harry Potter'])
+    builder.expand('/library/store[name=London]/book/title', ['Dune', 'Emma', 'Ulysses'])
+    builder.expand('/library/store/book/@lang', ['en', 'fr'])
+    return builder
+
+
+@pytest.mark.parametrize('operation', ['columns', 'product'])
+def test_several_entries_with_filtered_selection_in_several_parents(operation):
+    values = {'@id': [1, 2, 3], 'price': [9.99, 19.99]}
+    builder, expected = __build_stores(), __build_stores()
+    for xpath in ['/library/store/book[@lang=en]', '/library/store/book[title=Unknown]']:
+        if operation == 'columns':
+            builder.expand_columns(xpath, values)
+            [expected.expand(f'{xpath}/{entry}', x) for entry, x in values.items()]
+        else:
+            builder.cross_product(xpath, values)
+            [expected.cross(f'{xpath}/{entry}', x) for entry, x in values.items()]
+
+        if 'Unknown' not in xpath:
+            assert builder.root == expected.root
+            assert builder.get_items('/library/store/book/price') == expected.get_items('/library/store/book/price')
+
+    # Without selected node in a parent list, the entries are set on the same new nodes
+    books = builder.root['library'][0]['store'][0]['book']
+    assert books[-1].keys() == {'price', '__ATTRIBUTES__'}
+
+
+def test_expand_columns_with_new_nodes_in_several_parents():
+    builder, expected = TreeBuilder(), TreeBuilder()
+    columns = {'title': ['Sapiens', 'Dune', 'Emma', 'Ulysses'], 'year': [2011, 1965, 1815], 'stock': [0]}
+    for x in (builder, expected):
+        x.expand('/library/store/name', ['A', 'B', 'C'])
+
+    builder.expand_columns('/library/store/book', columns)
+    [expected.expand(f'/library/store/book/{entry}', x) for entry, x in columns.items()]
+
+    # The new book of the first store is walked before the books of the next stores
+    assert builder.root == expected.root
+    assert [[(x['title'], x['year']) for x in store['book']] for store in builder.root['library'][0]['store']] == [
+        [('Sapiens', 2011), ('Ulysses', 1965)], [('Dune', 1815)], [('Emma', 2011)]]
+
+
+def test_expand_records():
+    builder = TreeBuilder(lazy=True)
+    builder.expand_records('/bookstore/book', [
+        { 'title': 'Sapiens', 'id': 1, '@lang': 'en' },
+        { 'title': 'Harry Potter', 'id': 2 },
+    ])
+    builder.expand_records('/bookstore/book[id=2]/details', [{ 'year': 1997 }])
+
+    assert builder.get_items('/bookstore/book/title') == ['Sapiens', 'Harry Potter']
+    assert builder.get_items('/bookstore/book/@lang') == ['en', None]
+    assert builder.get_items('/bookstore/book/details/year') == [None, 1997]
+
+
+def test_remove():
+    builder = TreeBuilder()
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter', 'A Time of Mercy'])
+    builder.expand('/bookstore/book/price', [9.99, 19.99, 29.99])
+    builder.set('/bookstore/book/@lang', 'en')
+    builder.set('/bookstore/book/details/year', 2014)
+
+    assert builder.get_items('/bookstore/book/title') == ['Sapiens', 'Harry Potter', 'A Time of Mercy']
+    builder.remove('/bookstore/book[price>10 and title!="A Time of Mercy"]')
+    assert builder.get_items('/bookstore/book/title') == ['Sapiens', 'A Time of Mercy']
+
+    builder.remove('/bookstore/book/details')
+    builder.remove('/bookstore/book[title=Sapiens]/@lang')
+    builder.remove('/bookstore/book/price')
+    assert builder.root == { 'bookstore': [{ 'book': [
+        { 'title': 'Sapiens' }, 
+        { 'title': 'A Time of Mercy', '__ATTRIBUTES__': { 'lang': 'en' } },
+    ]}]}
+
+    builder.remove('/bookstore/book[title=Sapiens or title="A Time of Mercy"]')
+    assert builder.root == { 'bookstore': [{}] }
+
+
+def test_remove_doesnt_create_missing_nodes():
+    builder = TreeBuilder()
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+
+    builder.remove('/bookstore/magazine/title')
+    builder.remove('/bookstore/book[title=Dune]/details')
+    builder.remove('/bookstore/book/@lang')
+
+    assert builder.root == { 'bookstore': [{ 'book': [{ 'title': 'Sapiens' }, { 'title': 'Harry Potter' }] }] }
+
+
+def test_remove_with_snapshot_and_factorized_cross():
+    builder = TreeBuilder()
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+    builder.cross('/bookstore/book/copy_number', [1, 2, 3], factorize=True)
+
+    snapshot = builder.snapshot()
+    builder.remove('/bookstore/book[copy_number>=2]')
+
+    assert builder.get_items('/bookstore/book/title') == ['Sapiens', 'Harry Potter']
+    assert len(snapshot.root['bookstore'][0]['book']) == 6
+
+
+def test_aggregate():
+    builder = TreeBuilder()
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter', 'A Time of Mercy'])
+    builder.expand('/bookstore/book/@lang', ['en', 'fr'])
+    builder.expand('/bookstore/book/price', [10, 20, 30])
+    builder.cross('/bookstore/book/copy_number', [1, 2], factorize=True)
+    root = builder.root
+
+    assert builder.aggregate('/bookstore/book/price', 'sum') == 120
+    assert builder.aggregate('/bookstore/book[price>10]', 'count') == 4
+    assert builder.aggregate('/bookstore/book[copy_number=2]/title', 'distinct') == ['Sapiens', 'Harry Potter', 'A Time of Mercy']
+    assert builder.aggregate('/bookstore/book/@lang', 'distinct') == ['en', 'fr']
+    assert builder.aggregate('/bookstore/book/details/year', 'max') is None
+    # The tree is left untouched
+    assert isinstance(root['bookstore'][0]['book'], FactorizedCross)
+    assert all(PARENT not in x and 'details' not in x for x in root['bookstore'][0]['book'])
+
+
+def test_aggregate_group_by():
+    builder = TreeBuilder()
+    builder.expand('/library/store/name', ['Paris', 'London'])
+    builder.expand('/library/store[name=Paris]/book/price', [10, 20, 30])
+    builder.expand('/library/store[name=London]/book/price', [15])
+    builder.expand('/library/store/book/@lang', ['en', 'fr'])
+
+    assert builder.aggregate('/library/store/book/price', 'sum', group_by='/library/store/name') == { 'Paris': 60, 'London': 15 }
+    assert builder.aggregate('/library/store/book/price', 'max', group_by='/library/store/book/@lang') == { 'en': 30, 'fr': 20 }
+    assert builder.aggregate('/library/store/book[price>10]/price', 'count', group_by='/library/store[name=Paris]/name') == { 'Paris': 2 }
+
+    with pytest.raises(Exception):
+        builder.aggregate('/library/store/book/price', 'sum', group_by='/library/shelf/name')
+
+
+def test_query():
+    builder = TreeBuilder()
+    builder.expand('/bookstore/book/title', [f'Book {i}' for i in range(10)])
+    builder.expand('/bookstore/book/@lang', ['en', 'fr'])
+
+    cursor = builder.query('/bookstore/book[@lang=en]/title', limit=2, offset=1)
+
+    assert cursor.fetch() == ['Book 2', 'Book 4']
+    assert cursor.fetch(limit=1) == ['Book 6']
+    assert cursor.position == 4 and not cursor.done
+    assert list(cursor) == ['Book 8']
+    assert cursor.done and cursor.fetch() == []
+    assert list(builder.query('/bookstore/book/title', limit=4)) == builder.get_items('/bookstore/book/title')
+
+
+def test_query_continues_after_modifications():
+    builder = TreeBuilder(lazy=True)
+    builder.expand('/bookstore/book/title', [f'Book {i}' for i in range(6)])
+
+    cursor = builder.query('/bookstore/book/title', limit=2)
+    assert cursor.fetch() == ['Book 0', 'Book 1']
+
+    builder.set('/bookstore/name', 'Library')
+    assert cursor.fetch() == ['Book 2', 'Book 3']
+
+    builder.remove('/bookstore/book[title="Book 0"]')
+    assert cursor.fetch() == ['Book 5']
+    assert cursor.done
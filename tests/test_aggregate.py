@@ -0,0 +1,40 @@
+import pytest
+from treebuilder.aggregate import aggregate, aggregate_by
+
+
+def test_aggregate():
+    values = [3, 1, 2, 3]
+
+    assert aggregate(iter(values), 'count') == 4
+    assert aggregate(iter(values), 'sum') == 9
+    assert aggregate(iter(values), 'min') == 1
+    assert aggregate(iter(values), 'max') == 3
+    assert aggregate(iter(values), 'distinct') == [3, 1, 2]
+    assert aggregate([], 'max') is None
+
+    with pytest.raises(Exception):
+        aggregate(values, 'avg')
+
+
+def test_aggregate_numbers_stored_as_text():
+    values = ['10', 2.5, '7.5']
+
+    assert aggregate(iter(values), 'sum') == 20
+    assert aggregate(iter(values), 'min') == 2.5
+    assert aggregate(iter(values), 'max') == 10
+    assert aggregate(['Sapiens', 'Harry Potter'], 'min') == 'Harry Potter'
+    assert aggregate_by([('en', '10'), ('fr', 1), ('en', 2)], 'sum') == { 'en': 12, 'fr': 1 }
+    assert aggregate_by([('en', '10'), ('fr', 1), ('en', 2)], 'max') == { 'en': 10, 'fr': 1 }
+
+    with pytest.raises(Exception, match='Only numbers can be summed'):
+        aggregate(['10', 'ten'], 'sum')
+
+
+def test_aggregate_by():
+    pairs = [('en', 3), ('fr', 1), ('en', 2), ('en', 3)]
+
+    assert aggregate_by(iter(pairs), 'count') == { 'en': 3, 'fr': 1 }
+    assert aggregate_by(iter(pairs), 'sum') == { 'en': 8, 'fr': 1 }
+    assert aggregate_by(iter(pairs), 'min') == { 'en': 2, 'fr': 1 }
+    assert aggregate_by(iter(pairs), 'max') == { 'en': 3, 'fr': 1 }
+    assert aggregate_by(iter(pairs), 'distinct') == { 'en': [3, 2], 'fr': [1] }
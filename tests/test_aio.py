@@ -0,0 +1,86 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+
+from treebuilder.TreeBuilder import TreeBuilder
+from treebuilder.xml import to_xml_string
+from treebuilder.json import to_json_string
+
+
+class Stream:
+    def __init__(self):
+        self.chunks = []
+        self.drains = 0
+
+    def write(self, data):
+        self.chunks.append(data)
+
+    async def drain(self):
+        self.drains += 1
+
+
+def __run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def __build():
+    builder = TreeBuilder()
+    builder.expand('bookstore/book/title', [f'Book {i}' for i in range(200)])
+    builder.set('bookstore/book/@lang', 'en')
+    builder.set('bookstore/book/details/price', 9.99)
+    return builder
+
+
+def test_ato_xml():
+    builder = __build()
+    stream = Stream()
+
+    __run(builder.ato_xml(stream, chunk_size=512))
+
+    assert ''.join(stream.chunks) == to_xml_string(builder.root)
+    assert len(stream.chunks) > 1
+    assert stream.drains == len(stream.chunks)
+
+
+def test_ato_json():
+    builder = __build()
+    stream = Stream()
+
+    __run(builder.ato_json(stream, chunk_size=512))
+
+    assert ''.join(stream.chunks) == to_json_string(builder.root)
+    assert len(stream.chunks) > 1
+
+
+def test_ato_xml_with_encoding_and_executor():
+    builder = __build()
+    stream = Stream()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        __run(builder.ato_xml(stream, chunk_size=512, executor=executor, encoding='utf-8'))
+
+    assert b''.join(stream.chunks).decode('utf-8') == to_xml_string(builder.root)
+
+
+def test_ato_xml_yields_to_the_loop():
+    builder = __build()
+    stream = Stream()
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(len(stream.chunks))
+            await asyncio.sleep(0)
+
+    async def main():
+        task = asyncio.ensure_future(ticker())
+        await builder.ato_xml(stream, chunk_size=512)
+        task.cancel()
+
+    __run(main())
+
+    # The other task ran while the document was written
+    assert len(set(ticks)) > 2
@@ -0,0 +1,97 @@
+import os
+import pytest
+from treebuilder.TreeBuilder import TreeBuilder
+from treebuilder.arrow import iter_columns
+
+
+def __build_bookstore():
+    builder = TreeBuilder()
+    builder.set('bookstore/@city', 'Paris')
+    builder.set('bookstore/name', 'Gibert')
+    builder.expand('bookstore/book/title', ['Sapiens', 'Harry Potter', 'A Time of Mercy'])
+    builder.set('bookstore/book/@lang', 'en')
+    builder.set('bookstore/book[title=Sapiens]/price', 9.99)
+    builder.cross('bookstore/book/copy/id', [1, 2])
+    return builder
+
+
+def test_iter_columns():
+    tree = __build_bookstore().root
+
+    columns = list(iter_columns(tree, 'bookstore/book'))
+
+    assert columns == [{
+        'bookstore/@city': ['Paris'] * 3,
+        'bookstore/name': ['Gibert'] * 3,
+        'title': ['Sapiens', 'Harry Potter', 'A Time of Mercy'],
+        '@lang': ['en'] * 3,
+        'price': [9.99, None, None],
+    }]
+
+
+def test_iter_columns_by_batch_with_filter():
+    tree = __build_bookstore().root
+
+    columns = list(iter_columns(tree, 'bookstore/book[@lang=en]/copy', batch_size=4))
+
+    assert [len(x['id']) for x in columns] == [4, 2]
+    assert columns[0]['bookstore/book/title'] == ['Sapiens', 'Sapiens', 'Harry Potter', 'Harry Potter']
+    assert columns[1]['bookstore/book/price'] == [None, None]
+    assert [x for batch in columns for x in batch['id']] == [1, 2] * 3
+
+
+def test_to_arrow():
+    pytest.importorskip('pyarrow')
+    builder = __build_bookstore()
+
+    table = builder.to_arrow('bookstore/book')
+
+    assert table.num_rows == 3
+    assert table.column('price').to_pylist() == [9.99, None, None]
+
+
+def test_to_parquet(tmpdir):
+    pytest.importorskip('pyarrow')
+    import pyarrow.parquet
+    builder = __build_bookstore()
+    test_file = os.path.join(tmpdir, 'copies.parquet')
+
+    builder.to_parquet(test_file, level='bookstore/book/copy', row_group_size=4)
+
+    parquet = pyarrow.parquet.ParquetFile(test_file)
+    assert parquet.num_row_groups == 2
+    assert parquet.read().column('id').to_pylist() == [1, 2] * 3
+
+
+def test_iter_columns_by_batch_with_sparse_columns():
+    tree = {'bookstore': [{'book': [{'title': 'Sapiens'}, {'title': 'Harry Potter'}, {'title': 'Dune', 'price': 9.5},
+                                    {'title': 'Emma', '__ATTRIBUTES__': {'lang': 'en'}}, {'title': 'Ulysses'}]}]}
+
+    columns = list(iter_columns(tree, 'bookstore/book', batch_size=2))
+
+    # Each batch has aligned columns, a column stays in the batches after the one where it appears
+    assert [{x: len(y) for x, y in batch.items()} for batch in columns] == [
+        {'title': 2}, {'title': 2, 'price': 2, '@lang': 2}, {'title': 1, 'price': 1, '@lang': 1}]
+    assert columns[1] == {'title': ['Dune', 'Emma'], 'price': [9.5, None], '@lang': [None, 'en']}
+    assert columns[2] == {'title': ['Ulysses'], 'price': [None], '@lang': [None]}
+
+
+def test_to_parquet_with_sparse_columns(tmpdir):
+    pytest.importorskip('pyarrow')
+    import pyarrow.parquet
+    from treebuilder.arrow import to_parquet
+    tree = {'bookstore': [{'book': [{'title': 'Sapiens'}, {'title': 'Harry Potter'}, {'title': 'Dune', 'price': 5},
+                                    {'title': 'Emma', '__ATTRIBUTES__': {'lang': 'en'}, 'price': 4.5}, {'title': 'Ulysses', 'pages': 730}]}]}
+    test_file = os.path.join(tmpdir, 'books.parquet')
+
+    # A column null in the first row group, or missing from it, keeps its type
+    to_parquet(tree, test_file, level='bookstore/book', row_group_size=2)
+
+    parquet = pyarrow.parquet.ParquetFile(test_file)
+    assert parquet.num_row_groups == 3
+    assert parquet.read().to_pydict() == {
+        'title': ['Sapiens', 'Harry Potter', 'Dune', 'Emma', 'Ulysses'],
+        'price': [None, None, 5.0, 4.5, None],
+        '@lang': [None, None, None, 'en', None],
+        'pages': [None, None, None, None, 730],
+    }
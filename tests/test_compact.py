@@ -0,0 +1,77 @@
+import copy
+from treebuilder.TreeBuilder import TreeBuilder
+from treebuilder.compact import compact
+
+
+def __build_orders(builder):
+    builder.expand('/orders/order/id', [1, 2, 3, 4])
+    builder.set('/orders/order/@type', 'retail')
+    builder.set('/orders/order/shipping/carrier', 'UPS')
+    builder.set('/orders/order/shipping/days', 3)
+    builder.set('/orders/order/shipping/@kind', 'standard')
+    return builder
+
+
+def test_compact():
+    tree = {'orders': [{'order': [
+        {'id': 1, 'shipping': [{'carrier': 'UPS', 'days': [3]}]},
+        {'id': 2, 'shipping': [{'carrier': 'UPS', 'days': [3]}]},
+        {'id': 3, 'shipping': [{'carrier': 'DHL', 'days': [3]}]},
+    ]}]}
+    expected = copy.deepcopy(tree)
+
+    compact(tree)
+
+    assert tree == expected
+    orders = tree['orders'][0]['order']
+    assert orders[0]['shipping'] is orders[1]['shipping']
+    assert orders[0]['shipping'] is not orders[2]['shipping']
+    assert orders[0]['shipping'][0]['days'] is orders[2]['shipping'][0]['days']
+
+
+def test_compact_builder_copies_shared_nodes_on_write():
+    builder = __build_orders(TreeBuilder())
+    expected = __build_orders(TreeBuilder())
+
+    builder.compact()
+    orders = builder.root['orders'][0]['order']
+    assert orders[0]['shipping'] is orders[3]['shipping']
+    assert orders[0]['__ATTRIBUTES__'] is orders[3]['__ATTRIBUTES__']
+
+    builder.set('/orders/order[id=2]/shipping/days', 1)
+    builder.set('/orders/order[id=3]/@type', 'pro')
+    expected.set('/orders/order[id=2]/shipping/days', 1)
+    expected.set('/orders/order[id=3]/@type', 'pro')
+
+    assert builder.root == expected.root
+    assert builder.get_items('/orders/order/shipping/days') == [3, 1, 3, 3]
+    assert builder.get_items('/orders/order/@type') == ['retail', 'retail', 'pro', 'retail']
+
+
+def test_compact_mode():
+    builder = __build_orders(TreeBuilder(compact=True))
+    expected = __build_orders(TreeBuilder())
+
+    orders = builder.root['orders'][0]['order']
+    assert orders[0]['shipping'][0] is orders[1]['shipping'][0]
+    assert builder.root == expected.root
+
+    builder.cross('/orders/order/shipping/zone', ['EU', 'US'])
+    expected.cross('/orders/order/shipping/zone', ['EU', 'US'])
+    assert builder.root == expected.root
+
+    orders = builder.root['orders'][0]['order']
+    assert orders[0]['shipping'] is orders[1]['shipping']
+    assert orders[0]['shipping'][0] is not orders[0]['shipping'][1]
+
+
+def test_compact_mode_with_lazy_builder_and_snapshot():
+    builder = __build_orders(TreeBuilder(lazy=True, compact=True))
+    expected = __build_orders(TreeBuilder())
+
+    snapshot = builder.snapshot()
+    builder.set('/orders/order[id=1]/shipping/carrier', 'DHL')
+    assert builder.get_items('/orders/order/shipping/carrier') == ['DHL', 'UPS', 'UPS', 'UPS']
+
+    builder.rollback(snapshot)
+    assert builder.root == expected.root
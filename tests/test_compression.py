@@ -0,0 +1,78 @@
+import bz2
+import gzip
+import os
+import sys
+import pytest
+from treebuilder.TreeBuilder import TreeBuilder
+from treebuilder.compression import get_compression, write_compressed
+
+
+def __build_builder():
+    builder = TreeBuilder()
+    builder.expand('bookstore/book/title', ['Sapiens', 'Harry & <Potter>', 'A Time of Mercy'])
+    builder.set('bookstore/book/@lang', 'en')
+    builder.cross('bookstore/book/copy_number', list(range(100)))
+    return builder
+
+
+def test_get_compression():
+    assert get_compression('output.xml.gz') == 'gzip'
+    assert get_compression('output.json.BZ2') == 'bz2'
+    assert get_compression('output.json.zst') == 'zstd'
+    assert get_compression('output.xml') is None
+    assert get_compression('output.xml.gz', None) is None
+    assert get_compression('output.xml', 'gzip') == 'gzip'
+
+    with pytest.raises(Exception):
+        get_compression('output.xml', 'zip')
+
+
+@pytest.mark.parametrize('extension, open_file', [('gz', gzip.open), ('bz2', bz2.open)])
+def test_compressed_outputs(tmpdir, extension, open_file):
+    builder = __build_builder()
+
+    for format, serialize in [('xml', builder.to_xml), ('json', builder.to_json)]:
+        file_path, compressed_file_path = os.path.join(tmpdir, f'output.{format}'), os.path.join(tmpdir, f'output.{format}.{extension}')
+        serialize(file_path)
+        serialize(compressed_file_path)
+
+        with open(file_path) as f, open_file(compressed_file_path, mode='rt') as g:
+            assert g.read() == f.read()
+
+
+def test_zstd_output(tmpdir):
+    zstandard = pytest.importorskip('zstandard')
+    builder = __build_builder()
+
+    file_path, compressed_file_path = os.path.join(tmpdir, 'output.json'), os.path.join(tmpdir, 'output.json.zst')
+    builder.to_json(file_path)
+    builder.to_json(compressed_file_path)
+
+    with open(file_path) as f, zstandard.open(compressed_file_path, mode='rt') as g:
+        assert g.read() == f.read()
+
+
+def test_zstd_output_without_zstandard(tmpdir, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'zstandard', None)
+
+    with pytest.raises(ImportError, match=r'treebuilder\[zstd\]'):
+        write_compressed(iter(['foo']), os.path.join(tmpdir, 'output.txt.zst'), 'zstd')
+
+
+def test_write_compressed_in_small_chunks(tmpdir):
+    file_path = os.path.join(tmpdir, 'output.txt.gz')
+    pieces = [f'line {i}\n' for i in range(10000)]
+
+    write_compressed(iter(pieces), file_path, 'gzip', chunk_size=16)
+
+    with gzip.open(file_path, mode='rt') as f:
+        assert f.read() == ''.join(pieces)
+
+
+def test_write_compressed_raises_producer_errors(tmpdir):
+    def pieces():
+        yield 'foo'
+        raise ValueError('bar')
+
+    with pytest.raises(ValueError):
+        write_compressed(pieces(), os.path.join(tmpdir, 'output.txt.gz'), 'gzip', chunk_size=1)
@@ -1,5 +1,5 @@
 from typing import List
-from treebuilder.cross import cross
+from treebuilder.cross import cross, cross_product, FactorizedCross
 from treebuilder.expand import expand
 
 
@@ -54,3 +54,61 @@ def test_cross_with_longer_values():
 
     __check(result, 'Name', 'foo', 'foo', 'foo')
     __check(result, 'Value', 1, 2, 3)
+
+
+def test_cross_product():
+    source = expand([], 'Name', ['foo', 'bar'])
+    result = cross_product(source, {'Value': [1, 2, 3], 'Details': [{'x': 1}, {'x': 2}]})
+
+    expected = expand([], 'Name', ['foo', 'bar'])
+    expected = cross(expected, 'Value', [1, 2, 3])
+    expected = cross(expected, 'Details', [{'x': 1}, {'x': 2}])
+
+    assert result == expected
+    assert result[0]['Details'] is not result[1]['Details']
+    __check(result, 'Value', 1, 1, 2, 2, 3, 3, 1, 1, 2, 2, 3, 3)
+
+
+def test_cross_product_with_empty_source_or_values():
+    result = cross_product([], {'Name': ['foo', 'bar'], 'Value': [1, 2]})
+
+    __check(result, 'Name', 'foo', 'bar', 'foo', 'bar')
+    __check(result, 'Value', 1, 1, 2, 2)
+    assert len(cross_product(expand([], 'Name', ['foo']), {'Value': [1, 2], 'Other': []})) == 0
+
+
+def test_factorized_cross():
+    source = expand([], 'Name', ['foo', 'bar', 'other'])
+    result = FactorizedCross(source, 'Value', [1, 2, 3])
+
+    assert len(result) == 9
+    __check(list(result), 'Name', 'foo', 'bar', 'other', 'foo', 'bar', 'other', 'foo', 'bar', 'other')
+    __check(list(result), 'Value', 1, 1, 1, 2, 2, 2, 3, 3, 3)
+    assert result[4] == { 'Name': 'bar', 'Value': 2 }
+    assert result[-1] == { 'Name': 'other', 'Value': 3 }
+    assert all(['Value' not in x for x in source])
+
+
+def test_factorized_cross_of_factorized_cross():
+    source = expand([], 'Name', ['foo', 'bar'])
+    result = FactorizedCross(FactorizedCross(source, 'Value', [1, 2, 3]), 'Id', ['a', 'b'])
+
+    expected = cross(cross(expand([], 'Name', ['foo', 'bar']), 'Value', [1, 2, 3]), 'Id', ['a', 'b'])
+    assert len(result) == len(expected)
+    assert result == expected
+    assert result[7] == expected[7]
+
+
+def test_factorized_cross_with_empty_source():
+    result = FactorizedCross([], 'Name', ['foo', 'bar', 'other'])
+
+    assert len(result) == 3
+    __check(list(result), 'Name', 'foo', 'bar', 'other')
+
+
+def test_factorized_cross_is_not_materialized():
+    source = expand([], 'Name', [f'Name {i}' for i in range(1000)])
+    result = FactorizedCross(FactorizedCross(source, 'Value', list(range(100))), 'Id', list(range(50)))
+
+    assert len(result) == 5000000
+    assert result[4999999] == { 'Name': 'Name 999', 'Value': 99, 'Id': 49 }
@@ -0,0 +1,105 @@
+import copy
+from treebuilder.TreeBuilder import TreeBuilder
+from treebuilder.cross import FactorizedCross
+from treebuilder.diff import diff, hash_tree
+
+
+def __materialize(tree):
+    return { k: [__materialize(x) for x in v] if isinstance(v, (list, FactorizedCross)) else copy.deepcopy(v) for k, v in tree.items() }
+
+
+def __patch(tree, delta):
+    tree = __materialize(tree)
+    for operation in delta:
+        keys = [x.replace('~1', '/').replace('~0', '~') for x in operation['path'].split('/')[1:]]
+        keys = [int(x) if x.isdigit() else x for x in keys]
+        container = tree
+        for key in keys[0:-1]:
+            container = container[key]
+
+        if operation['op'] == 'remove':
+            del container[keys[-1]]
+        elif operation['op'] == 'add' and isinstance(container, list):
+            container.insert(keys[-1], copy.deepcopy(operation['value']))
+        else:
+            container[keys[-1]] = copy.deepcopy(operation['value'])
+    return tree
+
+
+def __build_bookstore(titles=['Sapiens', 'Harry Potter', 'A Time of Mercy']):
+    builder = TreeBuilder()
+    builder.expand('/bookstore/book/title', titles)
+    builder.set('/bookstore/book/@lang', 'en')
+    builder.set('/bookstore/book/details/year', 2014)
+    return builder
+
+
+def test_hash_tree():
+    x, y = __build_bookstore(), __build_bookstore()
+
+    assert hash_tree(x.root) == hash_tree(y.root)
+    assert x.digest() == hash_tree(y.root)
+
+    y.set('/bookstore/book[title=Sapiens]/details/year', 2015)
+    assert hash_tree(x.root) != hash_tree(y.root)
+
+    y.set('/bookstore/book[title=Sapiens]/details/year', '2014')
+    assert hash_tree(x.root) != hash_tree(y.root)
+
+
+def test_digest_follows_modifications():
+    builder = __build_bookstore()
+    builder.digest()
+
+    builder.set('/bookstore/book[title=Sapiens]/details/year', 2015)
+    assert builder.digest() == hash_tree(builder.root)
+
+    builder.set('/bookstore/book[title="Harry Potter"]/@lang', 'fr')
+    assert builder.digest() == hash_tree(builder.root)
+
+    builder.cross('/bookstore/book/copy_number', [1, 2])
+    assert builder.digest() == hash_tree(builder.root)
+
+    snapshot = builder.snapshot()
+    builder.set('/bookstore/book/details/year', 2016)
+    assert builder.digest() == hash_tree(builder.root)
+    builder.rollback(snapshot)
+    assert builder.digest() == hash_tree(snapshot.root)
+
+
+def test_diff_identical_trees():
+    assert __build_bookstore().diff(__build_bookstore()) == []
+
+
+def test_diff():
+    x = __build_bookstore()
+    y = __build_bookstore(['Sapiens', 'Harry Potter', 'A Time of Mercy', 'Dune'])
+    y.set('/bookstore/book[title=Sapiens]/details/year', 2015)
+    y.set('/bookstore/book[title="Harry Potter"]/@lang', 'fr')
+    y.set('/bookstore/book[title="A Time of Mercy"]/price', 9.99)
+
+    delta = x.diff(y)
+
+    assert delta == [
+        { 'op': 'replace', 'path': '/bookstore/0/book/0/details/0/year', 'value': 2015 },
+        { 'op': 'replace', 'path': '/bookstore/0/book/1/__ATTRIBUTES__/lang', 'value': 'fr' },
+        { 'op': 'add', 'path': '/bookstore/0/book/2/price', 'value': 9.99 },
+        { 'op': 'add', 'path': '/bookstore/0/book/3', 'value': y.root['bookstore'][0]['book'][3] },
+    ]
+    assert __patch(x.root, delta) == y.root
+    assert __patch(y.root, y.diff(x)) == x.root
+
+
+def test_diff_with_escaped_keys_and_factorized_cross():
+    x = TreeBuilder()
+    x.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+    x.set('/bookstore/book/a~b', 1)
+    x.cross('/bookstore/book/copy_number', [1, 2], factorize=True)
+    y = TreeBuilder()
+    y.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+    y.cross('/bookstore/book/copy_number', [1, 2, 3])
+
+    delta = diff(x.root, y.root)
+
+    assert { 'op': 'remove', 'path': '/bookstore/0/book/0/a~0b' } in delta
+    assert __patch(x.root, delta) == y.root
@@ -1,5 +1,5 @@
 from typing import List
-from treebuilder.expand import expand
+from treebuilder.expand import expand, expand_columns, expand_records
 
 
 def __check(items: List, key: str, *args):
@@ -82,3 +82,37 @@ def test_expand_with_longer_values_and_repeat():
 
     __check(result, 'Name', 'foo', 'bar', 'foo', 'bar', 'foo', 'bar', 'foo')
     __check(result, 'Value', 1, 2, 3, 4, 5, 6, 7)
+
+
+def test_expand_columns():
+    source = expand([], 'Name', ['foo', 'bar'])
+    result = expand_columns(source, {'Value': [1, 2, 3], 'Other': ['x', 'y', 'z', 'w'], 'Empty': []})
+
+    expected = expand([], 'Name', ['foo', 'bar'])
+    expected = expand(expected, 'Value', [1, 2, 3])
+    expected = expand(expected, 'Other', ['x', 'y', 'z', 'w'])
+
+    assert result == expected
+    __check(result, 'Name', 'foo', 'bar', 'foo', 'foo')
+    __check(result, 'Value', 1, 2, 3, 1)
+
+
+def test_expand_columns_with_groups():
+    source = expand([], 'Name', ['foo', 'bar', 'baz'])
+    result = expand_columns(source, {'Value': [1, 2, 3, 4], 'Other': ['x', 'y', 'z']}, groups=[0, 1, 2])
+
+    # The clone of foo is in the group of foo, so it gets the second value of the next column
+    __check(result, 'Name', 'foo', 'foo', 'bar', 'baz')
+    __check(result, 'Value', 1, 4, 2, 3)
+    __check(result, 'Other', 'x', 'y', 'z', 'x')
+    assert result[0] is source[0] and result[2] is source[1]
+
+
+def test_expand_records():
+    result = expand_records([], [{'Name': 'foo', 'Value': 1}, {'Name': 'bar'}])
+    __check(result, 'Name', 'foo', 'bar')
+    assert 'Value' not in result[1]
+
+    result = expand_records(result, [{'Value': [1]}])
+    __check(result, 'Value', [1], [1])
+    assert result[0]['Value'] is not result[1]['Value']
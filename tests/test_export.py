@@ -0,0 +1,114 @@
+import bz2
+import gzip
+import json
+import os
+import pytest
+from treebuilder.TreeBuilder import TreeBuilder
+from treebuilder.export import export, get_part_path, to_jsonl, xml_sink, json_sink, jsonl_sink
+
+
+def __build_tree():
+    builder = TreeBuilder()
+    builder.set('bookstore/@xmlns:xsi', 'http://www.w3.org/2001/XMLSchema-instance')
+    builder.expand('bookstore/book/title', ['Sapiens', 'Harry "Potter"', 'A Time of Mercy'])
+    builder.set('bookstore/book/@lang', 'en')
+    builder.set('bookstore/book/is_in_stock', True)
+    builder.set('bookstore/book/price', None)
+    builder.set('bookstore/book/details/count', 3)
+    builder.set('bookstore/book/empty', [{}])
+    builder.set('bookstore/book/borrowers', [])
+    builder.cross('bookstore/book/copy', [1, 2], factorize=True)
+    return builder
+
+
+def __read(file_path):
+    open_file = bz2.open if file_path.endswith('.bz2') else open
+    with open_file(file_path, mode='rb') as f:
+        return f.read()
+
+
+def test_export_gives_the_same_outputs(tmpdir):
+    builder = __build_tree()
+    files = {name: os.path.join(tmpdir, name) for name in ['expected.xml', 'expected.json', 'tree.xml', 'tree.json.bz2']}
+    builder.to_xml(files['expected.xml'], root='root', backend='stdlib')
+    builder.to_json(files['expected.json'])
+
+    builder.export([xml_sink(files['tree.xml'], root='root'), files['tree.json.bz2']])
+
+    assert __read(files['tree.xml']) == __read(files['expected.xml'])
+    assert __read(files['tree.json.bz2']) == __read(files['expected.json'])
+
+
+@pytest.mark.parametrize('pretty', [True, False])
+def test_export_non_ascii_characters(tmpdir, pretty):
+    builder = TreeBuilder()
+    builder.expand('bookstore/book/title', ['Übermensch', '東京'])
+    files = {name: os.path.join(tmpdir, name) for name in ['expected.xml', 'expected.json', 'tree.xml', 'tree.json']}
+    builder.to_xml(files['expected.xml'], pretty=pretty)
+    builder.to_json(files['expected.json'], pretty=pretty)
+
+    builder.export([xml_sink(files['tree.xml'], pretty=pretty), json_sink(files['tree.json'], pretty=pretty)])
+
+    assert __read(files['tree.xml']) == __read(files['expected.xml'])
+    assert __read(files['tree.json']) == __read(files['expected.json'])
+
+
+def test_export_several_formats_of_a_single_tree(tmpdir):
+    tree = __build_tree().root
+    files = [os.path.join(tmpdir, name) for name in ['pretty.json', 'compact.json']]
+
+    export(tree, [json_sink(files[0]), json_sink(files[1], pretty=False)])
+
+    assert b'\n' in __read(files[0]) and b'\n' not in __read(files[1])
+
+
+def test_export_json_lines(tmpdir):
+    builder = __build_tree()
+    test_file = os.path.join(tmpdir, 'books.jsonl')
+
+    builder.export([jsonl_sink(test_file, level='bookstore/book[copy=2]/details')])
+
+    assert __read(test_file) == b'{"count": 3}\n' * 3
+
+
+def test_export_unknown_format(tmpdir):
+    with pytest.raises(Exception):
+        export(__build_tree().root, [os.path.join(tmpdir, 'tree.csv')])
+
+
+def test_to_jsonl_with_ancestors(tmpdir):
+    tree = {'bookstore': [{'__ATTRIBUTES__': {'city': 'Paris'}, 'book': [{'title': 'Sapiens'}, {'title': 'Harry Potter'}], 'name': 'Gibert'}]}
+    test_file = os.path.join(tmpdir, 'books.jsonl')
+
+    to_jsonl(tree, test_file, 'bookstore/book', include_ancestors=True)
+
+    with open(test_file) as f:
+        assert [json.loads(x) for x in f] == [
+            {'bookstore/@city': 'Paris', 'bookstore/name': 'Gibert', 'title': 'Sapiens'},
+            {'bookstore/@city': 'Paris', 'bookstore/name': 'Gibert', 'title': 'Harry Potter'},
+        ]
+
+
+@pytest.mark.parametrize('key', [None, 'lang'])
+def test_to_jsonl_split_into_files(tmpdir, key):
+    builder = TreeBuilder()
+    builder.expand('bookstore/book/id', list(range(10)))
+    builder.expand('bookstore/book/lang', ['en', 'fr'] * 5)
+    test_file = os.path.join(tmpdir, 'books.jsonl.gz')
+
+    builder.to_jsonl(test_file, level='bookstore/book', files=3, key=key)
+
+    parts = []
+    for part in range(3):
+        with gzip.open(get_part_path(test_file, part), mode='rt') as f:
+            parts.append([json.loads(x) for x in f])
+    assert sorted(x['id'] for records in parts for x in records) == list(range(10))
+    if key is None:
+        assert [[x['id'] for x in records] for records in parts] == [[0, 3, 6, 9], [1, 4, 7], [2, 5, 8]]
+    else:
+        assert all(len(set(x['lang'] for x in records)) <= 1 for records in parts)
+
+
+def test_get_part_path():
+    assert get_part_path('books.jsonl', 1) == 'books-00001.jsonl'
+    assert get_part_path('out/books.jsonl.zst', 12) == 'out/books-00012.jsonl.zst'
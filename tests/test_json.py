@@ -0,0 +1,55 @@
+from treebuilder.TreeBuilder import TreeBuilder
+from treebuilder.json import format_json, format_jsonl, iter_json, to_json_string
+from treebuilder.traversal import iter_events
+
+
+def __build_tree():
+    builder = TreeBuilder()
+    builder.set('bookstore/@xmlns:xsi', 'http://www.w3.org/2001/XMLSchema-instance')
+    builder.expand('bookstore/book/title', ['Sapiens', 'Harry "Potter"', 'A Time of Mercy'])
+    builder.set('bookstore/book/@lang', 'en')
+    builder.set('bookstore/book/is_in_stock', True)
+    builder.set('bookstore/book/price', None)
+    builder.set('bookstore/book/details/count', 3)
+    builder.set('bookstore/book/empty', [{}])
+    builder.set('bookstore/book/copies', [{}, {}])
+    builder.set('bookstore/book/borrowers', [])
+    return builder.root
+
+
+def test_iter_json_pretty():
+    tree = __build_tree()
+
+    assert ''.join(iter_json(tree)) == to_json_string(tree)
+
+
+def test_iter_json_not_pretty():
+    tree = __build_tree()
+
+    assert ''.join(iter_json(tree, pretty=False)) == to_json_string(tree, pretty=False)
+
+
+def test_format_json():
+    tree = __build_tree()
+    events = list(iter_events(tree))
+
+    for pretty in [True, False]:
+        formatter = format_json(pretty=pretty)
+        pieces = [next(formatter), formatter.send(events[0:5]), formatter.send(events[5:]), formatter.send(None)]
+
+        assert ''.join(pieces) == to_json_string(tree, pretty=pretty)
+
+
+def test_format_jsonl():
+    tree = __build_tree()
+    events = list(iter_events(tree))
+
+    formatter = format_jsonl('bookstore/book[title!=Sapiens]')
+    pieces = [next(formatter), formatter.send(events[0:5]), formatter.send(events[5:]), formatter.send(None)]
+
+    lines = ''.join(pieces).splitlines()
+    assert lines == [to_json_string(x, pretty=False) for x in tree['bookstore'][0]['book'][1:]]
+
+
+def test_iter_json_empty_tree():
+    assert ''.join(iter_json({})) == to_json_string({})
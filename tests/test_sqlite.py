@@ -0,0 +1,90 @@
+import os
+import sqlite3
+from treebuilder.TreeBuilder import TreeBuilder
+from treebuilder.sqlite import to_sqlite
+
+
+def __read_table(file_path, table):
+    connection = sqlite3.connect(file_path)
+    try:
+        cursor = connection.execute(f'SELECT * FROM "{table}" ORDER BY _id')
+        columns = [x[0] for x in cursor.description]
+        return [dict(zip(columns, x)) for x in cursor]
+    finally:
+        connection.close()
+
+
+def test_to_sqlite(tmpdir):
+    tree = {'bookstore': [{'book': [
+        {'__ATTRIBUTES__': {'lang': 'en'}, 'title': 'Sapiens', 'tags': ['history'], 'copy': [{'id': 1}, {'id': 2}]},
+        {'__ATTRIBUTES__': {'lang': 'fr'}, 'title': 'Harry Potter', 'price': 9.99, 'copy': [{'id': 3}]},
+    ]}]}
+    test_file = os.path.join(tmpdir, 'bookstore.db')
+
+    to_sqlite(tree, test_file, batch_size=1)
+
+    assert __read_table(test_file, 'bookstore') == [{'_id': 1, '_parent_id': None}]
+    assert __read_table(test_file, 'bookstore/book') == [
+        {'_id': 1, '_parent_id': 1, '@lang': 'en', 'title': 'Sapiens', 'tags': '["history"]', 'price': None},
+        {'_id': 2, '_parent_id': 1, '@lang': 'fr', 'title': 'Harry Potter', 'tags': None, 'price': 9.99},
+    ]
+    assert sorted((x['_parent_id'], x['id']) for x in __read_table(test_file, 'bookstore/book/copy')) == [(1, 1), (1, 2), (2, 3)]
+
+
+def test_to_sqlite_replaces_existing_file(tmpdir):
+    test_file = os.path.join(tmpdir, 'bookstore.db')
+    to_sqlite({'shop': [{'name': 'old'}]}, test_file)
+
+    builder = TreeBuilder()
+    builder.expand('bookstore/book/title', ['Sapiens', 'Harry Potter'])
+    builder.cross('bookstore/book/copy', [1, 2], factorize=True)
+    builder.to_sqlite(test_file)
+
+    connection = sqlite3.connect(test_file)
+    tables = [x for x, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+    connection.close()
+    assert tables == ['bookstore', 'bookstore/book']
+    assert [(x['title'], x['copy']) for x in __read_table(test_file, 'bookstore/book')] == [
+        ('Sapiens', 1), ('Harry Potter', 1), ('Sapiens', 2), ('Harry Potter', 2)]
+
+
+def __read_tables(file_path):
+    connection = sqlite3.connect(file_path)
+    try:
+        return sorted(x for x, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'"))
+    finally:
+        connection.close()
+
+
+def test_to_sqlite_with_leaves_differing_by_case(tmpdir):
+    tree = {'bookstore': [{'book': [{'Title': 'Sapiens', 'title': 'sapiens'}, {'title': 'harry potter'}]}]}
+    test_file = os.path.join(tmpdir, 'bookstore.db')
+
+    to_sqlite(tree, test_file, batch_size=1)
+
+    assert __read_table(test_file, 'bookstore/book') == [
+        {'_id': 1, '_parent_id': 1, 'Title': 'Sapiens', 'title~2': 'sapiens'},
+        {'_id': 2, '_parent_id': 1, 'Title': None, 'title~2': 'harry potter'},
+    ]
+
+
+def test_to_sqlite_with_node_lists_differing_by_case(tmpdir):
+    tree = {'bookstore': [{'book': [{'title': 'Sapiens'}], 'Book': [{'title': 'Harry Potter'}, {'title': 'A Time of Mercy'}]}]}
+    test_file = os.path.join(tmpdir, 'bookstore.db')
+
+    to_sqlite(tree, test_file)
+
+    assert __read_tables(test_file) == ['bookstore', 'bookstore/Book', 'bookstore/book~2']
+    assert [x['title'] for x in __read_table(test_file, 'bookstore/Book')] == ['Harry Potter', 'A Time of Mercy']
+    assert [x['title'] for x in __read_table(test_file, 'bookstore/book~2')] == ['Sapiens']
+
+
+def test_to_sqlite_with_leaves_named_like_the_keys(tmpdir):
+    tree = {'bookstore': [{'book': [{'_id': 'B-1', '_Parent_Id': 7, 'title': 'Sapiens'}], '_parent_id': [{'title': 'Index'}]}]}
+    test_file = os.path.join(tmpdir, 'bookstore.db')
+
+    to_sqlite(tree, test_file)
+
+    assert __read_table(test_file, 'bookstore/book') == [
+        {'_id': 1, '_parent_id': 1, '_id~2': 'B-1', '_Parent_Id~2': 7, 'title': 'Sapiens'}]
+    assert __read_table(test_file, 'bookstore/_parent_id') == [{'_id': 1, '_parent_id': 1, 'title': 'Index'}]
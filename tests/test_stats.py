@@ -0,0 +1,77 @@
+import sys
+from treebuilder.TreeBuilder import TreeBuilder
+from treebuilder.stats import memory_stats
+
+
+def test_memory_stats():
+    builder = TreeBuilder()
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+    builder.set('/bookstore/book/@lang', 'en')
+    builder.cross('/bookstore/book/copy_number', [1, 2])
+
+    stats = memory_stats(builder.root)
+
+    assert list(stats) == ['/bookstore', '/bookstore/book', '/bookstore/book/title', '/bookstore/book/@lang', '/bookstore/book/copy_number']
+    assert stats['/bookstore']['nodes'] == 1
+    assert stats['/bookstore/book']['nodes'] == 4
+    assert stats['/bookstore/book']['leaves'] == 0
+    assert stats['/bookstore/book/title']['leaves'] == 4
+    assert stats['/bookstore/book/title']['distinct_values'] == 2
+    assert stats['/bookstore/book/@lang']['leaves'] == 4
+    assert stats['/bookstore/book/@lang']['distinct_values'] == 1
+    assert stats['/bookstore/book/copy_number']['distinct_values'] == 2
+
+    books = builder.root['bookstore'][0]['book']
+    expected = sys.getsizeof(books) + sum(sys.getsizeof(x) + sys.getsizeof(x['__ATTRIBUTES__']) for x in books)
+    assert stats['/bookstore/book']['bytes'] == expected
+
+
+def test_memory_stats_counts_duplicated_values():
+    details = {'pages': [100, 200]}
+
+    builder = TreeBuilder()
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter', 'A Time of Mercy'])
+    builder.set('/bookstore/book/details', details)
+    builder.set('/bookstore/book/shared', details, deep_copy=False)
+
+    stats = builder.memory_stats()
+
+    size = stats['/bookstore/book/details']['bytes'] // 3
+    assert stats['/bookstore/book/details']['distinct_values'] == 1
+    assert stats['/bookstore/book/details']['duplicate_bytes'] == 2 * size
+    assert stats['/bookstore/book/shared']['duplicate_bytes'] == 0
+
+
+def test_memory_stats_of_tuples_holding_lists():
+    tree = {'bookstore': [{'book': [{'pages': (1, [100, 200])}, {'pages': (1, [100, 200])}, {'pages': (1, [300])}]}]}
+
+    stats = memory_stats(tree)
+
+    assert stats['/bookstore/book/pages']['leaves'] == 3
+    assert stats['/bookstore/book/pages']['distinct_values'] == 2
+
+
+def test_memory_stats_with_depth():
+    builder = TreeBuilder()
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+    builder.set('/bookstore/book/details/year', 2014)
+
+    stats = builder.memory_stats()
+    by_depth = builder.memory_stats(depth=2)
+
+    assert list(by_depth) == ['/bookstore', '/bookstore/book']
+    assert by_depth['/bookstore/book']['nodes'] == 4
+    assert by_depth['/bookstore/book']['leaves'] == 4
+    assert by_depth['/bookstore/book']['bytes'] == sum(x['bytes'] for k, x in stats.items() if k != '/bookstore')
+
+
+def test_memory_stats_of_factorized_cross():
+    builder = TreeBuilder()
+    builder.expand('/bookstore/book/title', ['Sapiens', 'Harry Potter'])
+    builder.cross('/bookstore/book/copy_number', [1, 2, 3], factorize=True)
+
+    stats = builder.memory_stats()
+
+    assert stats['/bookstore/book']['nodes'] == 2
+    assert stats['/bookstore/book/title']['leaves'] == 2
+    assert stats['/bookstore/book/copy_number']['leaves'] == 3
@@ -0,0 +1,56 @@
+from treebuilder.constants import ATTRIBUTES
+from treebuilder.cross import FactorizedCross
+from treebuilder.traversal import compile_xpath, split_step, walk, iter_events, OPEN, CLOSE, LEAF, LIST, END_LIST
+
+
+def test_split_step():
+    assert split_step('book') == ('book', None)
+    assert split_step('book[title=Sapiens]') == ('book', 'title=Sapiens')
+    assert split_step('book[title="[A]"]') == ('book', 'title="[A]"')
+
+
+def test_compile_xpath():
+    assert compile_xpath('/bookstore/book[@lang=en]/title') == (None, ('bookstore', None), ('book', '@lang=en'), ('title', None))
+    assert compile_xpath('bookstore//book') == (('bookstore', None), None, ('book', None))
+
+
+def test_walk():
+    tree = {'bookstore': [{'book': FactorizedCross([{'title': 'Sapiens', ATTRIBUTES: {'lang': 'en'}}], 'copy', [1, 2])}]}
+    visits = []
+
+    def visit_nodes(entry, nodes, path):
+        visits.append((path + '/' + entry, len(nodes)))
+        return [path + '/' + entry] * len(nodes)
+
+    def visit_leaf(entry, value, path):
+        visits.append((path + '/' + entry, value))
+
+    walk(tree, '', visit_nodes, visit_leaf, skip=ATTRIBUTES)
+
+    assert sorted(visits, key=str) == sorted([
+        ('/bookstore', 1), 
+        ('/bookstore/book', 2), 
+        ('/bookstore/book/title', 'Sapiens'), ('/bookstore/book/copy', 1), 
+        ('/bookstore/book/title', 'Sapiens'), ('/bookstore/book/copy', 2),
+    ], key=str)
+
+
+def test_iter_events():
+    book = {'title': 'Sapiens', ATTRIBUTES: {'lang': 'en'}, 'tags': ['history']}
+    tree = {'bookstore': [{'book': [book], 'name': 'Gibert'}]}
+    bookstore = tree['bookstore'][0]
+
+    assert list(iter_events(tree)) == [
+        (LIST, 'bookstore', tree['bookstore']),
+        (OPEN, 'bookstore', bookstore),
+        (LIST, 'book', bookstore['book']),
+        (OPEN, 'book', book),
+        (LEAF, 'title', 'Sapiens'),
+        (LEAF, ATTRIBUTES, {'lang': 'en'}),
+        (LEAF, 'tags', ['history']),
+        (CLOSE, 'book', book),
+        (END_LIST, 'book', bookstore['book']),
+        (LEAF, 'name', 'Gibert'),
+        (CLOSE, 'bookstore', bookstore),
+        (END_LIST, 'bookstore', tree['bookstore']),
+    ]
@@ -0,0 +1,150 @@
+import gzip
+import os
+import xml.etree.ElementTree as ET
+import pytest
+from treebuilder.TreeBuilder import TreeBuilder
+from treebuilder.xml import format_xml, iter_xml, to_xml, to_xml_string
+from treebuilder.traversal import iter_events
+
+
+def __build_tree():
+    builder = TreeBuilder()
+    builder.set('bookstore/@xmlns:xsi', 'http://www.w3.org/2001/XMLSchema-instance')
+    builder.expand('bookstore/book/title', ['Sapiens', 'Harry & <Potter>', 'A Time of Mercy'])
+    builder.set('bookstore/book/@lang', 'en "us"')
+    builder.set('bookstore/book/is_in_stock', True)
+    builder.set('bookstore/book/details/@count', '3')
+    builder.set('bookstore/book/description', '')
+    return builder.root
+
+
+def test_iter_xml_pretty():
+    tree = __build_tree()
+
+    assert ''.join(iter_xml(tree)) == to_xml_string(tree)
+
+
+def test_iter_xml_with_root():
+    tree = __build_tree()
+
+    assert ''.join(iter_xml(tree, root='Root')) == to_xml_string(tree, root='Root')
+
+
+def test_iter_xml_not_pretty():
+    tree = __build_tree()
+
+    assert ''.join(iter_xml(tree, pretty=False)) == to_xml_string(tree, pretty=False).decode()
+
+
+def test_iter_xml_escapes_white_spaces_and_quotes():
+    tree = {'bookstore': [{'__ATTRIBUTES__': {'name': 'a\nb\rc\td "e"'}, 'title': 'a\nb\rc\r\nd\te "f"'}]}
+
+    assert ''.join(iter_xml(tree, pretty=False)) == to_xml_string(tree, pretty=False).decode()
+    assert ET.fromstring(''.join(iter_xml(tree, pretty=False))).get('name') == 'a\nb\rc\td "e"'
+
+    # Once pretty, only the attribute white spaces differ from minidom, they are kept by a re-parse
+    pretty = ''.join(iter_xml(tree))
+    assert ET.fromstring(pretty).get('name') == 'a\nb\rc\td "e"'
+    del tree['bookstore'][0]['__ATTRIBUTES__']
+    assert ''.join(iter_xml(tree)) == to_xml_string(tree)
+
+
+@pytest.mark.parametrize('pretty', [True, False])
+def test_iter_xml_with_non_ascii_characters(tmpdir, pretty):
+    tree = {'bookstore': [{'__ATTRIBUTES__': {'city': 'Zürich'}, 'title': 'Übermensch – 東京'}]}
+    expected = to_xml_string(tree, root='Root', pretty=pretty)
+    expected = expected if pretty else expected.decode()
+
+    assert ''.join(iter_xml(tree, root='Root', pretty=pretty)) == expected
+
+    # A compressed file is written from iter_xml
+    files = [os.path.join(tmpdir, name) for name in ['tree.xml', 'tree.xml.gz']]
+    for file_path in files:
+        to_xml(tree, file_path, root='Root', pretty=pretty)
+    with open(files[0], mode='rb') as f, gzip.open(files[1], mode='rb') as g:
+        assert f.read() == g.read()
+
+
+@pytest.mark.parametrize('root, pretty', [(None, True), ('root', False)])
+def test_format_xml(root, pretty):
+    tree = __build_tree()
+    events = list(iter_events(tree))
+
+    formatter = format_xml(tree, root=root, pretty=pretty)
+    pieces = [next(formatter), formatter.send(events[0:5]), formatter.send(events[5:]), formatter.send(None)]
+
+    assert ''.join(pieces) == ''.join(iter_xml(tree, root=root, pretty=pretty))
+
+
+def test_iter_xml_with_multiple_roots():
+    builder = TreeBuilder()
+    builder.set('foo/Name', 'foo')
+    builder.set('bar/Name', 'bar')
+
+    try:
+        ''.join(iter_xml(builder.root))
+        assert False
+    except Exception:
+        pass
+
+
+def __check_xml_files(x_file, y_file):
+    stack = [(ET.parse(x_file).getroot(), ET.parse(y_file).getroot())]
+    while len(stack) > 0:
+        x_node, y_node = stack.pop()
+
+        assert x_node.tag == y_node.tag
+        assert x_node.attrib == y_node.attrib
+        assert len(x_node) == len(y_node)
+        if len(x_node) == 0:
+            assert x_node.text == y_node.text
+        else:
+            stack.extend(zip(x_node, y_node))
+
+
+@pytest.mark.parametrize('root', [None, 'Root'])
+@pytest.mark.parametrize('pretty', [True, False])
+def test_to_xml_with_lxml_backend(tmpdir, root, pretty):
+    pytest.importorskip('lxml')
+    tree = __build_tree()
+
+    stdlib_file, lxml_file = os.path.join(tmpdir, 'stdlib.xml'), os.path.join(tmpdir, 'lxml.xml')
+    to_xml(tree, stdlib_file, root=root, pretty=pretty, backend='stdlib')
+    to_xml(tree, lxml_file, root=root, pretty=pretty, backend='lxml')
+
+    __check_xml_files(stdlib_file, lxml_file)
+    if pretty:
+        with open(stdlib_file) as f, open(lxml_file) as g:
+            assert f.read().replace('&quot;', '"') == g.read().replace('&quot;', '"')
+
+
+def test_to_xml_with_lxml_backend_and_prefixed_names(tmpdir):
+    pytest.importorskip('lxml')
+    builder = TreeBuilder()
+    builder.set('root/@xmlns:xsi', 'http://www.w3.org/2001/XMLSchema-instance')
+    builder.set('root/item/@xsi:type', 'A')
+    builder.set('root/item/xsi:nil', 'true')
+    builder.set('root/empty/@xsi:type', 'B')
+
+    stdlib_file, lxml_file = os.path.join(tmpdir, 'stdlib.xml'), os.path.join(tmpdir, 'lxml.xml')
+    to_xml(builder.root, stdlib_file, backend='stdlib')
+    to_xml(builder.root, lxml_file, backend='lxml')
+
+    __check_xml_files(stdlib_file, lxml_file)
+
+
+@pytest.mark.parametrize('pretty', [True, False])
+def test_to_xml_uses_stdlib_backend_by_default(tmpdir, pretty):
+    tree = __build_tree()
+    test_file = os.path.join(tmpdir, 'output.xml')
+
+    to_xml(tree, test_file, pretty=pretty)
+
+    expected = to_xml_string(tree, pretty=pretty)
+    with open(test_file, mode='rb') as f:
+        assert f.read() == (expected if isinstance(expected, bytes) else expected.encode())
+
+
+def test_to_xml_with_unknown_backend(tmpdir):
+    with pytest.raises(Exception):
+        to_xml(__build_tree(), os.path.join(tmpdir, 'output.xml'), backend='unknown')
@@ -1,13 +1,22 @@
+import re
 from sly import Lexer
 
 
+# `in` and `not` are keywords only where an expression can follow them, so they can still name
+# an element, e.g. `in=1` or `not in (1, 2)`, or be a value, e.g. `status=not`
+_KEYWORDS = {
+    'in': re.compile(r'\s*\('),
+    'not': re.compile(r'(?!\s*($|[=!<>),]|in\s*\(|(and|or)\b))'),
+}
+
+
 class FilterLexer(Lexer):
     
     tokens = {
         ID, TEXT, NUMBER,
-        AND, OR,
-        EQ, NE,
-        LPAREN, RPAREN,
+        AND, OR, NOT, IN,
+        EQ, NE, LE, LT, GE, GT,
+        LPAREN, RPAREN, COMMA,
         ATTR
     }
 
@@ -15,19 +24,30 @@ class FilterLexer(Lexer):
     
     ID =     r'[a-zA-Z_\:][a-zA-Z0-9_\:]*'
     TEXT =   r'(?P<quote>["\']).*?(?P=quote)'
-    NUMBER = r'\d+(\.\d+)?'
+    NUMBER = r'-?\d+(\.\d+)?'
 
     ID['and'] = AND
     ID['or']  = OR
 
     EQ = r'='
     NE = r'!='
+    LE = r'<='
+    LT = r'<'
+    GE = r'>='
+    GT = r'>'
 
     LPAREN  = r'\('
     RPAREN  = r'\)'
+    COMMA   = r','
 
     ATTR = r'@'
 
+    def ID(self, t):
+        keyword = _KEYWORDS.get(t.value)
+        if keyword is not None and keyword.match(self.text, self.index) is not None:
+            t.type = t.value.upper()
+        return t
+
     def TEXT(self, t):
         t.value = t.value[1:-1]
         return t
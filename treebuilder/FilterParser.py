@@ -1,6 +1,32 @@
+from typing import Any
+import operator
 from sly import Parser
 from treebuilder.FilterLexer import FilterLexer
 from treebuilder.constants import ATTRIBUTES
+from treebuilder.traversal import to_number
+
+
+def _equals(x: Any, literal: Any) -> bool:
+    if type(x) is bool or type(literal) is bool: # Booleans are compared by type, True == 1
+        return x is literal
+    if x == literal:
+        return True
+    # Numbers are compared by value, whatever they are stored as text or number
+    if isinstance(literal, (int, float)):
+        number = to_number(x)
+        return number is not None and number == literal
+    return False
+
+
+def _compare(x: Any, literal: Any, compare) -> bool:
+    if isinstance(literal, (int, float)):
+        x = to_number(x)
+        if x is None:
+            return False
+    try:
+        return compare(x, literal)
+    except TypeError: # Not comparable types
+        return False
 
 
 class FilterParser(Parser):
@@ -9,7 +35,8 @@ class FilterParser(Parser):
 
     precedence = (
         ('left', AND, OR),
-        ('left', EQ, NE),
+        ('right', NOT),
+        ('left', EQ, NE, LT, LE, GT, GE, IN),
         ('right', ATTR),
     )
 
@@ -23,6 +50,10 @@ class FilterParser(Parser):
     @_('expr OR term')
     def expr(self, p):
         return [x or y for x, y in zip(p.expr, p.term)]
+
+    @_('NOT expr')
+    def expr(self, p):
+        return [not x for x in p.expr]
     
     @_('term')
     def expr(self, p):
@@ -30,11 +61,39 @@ class FilterParser(Parser):
 
     @_('term EQ factor')
     def term(self, p):
-        return [p.term in x and x[p.term] == p.factor for x in self.__get_items()]
+        # Production values are read once, not for each item
+        term, factor = p.term, p.factor
+        return [term in x and _equals(x[term], factor) for x in self.__get_items()]
 
     @_('term NE factor')
     def term(self, p):
-        return [p.term not in x or x[p.term] != p.factor for x in self.__get_items()]
+        term, factor = p.term, p.factor
+        return [term not in x or not _equals(x[term], factor) for x in self.__get_items()]
+
+    @_('term LT factor')
+    def term(self, p):
+        term, factor = p.term, p.factor
+        return [term in x and _compare(x[term], factor, operator.lt) for x in self.__get_items()]
+
+    @_('term LE factor')
+    def term(self, p):
+        term, factor = p.term, p.factor
+        return [term in x and _compare(x[term], factor, operator.le) for x in self.__get_items()]
+
+    @_('term GT factor')
+    def term(self, p):
+        term, factor = p.term, p.factor
+        return [term in x and _compare(x[term], factor, operator.gt) for x in self.__get_items()]
+
+    @_('term GE factor')
+    def term(self, p):
+        term, factor = p.term, p.factor
+        return [term in x and _compare(x[term], factor, operator.ge) for x in self.__get_items()]
+
+    @_('term IN LPAREN literals RPAREN')
+    def term(self, p):
+        term, literals = p.term, p.literals
+        return [term in x and any(_equals(x[term], y) for y in literals) for x in self.__get_items()]
 
     @_('ATTR factor')
     def term(self, p):
@@ -45,24 +104,36 @@ class FilterParser(Parser):
     def term(self, p):
         return p.factor
 
-    @_('NUMBER')
-    def factor(self, p):
-        return p.NUMBER
+    @_('literals COMMA literal')
+    def literals(self, p):
+        return p.literals + [p.literal]
 
-    @_('TEXT')
-    def factor(self, p):
-        return p.TEXT
+    @_('literal')
+    def literals(self, p):
+        return [p.literal]
 
-    @_('ID')
+    @_('literal')
     def factor(self, p):
-        return p.ID
+        return p.literal
 
     @_('LPAREN expr RPAREN')
     def factor(self, p):
         return p.expr
 
+    @_('NUMBER')
+    def literal(self, p):
+        return float(p.NUMBER) if '.' in p.NUMBER else int(p.NUMBER)
+
+    @_('TEXT')
+    def literal(self, p):
+        return p.TEXT
+
+    @_('ID')
+    def literal(self, p):
+        return p.ID
+
     def __get_items(self):
         if self.use_attributes:
             self.use_attributes = False
-            return (x[ATTRIBUTES] for x in self.items)
+            return (x[ATTRIBUTES] if ATTRIBUTES in x else {} for x in self.items)
         return self.items
@@ -0,0 +1,67 @@
+from typing import Any, Callable, Iterator, List
+from itertools import islice
+
+
+class QueryCursor:
+    """Cursor over the values of a query made by `TreeBuilder.query`.
+
+    The values are read page by page, the walk of the tree stops at the end of each
+    page and continues from there for the next one. When the tree is modified in a way
+    which can change the query result, the next page walks the tree again from the
+    beginning and skips the values already read.
+
+    Args:
+        walk (Callable[[], Iterator[Any]]): Starts a new walk which yields the values.
+        generation (Callable[[], Any]): Gets the state of the tree read by the query.
+        limit (int): Default number of values by page, None for all the values.
+        offset (int): Number of values to skip before the first page.
+    """
+    @property
+    def position(self) -> int:
+        """[int]: Gets the number of values skipped or read so far."""
+        return self.__position
+
+    @property
+    def done(self) -> bool:
+        """[bool]: Gets if the last page has been read."""
+        return self.__done
+
+    def __init__(self, walk: Callable[[], Iterator[Any]], generation: Callable[[], Any], limit: int = None, offset: int = 0):
+        import threading
+
+        self.__walk = walk
+        # A cursor can be shared between threads, its pages are read one at a time
+        self.__lock = threading.Lock()
+        self.__get_generation = generation
+        self.__limit = limit
+        self.__position = offset
+        self.__done = False
+        self.__values = None
+        self.__generation = None
+
+    def fetch(self, limit: int = None) -> List[Any]:
+        """Read the next page of values.
+
+        Args:
+            limit (int, optional): Number of values to read. Defaults to None for the cursor limit.
+
+        Returns:
+            List[Any]: The values, fewer than the limit, or empty, once the end is reached.
+        """
+        limit = self.__limit if limit is None else limit
+
+        # The walk is suspended between pages, so a modification is only seen by the generation
+        with self.__lock:
+            generation = self.__get_generation()
+            if self.__values is None or generation != self.__generation:
+                self.__values = islice(self.__walk(), self.__position, None)
+                self.__generation = generation
+
+            page = list(self.__values) if limit is None else list(islice(self.__values, limit))
+            self.__position += len(page)
+            self.__done = limit is None or len(page) < limit
+        return page
+
+    def __iter__(self) -> Iterator[Any]:
+        while not self.__done:
+            yield from self.fetch()
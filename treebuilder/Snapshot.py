@@ -0,0 +1,15 @@
+from typing import Any, Dict
+
+
+class Snapshot:
+    """Snapshot of a tree taken by `TreeBuilder.snapshot`.
+
+    The snapshot shares its nodes with the builder, they must not be modified.
+    """
+    @property
+    def root(self) -> Dict[str, Any]:
+        """[Dict[str, Any]]: Gets the tree root as it was when the snapshot has been taken."""
+        return self.__root
+
+    def __init__(self, root: Dict[str, Any]):
+        self.__root = root
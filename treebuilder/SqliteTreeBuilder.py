@@ -0,0 +1,519 @@
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+from itertools import groupby
+import json
+import os
+
+from treebuilder.constants import ATTRIBUTES
+from treebuilder.expand import expand
+from treebuilder.cross import cross
+from treebuilder.nest import nest
+from treebuilder.traversal import compile_xpath, filter_items
+from treebuilder.compression import get_compression, write_compressed
+
+
+# Kinds of the entries: node list, scalar stored as it is or value stored as JSON
+LIST, SCALAR, JSON = 0, 1, 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (id INTEGER PRIMARY KEY, parent INTEGER, tag TEXT, position INTEGER);
+CREATE INDEX IF NOT EXISTS nodes_by_parent ON nodes (parent, tag, position);
+CREATE TABLE IF NOT EXISTS entries (node INTEGER, position INTEGER, entry TEXT, kind INTEGER, value, PRIMARY KEY (node, entry)) WITHOUT ROWID;
+CREATE TEMP TABLE IF NOT EXISTS level (rank INTEGER PRIMARY KEY, id INTEGER);
+"""
+
+# Number of ids given at once to an `IN` clause
+CHUNK_SIZE = 500
+
+
+def _chunks(ids: List[int]) -> Iterator[List[int]]:
+    for i in range(0, len(ids), CHUNK_SIZE):
+        yield ids[i:i + CHUNK_SIZE]
+
+
+def _encode(value: Any) -> Tuple[int, Any]:
+    if value is None or type(value) in (str, int, float):
+        return SCALAR, value
+    return JSON, json.dumps(value)
+
+
+def _is_node_list(value: Any) -> bool:
+    return isinstance(value, list) and all(isinstance(x, dict) for x in value)
+
+
+def _decode(kind: int, value: Any) -> Any:
+    return json.loads(value) if kind == JSON else value
+
+
+class SqliteNodes(list):
+    """Node list of a `SqliteTreeBuilder` read from the database while it's iterated.
+
+    Each iteration builds new nodes, where the node lists are `SqliteNodes` too,
+    so only the walked path of the tree is held in memory.
+    """
+    def __init__(self, read: Callable[[int, str, int, int], Iterator[Dict[str, Any]]], count: Callable[[int, str], int], parent: int, tag: str):
+        super().__init__()
+        self.__read = read
+        self.__count = count
+        self.__parent = parent
+        self.__tag = tag
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.__read(self.__parent, self.__tag, -1, 0)
+
+    def __len__(self) -> int:
+        return self.__count(self.__parent, self.__tag)
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        if index < 0:
+            index += len(self)
+        for node in self.__read(self.__parent, self.__tag, 1, index):
+            return node
+        raise IndexError('SqliteNodes index out of range')
+
+    def __repr__(self) -> str:
+        return f'SqliteNodes({self.__parent!r}, {self.__tag!r})'
+
+
+class SqliteTreeBuilder:
+    """Tree builder which keeps the tree in a SQLite database.
+
+    The nodes are stored in a `nodes` table with their parent, tag and position,
+    and their leaves and attributes in an `entries` table. Only the ids of the nodes
+    selected by an operation are held in memory, so a tree larger than the memory
+    can be built. SQLite keeps the recently used pages in its cache.
+
+    Each xpath step is an indexed query on the children of the previous step nodes.
+    A filter is evaluated on the leaves of each node list, read one list at a time.
+    The values are stored as they are for strings, numbers and None, as JSON otherwise.
+    The `deep_copy` arguments are kept for compatibility with `TreeBuilder`: values
+    are always copied into the database.
+
+    The serializations stream the tree from the database, so they never hold it in memory.
+
+    Args:
+        path (str, optional): Database file path, the tree is built again from an existing
+            database. Defaults to None for a temporary file removed by `close`.
+        cache_size (int, optional): SQLite page cache size in KB. Defaults to 64MB.
+
+    Examples:
+        >>> import treebuilder as tb
+        >>> with tb.SqliteTreeBuilder() as builder:
+        >>>     builder.expand('bookstore/book/title', ['Sapiens', 'Harry Potter'])
+        >>>     builder.cross('bookstore/book/copy_number', [1, 2])
+        >>>     builder.to_xml('bookstore.xml')
+    """
+    __ROOT = 1
+
+    @property
+    def root(self) -> Dict[str, Any]:
+        """[Dict[str, Any]]: Gets the tree root, the whole tree is loaded in memory."""
+        return self.__load([self.__ROOT])[0]
+
+    def __init__(self, path: str = None, cache_size: int = 64 * 1024):
+        # Imported here, so importing treebuilder doesn't load them
+        import sqlite3
+        import tempfile
+
+        self.__temporary = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(suffix='.sqlite')
+            os.close(fd)
+        self.__path = path
+
+        self.__connection = sqlite3.connect(path)
+        self.__connection.execute(f'PRAGMA cache_size = -{int(cache_size)}')
+        self.__connection.execute('PRAGMA journal_mode = WAL')
+        self.__connection.execute('PRAGMA synchronous = NORMAL')
+        self.__connection.executescript(SCHEMA)
+        self.__connection.execute('INSERT OR IGNORE INTO nodes (id, parent, tag, position) VALUES (?, NULL, NULL, 0)', (self.__ROOT,))
+        self.__connection.commit()
+
+        self.__next_id = self.__connection.execute('SELECT MAX(id) FROM nodes').fetchone()[0] + 1
+
+    def __enter__(self) -> 'SqliteTreeBuilder':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Close the database, it's removed when it's a temporary file."""
+        self.__connection.close()
+        if self.__temporary:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(self.__path + suffix):
+                    os.remove(self.__path + suffix)
+
+    def set(self, xpath: str, value: Any, deep_copy: bool = True) -> 'SqliteTreeBuilder':
+        """Set value for a tree sub set, see `TreeBuilder.set`.
+
+        Returns:
+            SqliteTreeBuilder: Returns the builder itself.
+        """
+        return self.expand(xpath, [value], deep_copy)
+
+    def expand(self, xpath: str, values: List[Any], deep_copy: bool = True) -> 'SqliteTreeBuilder':
+        """Expand the sub set tree with values, see `TreeBuilder.expand`.
+
+        Returns:
+            SqliteTreeBuilder: Returns the builder itself.
+        """
+        return self.__apply(expand, xpath, values)
+
+    def nest(self, xpath: str, values: List[Any], deep_copy: bool = True) -> 'SqliteTreeBuilder':
+        """Nest the sub set tree with values, see `TreeBuilder.nest`.
+
+        Returns:
+            SqliteTreeBuilder: Returns the builder itself.
+        """
+        return self.__apply(nest, xpath, values)
+
+    def cross(self, xpath: str, values: List[Any], deep_copy: bool = True) -> 'SqliteTreeBuilder':
+        """Cross the sub set tree with values, see `TreeBuilder.cross`.
+
+        Returns:
+            SqliteTreeBuilder: Returns the builder itself.
+        """
+        return self.__apply(cross, xpath, values)
+
+    def get_items(self, xpath: str, unlist: bool = True) -> List[Any]:
+        """Get sub set tree elements, see `TreeBuilder.get_items`.
+
+        Returns:
+            List[Any]: Returns the sub set tree elements find by the xpath.
+        """
+        entry, owners = self.__select(xpath, readonly=True)
+        attribute = entry.startswith('@')
+
+        values, lists = {}, {}
+        for chunk in _chunks([x for x in owners if x is not None]):
+            rows = self.__connection.execute(
+                f'SELECT node, kind, value FROM entries WHERE entry = ? AND node IN ({",".join("?" * len(chunk))})', [entry] + chunk)
+            for node, kind, value in rows:
+                if kind == LIST:
+                    lists[node] = None
+                else:
+                    values[node] = _decode(kind, value)
+
+        # Node lists are loaded with their sub trees
+        children = {}
+        for chunk in _chunks(list(lists)):
+            rows = self.__connection.execute(
+                f'SELECT parent, id FROM nodes WHERE tag = ? AND parent IN ({",".join("?" * len(chunk))}) ORDER BY parent, position', [entry] + chunk)
+            for parent, id in rows:
+                children.setdefault(parent, []).append(id)
+        loaded = iter(self.__load([id for x in lists for id in children.get(x, [])]))
+        for node in lists:
+            values[node] = [next(loaded) for _ in children.get(node, [])]
+
+        result = []
+        for owner in owners:
+            value = values.get(owner)
+            if unlist and not attribute and isinstance(value, list):
+                result.extend(value)
+            else:
+                result.append(value)
+        return result
+
+    def to_xml(self, file_path: str, root: str = None, pretty: bool = True, compression: str = 'infer'):
+        """Serialize the tree to a XML file, streamed from the database.
+
+        Args:
+            file_path (str): Xml file path
+            root (str, optional): Additional xml root if needed. Defaults to None.
+            pretty (bool, optional): Define if you want a human reading output or not. Defaults to True.
+            compression (str, optional): `gzip`, `bz2`, `zstd`, None or `infer` to deduce it
+                from the file extension. Defaults to 'infer'.
+        """
+        from treebuilder.xml import iter_xml
+        self.__write(iter_xml(self.__view(), root=root, pretty=pretty), file_path, compression)
+
+    def to_json(self, file_path: str, pretty: bool = True, compression: str = 'infer'):
+        """Serialize the tree to a JSON file, streamed from the database.
+
+        Args:
+            file_path (str): JSON file path
+            pretty (bool, optional): Define if you want a human reading output or not. Defaults to True.
+            compression (str, optional): `gzip`, `bz2`, `zstd`, None or `infer` to deduce it
+                from the file extension. Defaults to 'infer'.
+        """
+        from treebuilder.json import iter_json
+        self.__write(iter_json(self.__view(), pretty=pretty), file_path, compression)
+
+    def __write(self, pieces: Iterator[str], file_path: str, compression: str):
+        compression = get_compression(file_path, compression)
+        if compression is not None:
+            write_compressed(pieces, file_path, compression)
+            return
+
+        with open(file_path, mode='w') as f:
+            f.writelines(pieces)
+
+    def __apply(self, function, xpath: str, values: List[Any]) -> 'SqliteTreeBuilder':
+        # Like `TreeBuilder`, nothing crossed leaves the node added for a filter unattached
+        entry, owners = self.__select(xpath, attach=function is not cross or len(values) > 0)
+
+        # The functions run on the ids of the selected nodes, their clones are copied in the database
+        ids = '__ID__'
+        items = [{ ids: x } for x in owners]
+        originals = set(id(x) for x in items)
+        items = function(items, entry, values, False)
+
+        clones, assignments = [], []
+        for item in items:
+            if ids not in item:
+                continue
+            if id(item) not in originals:
+                clone = self.__allocate()
+                clones.append((item[ids], clone))
+                item[ids] = clone
+            if entry in item:
+                assignments.append((item[ids], item[entry]))
+
+        with self.__connection:
+            self.__copy_nodes(clones)
+            self.__set_entries(entry, assignments)
+        return self
+
+    def __allocate(self) -> int:
+        id = self.__next_id
+        self.__next_id += 1
+        return id
+
+    def __select(self, xpath: str, readonly: bool = False, attach: bool = True) -> Tuple[str, List[int]]:
+        # Walks the xpath level by level, missing nodes are created or are None when readonly
+        split, steps = xpath.split('/'), compile_xpath(xpath)
+        max_depth = len(steps) - 1
+
+        level = [self.__ROOT]
+        with self.__connection:
+            for index in range(max_depth):
+                if steps[index] is not None:
+                    level = self.__select_children(level, steps[index], readonly, attach=attach and index == max_depth - 1)
+        return split[max_depth], level
+
+    def __select_children(self, level: List[int], step: Tuple[str, str], readonly: bool, attach: bool) -> List[int]:
+        tag, filter = step
+        connection = self.__connection
+
+        connection.execute('DELETE FROM level')
+        connection.executemany('INSERT INTO level (rank, id) VALUES (?, ?)', ((i, x) for i, x in enumerate(level) if x is not None))
+        if filter is None:
+            rows = connection.execute(
+                'SELECT l.id, n.id FROM level l JOIN nodes n ON n.parent = l.id AND n.tag = ? ORDER BY l.rank, n.position', (tag,))
+        else:
+            rows = connection.execute(
+                'SELECT l.id, n.id, e.entry, e.kind, e.value FROM level l JOIN nodes n ON n.parent = l.id AND n.tag = ? '
+                'LEFT JOIN entries e ON e.node = n.id AND e.kind != ? ORDER BY l.rank, n.position, e.position', (tag, LIST))
+
+        groups = groupby(rows, key=lambda x: x[0])
+        group = next(groups, None)
+
+        result, created = [], []
+        for parent in level:
+            children = []
+            if parent is not None and group is not None and group[0] == parent:
+                children = list(group[1])
+                group = next(groups, None)
+
+            exists = len(children) > 0
+            if filter is not None and exists:
+                # The leaves of each node list are read once to evaluate the filter
+                nodes = [(id, self.__to_node(x[2:] for x in entries)) for id, entries in groupby(children, key=lambda x: x[1])]
+                fil = filter_items([x for _, x in nodes], filter)
+                children = [id for (id, _), f in zip(nodes, fil) if f]
+            else:
+                children = [x[1] for x in children]
+
+            if len(children) > 0:
+                result.extend(children)
+            elif readonly:
+                result.append(None)
+            elif not exists or attach:
+                # Like `TreeBuilder`, a node is added to hit the leaf level. When a filter matches
+                # nothing above the last level, the added node is never attached so it's skipped
+                created.append((parent, len(result)))
+                result.append(None)
+
+        for parent, index in created:
+            result[index] = self.__add_node(parent, tag)
+        return result
+
+    def __to_node(self, entries: Iterator[Tuple[str, int, Any]]) -> Dict[str, Any]:
+        node = {}
+        for entry, kind, value in entries:
+            if entry is None: # A node without entry
+                continue
+            if entry.startswith('@'):
+                node.setdefault(ATTRIBUTES, {})[entry[1:]] = _decode(kind, value)
+            else:
+                node[entry] = _decode(kind, value)
+        return node
+
+    def __add_node(self, parent: int, tag: str) -> int:
+        connection, id = self.__connection, self.__allocate()
+        connection.execute(
+            'INSERT OR IGNORE INTO entries (node, position, entry, kind, value) '
+            'SELECT ?, COALESCE(MAX(position), -1) + 1, ?, ?, NULL FROM entries WHERE node = ?', (parent, tag, LIST, parent))
+        connection.execute(
+            'INSERT INTO nodes (id, parent, tag, position) '
+            'SELECT ?, ?, ?, COALESCE(MAX(position), -1) + 1 FROM nodes WHERE parent = ? AND tag = ?', (id, parent, tag, parent, tag))
+        return id
+
+    def __copy_nodes(self, clones: List[Tuple[int, int]]):
+        # Clones are added at the end of their parent list, with a copy of their sub tree
+        connection = self.__connection
+        positions = {}
+        rows = []
+        for chunk in _chunks(clones):
+            sources = dict(chunk)
+            for id, parent, tag in connection.execute(
+                    f'SELECT id, parent, tag FROM nodes WHERE id IN ({",".join("?" * len(sources))})', list(sources)):
+                sources[id] = (parent, tag)
+            for source, clone in chunk:
+                parent, tag = sources[source]
+                if (parent, tag) not in positions:
+                    positions[(parent, tag)] = connection.execute(
+                        'SELECT COALESCE(MAX(position), -1) FROM nodes WHERE parent = ? AND tag = ?', (parent, tag)).fetchone()[0]
+                positions[(parent, tag)] += 1
+                rows.append((clone, parent, tag, positions[(parent, tag)]))
+        connection.executemany('INSERT INTO nodes (id, parent, tag, position) VALUES (?, ?, ?, ?)', rows)
+
+        # Then the sub trees level by level
+        while len(clones) > 0:
+            connection.executemany(
+                'INSERT INTO entries (node, position, entry, kind, value) SELECT ?, position, entry, kind, value FROM entries WHERE node = ?',
+                ((clone, source) for source, clone in clones))
+
+            children, rows = [], []
+            for chunk in _chunks(clones):
+                # A node can be cloned several times
+                mapping = {}
+                for source, clone in chunk:
+                    mapping.setdefault(source, []).append(clone)
+                for id, parent, tag, position in connection.execute(
+                        f'SELECT id, parent, tag, position FROM nodes WHERE parent IN ({",".join("?" * len(mapping))})', list(mapping)):
+                    for parent_clone in mapping[parent]:
+                        clone = self.__allocate()
+                        children.append((id, clone))
+                        rows.append((clone, parent_clone, tag, position))
+            connection.executemany('INSERT INTO nodes (id, parent, tag, position) VALUES (?, ?, ?, ?)', rows)
+            clones = children
+
+    def __set_entries(self, entry: str, assignments: List[Tuple[int, Any]]):
+        connection = self.__connection
+
+        # A node list replaced by a value is removed with its sub tree
+        ids = [x for x, _ in assignments]
+        removed = []
+        for chunk in _chunks(ids):
+            removed += [x for x, in connection.execute(
+                f'SELECT node FROM entries WHERE entry = ? AND kind = ? AND node IN ({",".join("?" * len(chunk))})', [entry, LIST] + chunk)]
+        nodes = []
+        for chunk in _chunks(removed):
+            nodes += [x for x, in connection.execute(
+                f'SELECT id FROM nodes WHERE tag = ? AND parent IN ({",".join("?" * len(chunk))})', [entry] + chunk)]
+        self.__delete_nodes(nodes)
+
+        # A list of nodes is stored as a node list, other values as leaves
+        rows, lists = [], []
+        for node, value in assignments:
+            if _is_node_list(value):
+                rows.append((node, entry, entry, LIST, None, node))
+                lists.append((node, entry, value))
+            else:
+                rows.append((node, entry, entry, *_encode(value), node))
+        # An updated entry keeps its position, upserts need SQLite 3.24 so the row is replaced
+        connection.executemany(
+            'INSERT OR REPLACE INTO entries (node, position, entry, kind, value) '
+            'SELECT ?, COALESCE(MAX(CASE WHEN entry = ? THEN position END), MAX(position) + 1, 0), ?, ?, ? '
+            'FROM entries WHERE node = ?', rows)
+        self.__insert_nodes(lists)
+
+    def __insert_nodes(self, lists: List[Tuple[int, str, List[Dict[str, Any]]]]):
+        # Node lists are inserted level by level, with their leaves
+        connection = self.__connection
+        while len(lists) > 0:
+            nodes, entries, children = [], [], []
+            for parent, tag, items in lists:
+                for position, item in enumerate(items):
+                    id = self.__allocate()
+                    nodes.append((id, parent, tag, position))
+                    for entry, value in item.items():
+                        if entry == ATTRIBUTES:
+                            for name, attribute in value.items():
+                                entries.append((id, len(entries), f'@{name}', *_encode(attribute)))
+                        elif _is_node_list(value):
+                            entries.append((id, len(entries), entry, LIST, None))
+                            children.append((id, entry, value))
+                        else:
+                            entries.append((id, len(entries), entry, *_encode(value)))
+            connection.executemany('INSERT INTO nodes (id, parent, tag, position) VALUES (?, ?, ?, ?)', nodes)
+            connection.executemany('INSERT INTO entries (node, position, entry, kind, value) VALUES (?, ?, ?, ?, ?)', entries)
+            lists = children
+
+    def __delete_nodes(self, ids: List[int]):
+        connection = self.__connection
+        while len(ids) > 0:
+            children = []
+            for chunk in _chunks(ids):
+                marks = ",".join("?" * len(chunk))
+                children += [x for x, in connection.execute(f'SELECT id FROM nodes WHERE parent IN ({marks})', chunk)]
+                connection.execute(f'DELETE FROM entries WHERE node IN ({marks})', chunk)
+                connection.execute(f'DELETE FROM nodes WHERE id IN ({marks})', chunk)
+            ids = children
+
+    def __load(self, ids: List[int]) -> List[Dict[str, Any]]:
+        # Loads the sub trees level by level
+        nodes = { x: {} for x in ids }
+        level = list(nodes)
+        while len(level) > 0:
+            children = []
+            for chunk in _chunks(level):
+                marks = ",".join("?" * len(chunk))
+                for node, entry, kind, value in self.__connection.execute(
+                        f'SELECT node, entry, kind, value FROM entries WHERE node IN ({marks}) ORDER BY node, position', chunk):
+                    if kind == LIST:
+                        nodes[node][entry] = []
+                    elif entry.startswith('@'):
+                        nodes[node].setdefault(ATTRIBUTES, {})[entry[1:]] = _decode(kind, value)
+                    else:
+                        nodes[node][entry] = _decode(kind, value)
+                for id, parent, tag in self.__connection.execute(
+                        f'SELECT id, parent, tag FROM nodes WHERE parent IN ({marks}) ORDER BY parent, tag, position', chunk):
+                    nodes[id] = {}
+                    nodes[parent][tag].append(nodes[id])
+                    children.append(id)
+            level = children
+        return [nodes[x] for x in ids]
+
+    def __view(self) -> Dict[str, Any]:
+        return next(self.__read(None, None, 1, 0, root=True))
+
+    def __read(self, parent: int, tag: str, limit: int, offset: int, root: bool = False) -> Iterator[Dict[str, Any]]:
+        # Nodes are built with their leaves, their node lists are read when they are iterated
+        if root:
+            rows = self.__connection.execute(
+                'SELECT n.id, e.entry, e.kind, e.value FROM nodes n LEFT JOIN entries e ON e.node = n.id '
+                'WHERE n.id = ? ORDER BY e.position', (self.__ROOT,))
+        else:
+            rows = self.__connection.execute(
+                'SELECT n.id, e.entry, e.kind, e.value FROM (SELECT id, position FROM nodes WHERE parent = ? AND tag = ? '
+                'ORDER BY position LIMIT ? OFFSET ?) n LEFT JOIN entries e ON e.node = n.id ORDER BY n.position, e.position',
+                (parent, tag, limit, offset))
+
+        for id, entries in groupby(rows, key=lambda x: x[0]):
+            node = {}
+            for _, entry, kind, value in entries:
+                if entry is None:
+                    continue
+                if kind == LIST:
+                    node[entry] = SqliteNodes(self.__read, self.__count, id, entry)
+                elif entry.startswith('@'):
+                    node.setdefault(ATTRIBUTES, {})[entry[1:]] = _decode(kind, value)
+                else:
+                    node[entry] = _decode(kind, value)
+            yield node
+
+    def __count(self, parent: int, tag: str) -> int:
+        return self.__connection.execute('SELECT COUNT(*) FROM nodes WHERE parent = ? AND tag = ?', (parent, tag)).fetchone()[0]
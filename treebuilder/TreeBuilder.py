@@ -1,29 +1,82 @@
-from typing import Any, Dict, List, Tuple
-from collections import deque
-from itertools import compress
-
-from treebuilder.constants import ATTRIBUTES, PARENT
-from treebuilder.FilterLexer import FilterLexer
-from treebuilder.FilterParser import FilterParser
-from treebuilder.expand import expand
-from treebuilder.cross import cross
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+import weakref
+from itertools import compress, repeat
+
+from treebuilder.constants import ATTRIBUTES, PARENT, DEFAULT_CHUNK_SIZE, DEFAULT_BATCH_SIZE, QUERY_CACHE_SIZE, SCALARS
+from treebuilder.Snapshot import Snapshot
+from treebuilder.traversal import compile_xpath, split_step, filter_items
+from treebuilder.QueryCursor import QueryCursor
+from treebuilder.expand import expand, expand_columns, expand_records
+from treebuilder.cross import cross, cross_product, FactorizedCross
 from treebuilder.nest import nest
+from treebuilder.stats import memory_stats
+from treebuilder.aggregate import aggregate, aggregate_by
+from treebuilder.diff import diff, hash_tree
+from treebuilder.compact import compact
 from treebuilder.xml import to_xml
 from treebuilder.json import to_json
+from treebuilder.sqlite import to_sqlite
+from treebuilder.arrow import to_arrow, to_parquet
+from treebuilder.export import export, to_jsonl
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+    import pyarrow
 
 
 class TreeBuilder:
     """Tree bulider main class.
+
+    A builder can be shared between threads. Operations which modify the tree
+    (`set`, `expand`, `nest`, `cross`, ...) are serialized by a lock. Reads (`get_items`, 
+    `query`, `aggregate`, `digest`, serializations, ...) don't take it: they read the 
+    `snapshot` of the tree published by the first read after a modification, so they 
+    run in parallel and never observe a modification partially applied. While a read 
+    holds this snapshot, the modifications copy the nodes they modify instead of 
+    updating them in place. The `root` property gives the tree itself, to read it 
+    while another thread modifies the builder read the root of a `snapshot` instead.
+
+    In lazy mode, operations are recorded into a plan which is executed on the first 
+    read (`root`, `get_items`, serializations, ...). Consecutive operations on the same 
+    level without filter are then fused to walk this level only once. Note that values
+    are read when the plan is executed.
+
+    In compact mode, identical subtrees are shared after each operation, or each 
+    execution of the plan in lazy mode, see `compact`.
+
+    Args:
+        lazy (bool): Record operations and defer their execution. Default is False.
+        compact (bool): Share identical subtrees after the operations. Default is False.
     """
     @property
     def root(self):
         """[Dict[str, Any]]: Gets the tree root."""
+        self.__expose()
+        self.flush()
         return self.__root
 
-    def __init__(self):
+    def __init__(self, lazy: bool = False, compact: bool = False):
+        import threading
+
         self.__root = {}
-        self.__lexer = FilterLexer()
-        self.__parser = FilterParser()
+        self.__lazy = lazy
+        self.__compact = compact
+        self.__plan = []
+        self.__lock = threading.RLock()
+        self.__snapshots = weakref.WeakSet()
+        self.__owned = set()
+        # Content hash of the nodes by id, a modifying walk removes the nodes it visits
+        self.__hashes = {}
+        # Shared instances by content hash, once compacted nodes are always copied on write
+        self.__canonical = {}
+        self.__shared = False
+        # Query results by xpath, valid while the generations of the levels they read don't change
+        self.__queries = {}
+        self.__exposed = False
+        self.__sub_generations = {}
+        self.__path_generations = {}
+        # Snapshot read by the reads with the generations of its levels, None after a modification
+        self.__published = None
 
     def set(self, xpath: str, value: Any, deep_copy: bool = True) -> 'TreeBuilder':
         """Set value for a tree sub set
@@ -70,25 +123,116 @@ class TreeBuilder:
         Returns:
             TreeBuilder: Returns the builder itself.
         """
-        entry, items, parents = self.__get_items(xpath, from_ancestor)
+        return self.__apply(('expand', xpath, values, deep_copy, from_ancestor))
+
+    def __expand(self, xpath: str, values: List[Any], deep_copy: bool, from_ancestor: str) -> 'TreeBuilder':
+        # A single value is applied the same way on each item
+        factorized = from_ancestor is None and len(values) == 1
+        entry, items, parents = self.__get_items(xpath, from_ancestor, factorized=factorized)
 
         if from_ancestor is not None:
             # Generate ancestor nodes noly if needed
-            if len(values) > len(items):
+            expanded = len(values) > len(items)
+            if expanded:
                 nodes = self.__generate_ancestor_nodes_as_values(items, entry, len(values))
                 items = expand(items, entry, nodes, deep_copy)
+
+            # Values are applied in the tree order, where generated ancestors are 
+            # at the end of their parent list
+            items = self.__sort_by_parent(items, parents)
+
+            depth = self.__get_entry_depth(xpath, from_ancestor)
+            starts = [(depth, x, parents[x[PARENT]]) for x in items]
+
+            if expanded:
                 self.__attach_items_to_tree(items, entry, parents)
             else:
                 [item.pop(PARENT) for item in items]
 
             # Apply values (no more expansions)
-            return self.expand(xpath, values, deep_copy)
+            return self.__expand_below(xpath, starts, values, deep_copy)
 
         items = expand(items, entry, values, deep_copy)
         self.__attach_items_to_tree(items, entry, parents)
 
         return self
 
+    def __expand_below(self, xpath: str, starts: List[Tuple[int, Dict[str, Any], List]], values: List[Any], deep_copy: bool) -> 'TreeBuilder':
+        # Walk only the sub trees of the already selected ancestors instead of the whole tree
+        entry, items, parents = self.__get_items(xpath, starts=starts)
+        items = expand(items, entry, values, deep_copy)
+        self.__attach_items_to_tree(items, entry, parents)
+
+        return self
+
+    def expand_columns(self, xpath: str, columns: Dict[str, List[Any]], deep_copy: bool = True) -> 'TreeBuilder':
+        """Expand the sub set tree with several values lists at once
+
+        This fuction use the `treebuilder.expand_columns`. The source list is the tree sub 
+        set selected by the given xpath and the keys of `columns` are the entries.
+        The tree is walked once and each new node is cloned only once. It gives the same nodes 
+        and values than successive `expand` calls, one by column, when the xpath selects nodes 
+        in each parent list, but the attributes of a node can come after its new leaves. 
+        Where the xpath selects no node of a parent list, e.g. with a filter which matches 
+        nothing, each `expand` call would add its own nodes while here new nodes get all 
+        the columns.
+
+        Args:
+            xpath: (str): The xpath to extract tree sub set
+            columns: (Dict[str, List[Any]]): Values to apply by entry.
+            deep_copy (bool): Make a deep copy on values for each usages. Default is True.
+
+        Examples:
+            >>> import treebuilder as tb
+            >>> builder = TreeBuilder()
+            >>> builder.expand_columns('bookstore/book', {'title': ['Sapiens', 'Harry Potter'], 'id': [1, 2], '@lang': ['en']})
+            >>> print(builder.root)
+
+        Returns:
+            TreeBuilder: Returns the builder itself.
+        """
+        return self.__apply(('columns', xpath, columns, deep_copy, None))
+
+    def expand_records(self, xpath: str, records: List[Dict[str, Any]], deep_copy: bool = True) -> 'TreeBuilder':
+        """Expand the sub set tree with records
+
+        This fuction use the `treebuilder.expand_records`. The source list is the tree sub 
+        set selected by the given xpath and each record gives the entries of a node.
+        The tree is walked once and each new node is cloned only once.
+
+        Args:
+            xpath: (str): The xpath to extract tree sub set
+            records: (List[Dict[str, Any]]): Entries and values of each node.
+            deep_copy (bool): Make a deep copy on values for each usages. Default is True.
+
+        Examples:
+            >>> import treebuilder as tb
+            >>> builder = TreeBuilder()
+            >>> builder.expand_records('bookstore/book', [{'title': 'Sapiens', 'id': 1}, {'title': 'Harry Potter', 'id': 2}])
+            >>> print(builder.root)
+
+        Returns:
+            TreeBuilder: Returns the builder itself.
+        """
+        return self.__apply(('records', xpath, records, deep_copy, None))
+
+    def __expand_rows(self, xpath: str, entries: List[str], function, values: Any, deep_copy: bool) -> 'TreeBuilder':
+        # Several entries can be overriden by a factorized cross, so its level is materialized
+        _, items, parents = self.__get_items(f'{xpath}/{entries[0]}')
+        if function is expand_columns:
+            # Successive expands would walk the items again grouped by parent list before each column
+            rank = {}
+            [rank.setdefault(id(parent), parent_id) for parent_id, parent in parents.items()]
+            items = expand_columns(items, values, deep_copy, groups=[rank[id(parents[x[PARENT]])] for x in items])
+        else:
+            items = function(items, values, deep_copy)
+        self.__append_items_to_parents(items, parents)
+        for entry in entries:
+            if entry.startswith('@'): # Records can miss an entry
+                self.__move_attributes([x for x in items if entry in x], entry)
+
+        return self
+
     def nest(self, xpath: str, values: List[Any], deep_copy: bool = True) -> 'TreeBuilder':
         """Nest the sub set tree with values.
 
@@ -112,24 +256,35 @@ class TreeBuilder:
         Returns:
             TreeBuilder: Returns the builder itself.
         """
-        entry, items, parents = self.__get_items(xpath)
+        return self.__apply(('nest', xpath, values, deep_copy, None))
+
+    def __nest(self, xpath: str, values: List[Any], deep_copy: bool) -> 'TreeBuilder':
+        entry, items, parents = self.__get_items(xpath, factorized=len(values) == 1)
         items = nest(items, entry, values, deep_copy)
         self.__attach_items_to_tree(items, entry, parents)
 
         return self
 
-    def cross(self, xpath: str, values: List[Any], deep_copy: bool = True, from_ancestor: str = None) -> 'TreeBuilder':
+    def cross(self, xpath: str, values: List[Any], deep_copy: bool = True, from_ancestor: str = None, 
+              factorize: bool = False) -> 'TreeBuilder':
         """Cross the sub set tree with values.
 
         This fuction use the `treebuilder.cross`. The source list is the tree sub 
         set selected by the given xpath and the last xpath tag is the entry key.
         For more details see the `treebuilder.cross` function documentation.
 
+        When `factorize` is True, each crossed list is stored as a `treebuilder.FactorizedCross`
+        and its items are built only when they are iterated: by serializations or queries.
+        Crossing again the same level, or crossing a deeper level, keeps it factorized. 
+        Other operations going through the level materialize it. A filter on the crossed 
+        level, an attribute entry or `from_ancestor` fallback to a regular cross.
+
         Args:
             xpath: (str): The xpath to extract tree sub set
             value: (List[Any]): Values to apply for each leaf found.
             deep_copy (bool): Make a deep copy on values for each usages. Default is True.
             from_ancestor (str): Select from which ancestor node you want to expand
+            factorize (bool): Store the cross product without materializing it. Default is False.
 
         Examples:
             >>> import treebuilder as tb
@@ -140,13 +295,24 @@ class TreeBuilder:
 
         Returns:
             TreeBuilder: Returns the builder itself.
-        """            
-        entry, items, parents = self.__get_items(xpath, from_ancestor)
+        """
+        if factorize and from_ancestor is None:
+            return self.__apply(('factorize', xpath, values, deep_copy, None))
+        return self.__apply(('cross', xpath, values, deep_copy, from_ancestor))
+
+    def __cross(self, xpath: str, values: List[Any], deep_copy: bool, from_ancestor: str) -> 'TreeBuilder':
+        # Crossed items are cloned, so only the levels above them can stay factorized
+        factorized = from_ancestor is None
+        entry, items, parents = self.__get_items(xpath, from_ancestor, factorized=factorized, clones=True)
 
         if from_ancestor is not None and len(values) != 0:
             # Generate ancestors
             nodes = self.__generate_ancestor_nodes_as_values(items, entry, len(items) * len(values))
             items = expand(items, entry, nodes, deep_copy)
+
+            # Crossed values are applied in the generation order
+            depth = self.__get_entry_depth(xpath, from_ancestor)
+            starts = [(depth, x, parents[x[PARENT]]) for x in items]
             self.__attach_items_to_tree(items, entry, parents)
 
             # Generate crossed values
@@ -156,35 +322,609 @@ class TreeBuilder:
                 crossed_values += [value for x in range(repeats)]
             
             # Apply values (no more expansions)
-            self.expand(xpath, crossed_values, deep_copy)
+            self.__expand_below(xpath, starts, crossed_values, deep_copy)
         else:
+            if len(values) == 0: # Nothing is crossed, the tree is left as it is
+                [item.pop(PARENT) for item in items]
             items = cross(items, entry, values, deep_copy)
             self.__attach_items_to_tree(items, entry, parents)
 
         return self
 
-    def to_xml(self, file_path: str, root: str = None, pretty: bool = True):
+    def cross_product(self, xpath: str, values: Dict[str, List[Any]], deep_copy: bool = True) -> 'TreeBuilder':
+        """Cross the sub set tree with several values lists at once.
+
+        This fuction use the `treebuilder.cross_product`. The source list is the tree sub 
+        set selected by the given xpath and the keys of `values` are the entries.
+        The tree is walked once and each selected node is cloned only once per combination 
+        of values. It gives the same nodes and values than successive `cross` calls, one by 
+        entry in the `values` order, when the xpath selects nodes in each parent list, but 
+        the attributes of a node can come after its new leaves. Where the xpath selects no 
+        node of a parent list, each `cross` call would add its own nodes while here new nodes 
+        get all the entries.
+
+        Args:
+            xpath: (str): The xpath to extract tree sub set
+            values: (Dict[str, List[Any]]): Values to cross by entry.
+            deep_copy (bool): Make a deep copy on values for each usages. Default is True.
+
+        Examples:
+            >>> import treebuilder as tb
+            >>> builder = TreeBuilder()
+            >>> builder.expand('catalog/item/name', ['T-shirt', 'Jacket'])
+            >>> builder.cross_product('catalog/item', {'size': ['S', 'M', 'L'], 'color': ['red', 'blue'], 'region': ['EU', 'US']})
+            >>> print(builder.root)
+
+        Returns:
+            TreeBuilder: Returns the builder itself.
+        """
+        return self.__apply(('product', xpath, values, deep_copy, None))
+
+    def __cross_product(self, xpath: str, values: Dict[str, List[Any]], deep_copy: bool) -> 'TreeBuilder':
+        # Like a cross, an entry without values leaves the tree as it is
+        values = { entry: x for entry, x in values.items() if len(x) > 0 }
+        if len(values) == 0:
+            return self
+
+        _, items, parents = self.__get_items(f'{xpath}/{next(iter(values))}', factorized=True, clones=True)
+        items = cross_product(items, values, deep_copy)
+        self.__append_items_to_parents(items, parents)
+        for entry in values:
+            self.__move_attributes(items, entry)
+
+        return self
+
+    def remove(self, xpath: str) -> 'TreeBuilder':
+        """Remove the nodes, leaves or attributes selected by the xpath.
+
+        The filter of the last xpath step is evaluated once on each node list, 
+        which is rebuilt without the selected nodes. Without filter the whole 
+        entry is removed. Missing nodes along the xpath are not created.
+
+        Args:
+            xpath: (str): The xpath of the sub set tree to remove
+
+        Examples:
+            >>> import treebuilder as tb
+            >>> builder = TreeBuilder()
+            >>> builder.expand('bookstore/book/title', ['Sapiens', 'Harry Potter', 'A time of Mercy'])
+            >>> builder.expand('bookstore/book/price', [9.99, 19.99, 29.99])
+            >>> builder.remove('bookstore/book[price>20]')
+            >>> builder.remove('bookstore/book/price')
+            >>> print(builder.root)
+
+        Returns:
+            TreeBuilder: Returns the builder itself.
+        """
+        return self.__apply(('remove', xpath, [], False, None))
+
+    def __remove(self, xpath: str) -> 'TreeBuilder':
+        entry, owners, _ = self.__get_items(xpath, create=False)
+        tag, filter = split_step(entry)
+        copy_on_write = len(self.__snapshots) > 0 or self.__shared
+
+        removed = []
+        for owner in owners:
+            owner.pop(PARENT)
+
+            if tag.startswith('@'): # It's an attribute
+                if tag[1:] in owner.get(ATTRIBUTES, {}):
+                    attributes = dict(owner[ATTRIBUTES]) if copy_on_write else owner[ATTRIBUTES]
+                    attributes.pop(tag[1:])
+                    owner[ATTRIBUTES] = attributes
+                    if len(attributes) == 0:
+                        owner.pop(ATTRIBUTES)
+            elif tag in owner:
+                children = owner[tag]
+                if filter is None or not isinstance(children, (list, FactorizedCross)):
+                    removed.append(owner.pop(tag))
+                    continue
+
+                # The list is rebuilt in a single pass, so a list shared with a snapshot is left untouched
+                children = list(children)
+                fil = filter_items(children, filter)
+                kept = [x for x, f in zip(children, fil) if not f]
+                removed.append([x for x, f in zip(children, fil) if f])
+                if len(kept) > 0:
+                    owner[tag] = kept
+                else:
+                    owner.pop(tag)
+
+        self.__forget_removed(removed)
+        return self
+
+    def __forget_removed(self, removed: List[Any]):
+        # The hash cache would keep the removed nodes alive
+        hashes = self.__hashes
+        if len(hashes) == 0:
+            return
+
+        stack = [x for x in removed if isinstance(x, list)]
+        while len(stack) > 0:
+            for node in stack.pop():
+                if not isinstance(node, dict):
+                    continue
+                cached = hashes.get(id(node))
+                if cached is not None and cached[0] is node:
+                    del hashes[id(node)]
+                stack.extend(x for x in node.values() if isinstance(x, list))
+
+    def flush(self) -> 'TreeBuilder':
+        """Execute the operations recorded in lazy mode.
+
+        It is called by all reads, so you don't need to call it yourself.
+
+        Returns:
+            TreeBuilder: Returns the builder itself.
+        """
+        if len(self.__plan) == 0:
+            return self
+
+        with self.__lock:
+            plan, self.__plan = self.__plan, []
+
+            i = 0
+            while i < len(plan):
+                level = self.__get_fusable_level(plan[i])
+                j = i + 1
+                while level is not None and j < len(plan) and self.__get_fusable_level(plan[j]) == level:
+                    j += 1
+                
+                if j - i > 1:
+                    self.__execute_fused(plan[i:j])
+                else:
+                    self.__execute(plan[i])
+                i = j
+
+            if self.__compact:
+                self.__compact_tree()
+
+        return self
+
+    def __apply(self, operation: Tuple[str, str, List[Any], bool, str]) -> 'TreeBuilder':
+        with self.__lock:
+            # The next reads publish a new snapshot, the current one is released unless a read holds it
+            self.__published = None
+            if self.__lazy:
+                self.__plan.append(operation)
+            else:
+                self.__execute(operation)
+                if self.__compact:
+                    self.__compact_tree()
+        return self
+
+    def compact(self) -> 'TreeBuilder':
+        """Share identical subtrees of the built tree.
+
+        Nodes and attributes equal to a previous one, e.g. deep copies made by `cross`, 
+        are replaced by this previous instance so they are held only once in memory.
+        From now the operations copy the shared nodes they modify, and their path from 
+        the root, instead of updating them in place. 
+
+        The subtrees already shared by a previous call are skipped. For more details 
+        see the `treebuilder.compact.compact` function documentation.
+
+        Examples:
+            >>> import treebuilder as tb
+            >>> builder = tb.TreeBuilder()
+            >>> builder.expand('orders/order/id', list(range(1000)))
+            >>> builder.set('orders/order/shipping/carrier', 'UPS')
+            >>> builder.set('orders/order/shipping/days', 3)
+            >>> builder.compact()
+            >>> builder.set('orders/order[id=3]/shipping/days', 1)
+
+        Returns:
+            TreeBuilder: Returns the builder itself.
+        """
+        with self.__lock:
+            self.flush()
+            self.__published = None
+            self.__compact_tree()
+            self.__queries = {}
+        return self
+
+    def __compact_tree(self):
+        compact(self.__root, self.__hashes, self.__canonical)
+        self.__shared = True
+        # Nodes created since the last compaction can be shared now
+        self.__owned = set()
+
+    def __execute(self, operation: Tuple[str, str, List[Any], bool, str]):
+        self.__next_generation(operation)
+        name, xpath, values, deep_copy, from_ancestor = operation
+        if name == 'expand':
+            self.__expand(xpath, values, deep_copy, from_ancestor)
+        elif name == 'cross':
+            self.__cross(xpath, values, deep_copy, from_ancestor)
+        elif name == 'factorize':
+            self.__cross_factorized(xpath, values, deep_copy)
+        elif name == 'product':
+            self.__cross_product(xpath, values, deep_copy)
+        elif name == 'remove':
+            self.__remove(xpath)
+        elif name in ('columns', 'records'):
+            entries = list(self.__get_entries(operation))
+            if len(entries) > 0:
+                function = expand_columns if name == 'columns' else expand_records
+                self.__expand_rows(xpath, entries, function, values, deep_copy)
+        else:
+            self.__nest(xpath, values, deep_copy)
+
+    def __get_fusable_level(self, operation: Tuple[str, str, List[Any], bool, str]) -> Tuple[str]:
+        name, xpath, values, _, from_ancestor = operation
+
+        # Filters and ancestor expansions depend on the previous operations results
+        if from_ancestor is not None or '[' in xpath or xpath.endswith('/') or name not in ('expand', 'nest', 'cross'):
+            return None
+        # Crossing with nothing removes the items from the next operations
+        if name == 'cross' and len(values) == 0:
+            return None
+        
+        steps = [x for x in xpath.split('/') if x != '']
+        return tuple(steps[0:-1]) if len(steps) > 0 else None
+
+    def __execute_fused(self, operations: List[Tuple[str, str, List[Any], bool, str]]):
+        functions = { 'expand': expand, 'nest': nest, 'cross': cross }
+
+        for operation in operations:
+            self.__next_generation(operation)
+
+        # All operations select the same items, so the tree is walked only once
+        _, items, parents = self.__get_items(operations[0][1])
+        for name, xpath, values, deep_copy, _ in operations:
+            entry = xpath.split('/')[-1]
+            items = functions[name](items, entry, values, deep_copy)
+            self.__move_attributes(items, entry)
+
+            # Keep the order that the next operation would get by walking the tree
+            items = self.__sort_by_parent(items, parents)
+
+        self.__append_items_to_parents(items, parents)
+
+    def __compile(self, xpath: str) -> Tuple[Tuple[str], List[int]]:
+        # Tags path, with the entry, and the levels which are filtered
+        tags, filtered = [], []
+        for step in compile_xpath(xpath):
+            if step is None:
+                continue
+            tags.append(step[0])
+            if step[1] is not None:
+                filtered.append(len(tags))
+        return tuple(tags), filtered
+
+    def __next_generation(self, operation: Tuple[str, str, List[Any], bool, str]):
+        name, xpath, values, deep_copy, from_ancestor = operation
+        if name in ('product', 'columns', 'records'): # Same as a cross or an expand by entry
+            for entry, x in self.__get_entries(operation).items():
+                self.__next_generation(('cross' if name == 'product' else 'expand', f'{xpath}/{entry}', x, deep_copy, None))
+            return
+
+        tags, filtered = self.__compile(xpath)
+
+        # Deepest level from which node lists can change: the selected items when they are cloned, 
+        # the ancestors expanded, or a filtered level where a node is added if nothing matches.
+        clones = from_ancestor is not None or not (name in ('nest', 'remove') or (name == 'expand' and len(values) == 1))
+        depth = len(tags) - 1 if clones else len(tags)
+        if from_ancestor in tags[0:-1]:
+            depth = min(depth, tags.index(from_ancestor) + 1)
+        if len(filtered) > 0:
+            depth = min(depth, filtered[0])
+        depth = max(depth, 0)
+
+        # Queries going through this level, or reading a node along the modified path, are outdated
+        sub, path = self.__sub_generations, self.__path_generations
+        sub[tags[0:depth]] = sub.get(tags[0:depth], 0) + 1
+        for i in range(len(tags) + 1):
+            path[tags[0:i]] = path.get(tags[0:i], 0) + 1
+
+    def __get_entries(self, operation: Tuple[str, str, Any, bool, str]) -> Dict[str, List[Any]]:
+        # Values by entry of the multiple entries operations, the entries without values are skipped
+        name, _, values, _, _ = operation
+        if name == 'records':
+            return { entry: values for record in values for entry in record }
+        return { entry: x for entry, x in values.items() if len(x) > 0 }
+
+    def __get_generation(self, tags: Tuple[str], filtered: List[int], 
+                         sub: Dict[Tuple[str], int], path: Dict[Tuple[str], int]) -> Tuple:
+        return (tuple(sub.get(tags[0:i], 0) for i in range(len(tags) + 1)), 
+                path.get(tags, 0), 
+                tuple(path.get(tags[0:i], 0) for i in filtered))
+
+    def __cross_factorized(self, xpath: str, values: List[Any], deep_copy: bool) -> 'TreeBuilder':
+        split = xpath.split('/')
+        tag, entry = split[-2] if len(split) > 1 else '', split[-1]
+
+        # The whole lists are crossed so they can't be filtered and attributes are not stored as entries
+        if tag == '' or '[' in tag or '[' in entry or entry.startswith('@') or len(values) == 0:
+            return self.__cross(xpath, values, deep_copy, None)
+
+        # Walk to the nodes which own the lists to cross
+        _, owners, parents = self.__get_items('/'.join(split[0:-1]), factorized=True)
+        for owner in owners:
+            owner[tag] = FactorizedCross(owner[tag] if tag in owner else [{}], entry, values, deep_copy)
+            # Owners are already in their parent list, except the ones made for a filter which 
+            # matches nothing: like with `cross` they are not attached to the tree
+            owner.pop(PARENT)
+
+        return self
+
+    def snapshot(self) -> Snapshot:
+        """Take a snapshot of the built tree.
+
+        Taking a snapshot is O(1): nothing is copied. Once a snapshot is alive, the 
+        operations copy the nodes they modify, and their path from the root, instead 
+        of updating them in place. The snapshot and the builder share all the other nodes.
+
+        Examples:
+            >>> import treebuilder as tb
+            >>> builder = tb.TreeBuilder()
+            >>> builder.expand('bookstore/book/title', ['Sapiens', 'Harry Potter'])
+            >>> snapshot = builder.snapshot()
+            >>> builder.cross('bookstore/book/copy_number', [1, 2])
+            >>> builder.rollback(snapshot)
+            >>> print(builder.root)
+
+        Returns:
+            Snapshot: The snapshot to give to `rollback`.
+        """
+        return self.__read()[0]
+
+    def __read(self) -> Tuple[Snapshot, Dict[Tuple[str], int], Dict[Tuple[str], int]]:
+        # The lock is taken only by the first read after a modification, to publish its snapshot
+        published = self.__published
+        if published is not None:
+            return published
+
+        with self.__lock:
+            self.flush()
+            if self.__published is None:
+                snapshot = Snapshot(self.__root)
+                self.__snapshots.add(snapshot)
+                # From now the whole tree is shared with the snapshot
+                self.__owned = set()
+                self.__published = (snapshot, dict(self.__sub_generations), dict(self.__path_generations))
+            return self.__published
+
+    def rollback(self, snapshot: Snapshot) -> 'TreeBuilder':
+        """Restore the tree as it was when the snapshot has been taken.
+
+        The modified paths are discarded, the snapshot stays valid and can be used again.
+
+        Args:
+            snapshot (Snapshot): A snapshot taken on this builder.
+
+        Returns:
+            TreeBuilder: Returns the builder itself.
+        """
+        with self.__lock:
+            # Pending operations have been recorded after the snapshot
+            self.__plan = []
+            self.__published = None
+            self.__root = snapshot.root
+            self.__owned = set()
+            self.__hashes = {}
+            self.__canonical = {}
+            self.__queries = {}
+        return self
+
+    def digest(self) -> bytes:
+        """Compute the content hash of the built tree.
+
+        The hashes of the subtrees are kept between calls, only the nodes modified
+        since the previous call, and their ancestors, are hashed again.
+
+        Returns:
+            bytes: The tree hash, equal for trees which give the same output.
+        """
+        snapshot = self.__read()[0]
+        return hash_tree(snapshot.root, self.__hashes)
+
+    def diff(self, other: 'TreeBuilder') -> List[Dict[str, Any]]:
+        """Compute the operations which transform the built tree into the tree of another builder.
+
+        Identical subtrees are skipped thanks to their hash, so comparing two large trees
+        costs in proportion to their differences. For more details see the 
+        `treebuilder.diff.diff` function documentation.
+
+        Args:
+            other (TreeBuilder): The builder of the expected tree.
+
+        Returns:
+            List[Dict[str, Any]]: JSON Patch like operations (`add`, `remove`, `replace`).
+
+        Examples:
+            >>> import treebuilder as tb
+            >>> builder = tb.TreeBuilder()
+            >>> builder.expand('bookstore/book/title', ['Sapiens', 'Harry Potter'])
+            >>> other = tb.TreeBuilder()
+            >>> other.expand('bookstore/book/title', ['Sapiens', 'Harry Potter 2'])
+            >>> print(builder.diff(other))
+        """
+        # Each builder reads its own snapshot, with its own hash cache
+        source, target = self.__read()[0], other.__read()[0]
+        return diff(source.root, target.root, self.__hashes, other.__hashes)
+
+    def to_xml(self, file_path: str, root: str = None, pretty: bool = True, backend: str = None, 
+               compression: str = 'infer'):
         """Serialize the built tree to a XML file.
 
         Args:
             file_path (str): Xml file path
             root (str, optional): Additional xml root if needed. Defaults to None.
             pretty (bool, optional): Define if you want a human reading output or not. Defaults to True.
+            backend (str, optional): XML backend, `stdlib` or `lxml`. Defaults to None for `stdlib`.
+            compression (str, optional): `gzip`, `bz2`, `zstd`, None or `infer` to deduce it 
+                from the file extension. Defaults to 'infer'.
         """
-        to_xml(self.__root, file_path, root=root, pretty=pretty)
+        snapshot = self.__read()[0]
+        to_xml(snapshot.root, file_path, root=root, pretty=pretty, backend=backend, compression=compression)
 
-    def to_json(self, file_path: str, pretty: bool = True):
+    def to_json(self, file_path: str, pretty: bool = True, compression: str = 'infer'):
         """Serialize the built tree to a JSON file.
 
         Args:
             file_path (str): JSON file path
             pretty (bool, optional): Define if you want a human reading output or not. Defaults to True.
+            compression (str, optional): `gzip`, `bz2`, `zstd`, None or `infer` to deduce it 
+                from the file extension. Defaults to 'infer'.
         """
-        to_json(self.__root, file_path, pretty=pretty)
+        snapshot = self.__read()[0]
+        to_json(snapshot.root, file_path, pretty=pretty, compression=compression)
+
+    def export(self, sinks: List[Any]):
+        """Serialize the built tree into several outputs with a single walk.
+
+        For more details see the `treebuilder.export.export` function documentation.
+
+        Args:
+            sinks (List[Any]): Outputs defined by `treebuilder.export.xml_sink`, `json_sink` or `jsonl_sink`, 
+                or by a file path, the format is deduced from the file extension.
+
+        Examples:
+            >>> import treebuilder as tb
+            >>> builder = tb.TreeBuilder()
+            >>> builder.expand('bookstore/book/title', ['Sapiens', 'Harry Potter'])
+            >>> builder.export(['bookstore.xml', 'bookstore.json.gz'])
+        """
+        snapshot = self.__read()[0]
+        export(snapshot.root, sinks)
+
+    def to_jsonl(self, file_path: str, level: str, include_ancestors: bool = False, files: int = 1, 
+                 key: str = None, compression: str = 'infer'):
+        """Serialize the nodes of a level of the built tree as JSON Lines, a record by line.
+
+        For more details see the `treebuilder.export.to_jsonl` function documentation.
+
+        Args:
+            file_path (str): JSON Lines file path
+            level (str): Xpath of the records, e.g. `bookstore/book`.
+            include_ancestors (bool, optional): Add the leaves and attributes of the ancestors to each 
+                record, named by their xpath e.g. `bookstore/@city`. Defaults to False.
+            files (int, optional): Number of files to split the records into. Defaults to 1.
+            key (str, optional): Entry of the records to split them by hash, None to deal them in turns. 
+                Defaults to None.
+            compression (str, optional): `gzip`, `bz2`, `zstd`, None or `infer` to deduce it 
+                from the file extension. Defaults to 'infer'.
+
+        Examples:
+            >>> import treebuilder as tb
+            >>> builder = tb.TreeBuilder()
+            >>> builder.expand('bookstore/book/title', ['Sapiens', 'Harry Potter'])
+            >>> builder.to_jsonl('books.jsonl.gz', level='bookstore/book', files=2)
+        """
+        snapshot = self.__read()[0]
+        to_jsonl(snapshot.root, file_path, level, include_ancestors=include_ancestors, files=files, 
+                 key=key, compression=compression)
+
+    def to_sqlite(self, file_path: str, batch_size: int = DEFAULT_BATCH_SIZE):
+        """Export the built tree as relational tables into a SQLite database.
+
+        For more details see the `treebuilder.sqlite.to_sqlite` function documentation.
+
+        Args:
+            file_path (str): SQLite database path, an existing file is replaced.
+            batch_size (int, optional): Number of rows written by transaction. Defaults to 50000.
+
+        Examples:
+            >>> import treebuilder as tb
+            >>> builder = tb.TreeBuilder()
+            >>> builder.expand('bookstore/book/title', ['Sapiens', 'Harry Potter'])
+            >>> builder.to_sqlite('bookstore.db')
+        """
+        snapshot = self.__read()[0]
+        to_sqlite(snapshot.root, file_path, batch_size=batch_size)
+
+    def to_arrow(self, level: str) -> 'pyarrow.Table':
+        """Flatten the nodes of a level of the built tree into an Arrow table.
+
+        Each node of the level is a row with its leaves, attributes and the ones of its ancestors.
+        For more details see the `treebuilder.arrow.to_arrow` function documentation.
+
+        Args:
+            level (str): Xpath of the level, e.g. `bookstore/book`.
+
+        Returns:
+            pyarrow.Table: The flattened level.
+        """
+        snapshot = self.__read()[0]
+        return to_arrow(snapshot.root, level)
+
+    def to_parquet(self, file_path: str, level: str, row_group_size: int = DEFAULT_BATCH_SIZE, 
+                   compression: str = 'snappy'):
+        """Flatten the nodes of a level of the built tree into a Parquet file.
+
+        For more details see the `treebuilder.arrow.to_parquet` function documentation.
+
+        Args:
+            file_path (str): Parquet file path.
+            level (str): Xpath of the level, e.g. `bookstore/book`.
+            row_group_size (int, optional): Number of rows by row group. Defaults to 50000.
+            compression (str, optional): Parquet compression codec. Defaults to 'snappy'.
+
+        Examples:
+            >>> import treebuilder as tb
+            >>> builder = tb.TreeBuilder()
+            >>> builder.expand('bookstore/book/title', ['Sapiens', 'Harry Potter'])
+            >>> builder.to_parquet('books.parquet', level='bookstore/book')
+        """
+        snapshot = self.__read()[0]
+        to_parquet(snapshot.root, file_path, level, row_group_size=row_group_size, compression=compression)
+
+    async def ato_xml(self, stream: Any, root: str = None, pretty: bool = True, 
+                      chunk_size: int = DEFAULT_CHUNK_SIZE, executor: 'Executor' = None, encoding: str = None):
+        """Serialize the built tree as XML into a stream without blocking the event loop.
+
+        For more details see the `treebuilder.aio.ato_xml` function documentation.
+
+        Args:
+            stream (Any): Destination stream, e.g. an `asyncio.StreamWriter`.
+            root (str, optional): Additional xml root if needed. Defaults to None.
+            pretty (bool, optional): Define if you want a human reading output or not. Defaults to True.
+            chunk_size (int, optional): Approximative number of characters written at once. Defaults to 64k.
+            executor (Executor, optional): Executor used to produce the chunks outside of the event loop. Defaults to None.
+            encoding (str, optional): Encode chunks as bytes with this encoding. Defaults to None.
+
+        Examples:
+            >>> import asyncio
+            >>> import treebuilder as tb
+            >>> builder = tb.TreeBuilder()
+            >>> builder.expand('bookstore/book/title', ['Sapiens', 'Harry Potter', 'A time of Mercy'])
+            >>> async def handle(reader, writer):
+            >>>     await builder.ato_xml(writer)
+            >>>     writer.close()
+        """
+        from treebuilder.aio import ato_xml
+        # The snapshot keeps the tree as it is while the modifications go on, it's released at the end
+        snapshot = self.snapshot()
+        await ato_xml(snapshot.root, stream, root=root, pretty=pretty, 
+                      chunk_size=chunk_size, executor=executor, encoding=encoding)
+
+    async def ato_json(self, stream: Any, pretty: bool = True, 
+                       chunk_size: int = DEFAULT_CHUNK_SIZE, executor: 'Executor' = None, encoding: str = None):
+        """Serialize the built tree as JSON into a stream without blocking the event loop.
+
+        For more details see the `treebuilder.aio.ato_json` function documentation.
+
+        Args:
+            stream (Any): Destination stream, e.g. an `asyncio.StreamWriter`.
+            pretty (bool, optional): Define if you want a human reading output or not. Defaults to True.
+            chunk_size (int, optional): Approximative number of characters written at once. Defaults to 64k.
+            executor (Executor, optional): Executor used to produce the chunks outside of the event loop. Defaults to None.
+            encoding (str, optional): Encode chunks as bytes with this encoding. Defaults to None.
+        """
+        from treebuilder.aio import ato_json
+        # The snapshot keeps the tree as it is while the modifications go on, it's released at the end
+        snapshot = self.snapshot()
+        await ato_json(snapshot.root, stream, pretty=pretty, 
+                       chunk_size=chunk_size, executor=executor, encoding=encoding)
     
     def get_items(self, xpath: str, unlist: bool = True) -> List[Any]:
         """Get sub set tree elements
 
+        Results are cached until a modification of the levels they read. Once the caller 
+        has got nodes or lists of the tree, by `root` or by a query which selects them, 
+        it can modify them directly, so the results are not cached anymore.
+
         Args:
             xpath (str): The xpath to extract tree sub set
             unlist (bool): Unlist nodes if they are request. If you request leaves which 
@@ -193,11 +933,37 @@ class TreeBuilder:
         Returns:
             List[Any]: Returns the sub set tree elements find by the xpath.
         """
+        snapshot, sub, path = self.__read()
+
+        key = (xpath, unlist)
+        cached = self.__queries.get(key)
+        compiled = cached[0] if cached is not None else self.__compile(xpath)
+        # The generations published with the snapshot, a modification made since then gives other ones
+        generation = self.__get_generation(*compiled, sub, path)
+        if cached is not None and cached[1] == generation:
+            return list(cached[2])
+
+        result = self.__query_items(snapshot.root, xpath, unlist)
+        if any(type(x) not in SCALARS for x in result):
+            self.__expose()
+        if self.__exposed:
+            return result
+
+        queries = self.__queries
+        if len(queries) >= QUERY_CACHE_SIZE:
+            queries = self.__queries = {}
+        queries[key] = (compiled, generation, result)
+        return list(result)
+
+    def __expose(self):
+        # The caller gets nodes or lists which it can modify without a generation change, 
+        # so from now the query results are not cached anymore
+        self.__exposed = True
+        self.__queries = {}
+
+    def __query_items(self, root: Dict[str, Any], xpath: str, unlist: bool) -> List[Any]:
         # Todo: see how to share more code with __attach_items_to_tree
-        entry, items, parents = self.__get_items(xpath)
-        
-        # Remove internal stuff
-        [item.pop(PARENT) for item in items]
+        entry, items, _ = self.__get_items(xpath, readonly=True, starts=[(0, root, None)])
 
         if entry.startswith('@'): # It's an attribute
             entry = entry[1:len(entry)]
@@ -209,74 +975,346 @@ class TreeBuilder:
 
         result = []
         for item in items:
-            if type(item) is list:
+            if isinstance(item, (list, FactorizedCross)):
                 [result.append(x) for x in item]
             else:
                 result.append(item)
         return result
 
-    def __get_tag_and_filter(self, step: str) -> Tuple[str, str]:
-        split = step.split('[')
-        tag, filter = split[0], None
+    def query(self, xpath: str, limit: int = None, offset: int = 0) -> QueryCursor:
+        """Query the values selected by the xpath page by page.
 
-        if len(split) > 1 and split[-1].endswith(']'):
-            split[-1] = split[-1][0:-1]
-            filter = '['.join(split[1:len(split)])
-        
-        return tag, filter
+        The values are given in the `get_items` order, missing values are skipped. 
+        Each page walks the tree only up to its last value, so reading the first 
+        page doesn't depend on the tree size. The pages are read from a `snapshot`, 
+        kept by the cursor while its walk goes on. For more details see the 
+        `treebuilder.QueryCursor` class documentation.
 
-    def __filter_items(self, items, syntax: str):
-        self.__parser.items = items
-        tokens = self.__lexer.tokenize(syntax)
-        return self.__parser.parse(tokens)
+        Args:
+            xpath (str): The xpath to extract tree sub set
+            limit (int, optional): Number of values by page. Defaults to None for all the values.
+            offset (int, optional): Number of values to skip. Defaults to 0.
 
-    def __get_items(self, xpath: str, from_ancestor: str = None) -> Tuple[str, List[Dict[str, Any]], Dict[str, List]]: 
-        split = xpath.split('/')
-        max_depth = len(split) - 1
+        Returns:
+            QueryCursor: The cursor to fetch the pages.
 
-        result, parents = [], {}
-        queue = deque()
-        queue.appendleft((0, self.__root, None))
-        while len(queue) > 0:
-            index, node, parent = queue.pop()
-
-            step = split[index]
-            if step == '':
-                queue.appendleft((index + 1, node, parent))
+        Examples:
+            >>> import treebuilder as tb
+            >>> builder = tb.TreeBuilder()
+            >>> builder.expand('bookstore/book/title', [f'Book {i}' for i in range(1000)])
+            >>> cursor = builder.query('bookstore/book/title', limit=50)
+            >>> print(cursor.fetch())
+            >>> print(cursor.fetch())
+        """
+        steps, compiled = self.__get_steps(xpath), self.__compile(xpath)
+
+        def walk():
+            # The generator holds the snapshot until the cursor walks again or is released
+            snapshot = self.__read()[0]
+            for _, x in self.__iter_values(snapshot.root, steps):
+                if type(x) not in SCALARS:
+                    self.__expose()
+                yield x
+
+        def generation():
+            _, sub, path = self.__read()
+            return self.__get_generation(*compiled, sub, path)
+
+        return QueryCursor(walk, generation, limit=limit, offset=offset)
+
+    def aggregate(self, xpath: str, function: str, group_by: str = None) -> Any:
+        """Aggregate the values selected by the xpath.
+
+        The values are folded during the walk, which holds only the current path of 
+        the tree: nothing is collected and the nodes are not modified. Missing values 
+        are skipped and the nodes of a selected node list are aggregated as values, 
+        e.g. to count them. For more details see the `treebuilder.aggregate.aggregate` 
+        function documentation.
+
+        Args:
+            xpath (str): The xpath of the values to aggregate.
+            function (str): `count`, `sum`, `min`, `max` or `distinct`.
+            group_by (str, optional): The xpath of an entry, or attribute, of an ancestor node 
+                which groups the values. Defaults to None.
+
+        Returns:
+            Any: The aggregated value, or the aggregated values by group.
+
+        Examples:
+            >>> import treebuilder as tb
+            >>> builder = tb.TreeBuilder()
+            >>> builder.expand('bookstore/book/title', ['Sapiens', 'Harry Potter', 'A time of Mercy'])
+            >>> builder.expand('bookstore/book/@lang', ['en', 'fr'])
+            >>> builder.expand('bookstore/book/price', [9.99, 19.99, 29.99])
+            >>> print(builder.aggregate('bookstore/book/price', 'sum'))
+            >>> print(builder.aggregate('bookstore/book[price>10]', 'count'))
+            >>> print(builder.aggregate('bookstore/book/price', 'max', group_by='bookstore/book/@lang'))
+        """
+        snapshot = self.__read()[0]
+        return self.__aggregate(snapshot.root, xpath, function, group_by)
+
+    def __aggregate(self, root: Dict[str, Any], xpath: str, function: str, group_by: str) -> Any:
+        steps = self.__get_steps(xpath)
+        if group_by is None:
+            return aggregate((x for _, x in self.__iter_values(root, steps)), function)
+
+        group_steps = self.__get_steps(group_by)
+        depth = len(group_steps) - 1
+        if [x[0] for x in group_steps[0:depth]] != [x[0] for x in steps[0:depth]] or depth >= len(steps):
+            raise Exception(f'Group by has to be an entry of an ancestor of {xpath}, but was: {group_by}')
+
+        # The group filters select the walked nodes too
+        for i, (tag, filter) in enumerate(group_steps[0:depth]):
+            if filter is not None:
+                steps[i] = (tag, filter if steps[i][1] is None else f'({steps[i][1]}) and ({filter})')
+        return aggregate_by(self.__iter_values(root, steps, depth, group_steps[depth][0]), function)
+
+    def __get_steps(self, xpath: str) -> List[Tuple[str, str]]:
+        return [x for x in compile_xpath(xpath) if x is not None]
+
+    def __iter_values(self, root: Dict[str, Any], steps: List[Tuple[str, str]], group_depth: int = None, group_entry: str = None):
+        # Depth first walk with an iterator by level, so the memory doesn't depend on the tree width.
+        # The values are yielded in the same order than `get_items` gives them.
+        last = len(steps) - 1
+        stack = [(iter((root,)), None)]
+        while len(stack) > 0:
+            nodes, group = stack[-1]
+            node = next(nodes, None)
+            if node is None:
+                stack.pop()
+                continue
+
+            depth = len(stack) - 1
+            if depth == group_depth:
+                group = self.__get_value(node, group_entry)
+            if depth == last:
+                yield from self.__iter_leaf_values((node,), steps[last], group, None)
                 continue
 
-            tag, filter = self.__get_tag_and_filter(step)
+            tag, filter = steps[depth]
+            children = self.__select_children(node, tag, filter)
+            if children is None:
+                continue
+            if depth + 1 == last:
+                # The widest level is read in a single loop
+                yield from self.__iter_leaf_values(children, steps[last], group, group_entry if group_depth == last else None)
+            else:
+                stack.append((iter(children), group))
+
+    def __select_children(self, node: Dict[str, Any], tag: str, filter: str) -> List[Any]:
+        children = node.get(tag)
+        # FactorizedCross is checked by type, an abstract class check is slow
+        if not isinstance(children, list) and type(children) is not FactorizedCross:
+            return None
+        if filter is not None:
+            children = compress(children, filter_items(children, filter))
+        return children
+
+    def __iter_leaf_values(self, owners: List[Dict[str, Any]], step: Tuple[str, str], group: Any, group_entry: str):
+        tag, filter = step
+        for owner in owners:
+            if group_entry is not None:
+                group = self.__get_value(owner, group_entry)
+
+            if tag.startswith('@'):
+                value = self.__get_value(owner, tag)
+                if value is not None:
+                    yield group, value
+                continue
+
+            value = owner.get(tag)
+            if value is None:
+                continue
+            if isinstance(value, list) or type(value) is FactorizedCross:
+                children = self.__select_children(owner, tag, filter)
+                yield from ((group, x) for x in children)
+            else:
+                yield group, value
+
+    def __get_value(self, node: Dict[str, Any], entry: str) -> Any:
+        if entry.startswith('@'):
+            return node[ATTRIBUTES].get(entry[1:]) if ATTRIBUTES in node else None
+        return node.get(entry)
 
+    def memory_stats(self, depth: int = None) -> Dict[str, Dict[str, int]]:
+        """Measure the memory used by each xpath level of the built tree.
+
+        For more details see the `treebuilder.stats.memory_stats` function documentation.
+
+        Args:
+            depth (int, optional): Deepest level reported, starting at 1 for the root. The deeper 
+                levels are added to their ancestor at this depth. Defaults to None for all levels.
+
+        Returns:
+            Dict[str, Dict[str, int]]: `nodes`, `leaves`, `distinct_values`, `bytes` and 
+                `duplicate_bytes` by xpath level.
+
+        Examples:
+            >>> import treebuilder as tb
+            >>> builder = tb.TreeBuilder()
+            >>> builder.expand('bookstore/book/title', ['Sapiens', 'Harry Potter', 'A time of Mercy'])
+            >>> builder.cross('bookstore/book/copy_number', [1, 2])
+            >>> for xpath, stats in builder.memory_stats().items():
+            >>>     print(xpath, stats['nodes'], stats['bytes'])
+        """
+        snapshot = self.__read()[0]
+        return memory_stats(snapshot.root, depth=depth)
+
+    def __get_entry_depth(self, xpath: str, from_ancestor: str) -> int:
+        split = xpath.split('/')
+        for index, step in enumerate(split[0:-1]):
+            tag, _ = split_step(step)
             if tag == from_ancestor:
+                return index + 1
+        return len(split) - 1
+
+    def __get_items(self, xpath: str, from_ancestor: str = None, readonly: bool = False, 
+                    starts: List[Tuple[int, Dict[str, Any], List]] = None, 
+                    factorized: bool = False, clones: bool = False, create: bool = True) -> Tuple[str, List[Dict[str, Any]], Dict[str, List]]: 
+        """Walk the tree to collect the items selected by the xpath.
+
+        The walk starts from the root, or from the given `starts` nodes as
+        (step index, node, parent list) when the upper levels are already known.
+
+        Factorized crosses met by a modifying walk are materialized. With `factorized`,
+        the walk goes into their source instead when the modification applies the same
+        way on each crossed item. When the operation `clones` the selected items, 
+        their own list is always materialized.
+
+        When `readonly` is False, missing nodes are created and each item is marked
+        with the id of its parent list to be attached back after an operation.
+        If a snapshot shares the walked nodes, they are copied before being returned.
+        Otherwise the tree is left untouched and parents are not collected.
+        Without `create`, the walk stops on missing nodes instead.
+        """
+        copy_on_write = not readonly and (len(self.__snapshots) > 0 or self.__shared)
+
+        if copy_on_write and starts is None:
+            self.__root = self.__own(self.__root, dict)
+
+        # The steps are parsed once, the ancestor level is known before walking
+        split, steps = xpath.split('/'), compile_xpath(xpath)
+        max_depth = len(steps) - 1
+        for index, step in enumerate(steps[0:-1]):
+            if step is not None and step[0] == from_ancestor:
                 max_depth = index + 1
+                break
 
-            is_leaf = index == max_depth
-            if is_leaf:
-                parent_id = len(parents)
-                node[PARENT] = parent_id
-                parents[parent_id] = parent
-                result.append(node)
-            else:
+        # Nodes are walked level by level, all the nodes of a level have the same step
+        levels = {}
+        for index, node, parent in [(0, self.__root, None)] if starts is None else starts:
+            level = levels.setdefault(index, ([], []))
+            level[0].append(node)
+            level[1].append(parent)
+
+        result, parents = [], {}
+        nodes, node_parents = [], []
+        for index in range(min(levels, default=0), max_depth + 1):
+            if index in levels:
+                nodes, node_parents = levels[index][0] + nodes, levels[index][1] + node_parents
+            if not readonly:
+                hashes = self.__hashes
+                for node in nodes:
+                    hashes.pop(id(node), None)
+
+            if steps[index] is None:
+                continue
+
+            if index == max_depth:
+                if not readonly:
+                    for parent_id, (node, parent) in enumerate(zip(nodes, node_parents)):
+                        node[PARENT] = parent_id
+                        parents[parent_id] = parent
+                result = nodes
+                break
+
+            tag, filter = steps[index]
+            next_nodes, next_parents = [], []
+            for node in nodes:
                 # Create the node if it doesn't exist
                 if tag not in node:
-                    items = node[tag] = [{}]
+                    if not create:
+                        continue
+                    children = items = [{}]
+                    if not readonly:
+                        node[tag] = children
+                        if copy_on_write:
+                            self.__owned.update((id(children), id(children[0])))
                 else:
                     # Get items for tag
-                    items = node[tag]
+                    children = items = node[tag]
+                    if not readonly and type(children) is FactorizedCross:
+                        source = None
+                        if factorized and filter is None and not copy_on_write and (index + 1 < max_depth or not clones):
+                            source = self.__get_factorized_source(children, split[index + 1])
+                        
+                        if source is not None:
+                            children = items = source
+                        else:
+                            children = items = node[tag] = list(children)
+                            if copy_on_write:
+                                self.__owned.add(id(children))
+                                self.__owned.update(id(x) for x in children)
+
+                    if copy_on_write:
+                        children = node[tag] = self.__own(children, list)
 
                     # Filter items if asked
-                    if filter is not None:
-                        fil = self.__filter_items(items, filter)
-                        items = [x for x in compress(items, fil)]
-                        if len(items) == 0: # Make sure to hit leaf level
-                            items = [{}]
-
-                # Recursive walk
-                for child in items:
-                    queue.appendleft((index + 1, child, node[tag]))
+                    fil = filter_items(children, filter) if filter is not None else None
+                    if copy_on_write:
+                        # Copy the selected items shared with a snapshot
+                        items = self.__own_items(children, fil)
+                    elif fil is not None:
+                        items = [x for x in compress(children, fil)]
+
+                    if filter is not None and len(items) == 0 and create: # Make sure to hit leaf level
+                        items = [{}]
+                        if copy_on_write:
+                            self.__owned.add(id(items[0]))
+
+                next_nodes.extend(items)
+                if not readonly:
+                    next_parents.extend(repeat(children, len(items)))
+            nodes, node_parents = next_nodes, next_parents
         
         return split[max_depth], result, parents
 
+    def __get_factorized_source(self, children: FactorizedCross, next_step: str) -> List[Dict[str, Any]]:
+        # Modifying the source is the same than modifying each crossed item, 
+        # except for the crossed entries which are overriden by the cross values
+        next_tag, _ = split_step(next_step)
+        while isinstance(children, FactorizedCross):
+            if children.entry == next_tag:
+                return None
+            children = children.source
+        return children if len(children) > 0 else None
+
+    def __own(self, container, factory):
+        if id(container) in self.__owned:
+            return container
+        self.__forget(container)
+        container = factory(container)
+        self.__owned.add(id(container))
+        return container
+
+    def __own_items(self, children: List[Dict[str, Any]], fil: List[bool]) -> List[Dict[str, Any]]:
+        owned, items = self.__owned, []
+        for i, child in enumerate(children):
+            if fil is not None and not fil[i]:
+                continue
+            if id(child) not in owned:
+                self.__forget(child)
+                child = children[i] = dict(child)
+                owned.add(id(child))
+            items.append(child)
+        return items
+
+    def __forget(self, node):
+        # The node is replaced by a copy, its cached hash and shared instance would keep it alive
+        cached = self.__hashes.pop(id(node), None)
+        if cached is not None and self.__canonical.get(cached[1]) is node:
+            del self.__canonical[cached[1]]
+
     def __generate_ancestor_nodes_as_values(self, items, entry, target_length):
         i, values = 0, []
 
@@ -291,26 +1329,39 @@ class TreeBuilder:
         return values
         
         
+    def __sort_by_parent(self, items: List[Dict[str, Any]], parents: Dict[int, List]) -> List[Dict[str, Any]]:
+        # Group items by parent list in the tree order, the order within each parent is kept
+        rank = {}
+        [rank.setdefault(id(parent), parent_id) for parent_id, parent in parents.items()]
+        return sorted(items, key=lambda x: rank[id(parents[x[PARENT]])])
+
     def __attach_items_to_tree(self, items: List[Dict[str, Any]], entry: str, parents: Dict[str, List]):
-        is_attribute = entry.startswith('@')
-        att_entry = entry[1:len(entry)] if is_attribute else None
-        
-        # Todo: Improve complexity here by keeping a reference of the current parent and
-        # playing with indices instead. This is possible because the order is kept by 
-        # expand and cross functions.
-        # This trick will avoid to iterate for each item on the full parent list and
-        # improve the complexity from O(N x M) to O(N + M) where N is the number of 
-        # created/updated items and M the number for items in the parent list which grows
-        # in this loop
+        self.__append_items_to_parents(items, parents)
+        self.__move_attributes(items, entry)
+
+    def __append_items_to_parents(self, items: List[Dict[str, Any]], parents: Dict[str, List]):
+        # Items already in their parent list are found by identity, so it costs O(N + M) 
+        # instead of comparing each item with the whole parent list
+        children = {}
         for item in items:
-            parent = parents[item[PARENT]]
-            if item not in parent:
+            parent = parents[item.pop(PARENT)]
+            ids = children.get(id(parent))
+            if ids is None:
+                ids = children[id(parent)] = set(id(x) for x in parent)
+            if id(item) not in ids:
                 parent.append(item)
-            item.pop(PARENT)
+                ids.add(id(item))
 
-            if is_attribute:
-                if ATTRIBUTES not in item:
-                    item[ATTRIBUTES] = {}
-                item[ATTRIBUTES][att_entry] = item[entry]
-                item.pop(entry)
-            
+    def __move_attributes(self, items: List[Dict[str, Any]], entry: str):
+        if not entry.startswith('@'):
+            return
+
+        att_entry = entry[1:len(entry)]
+        copy_on_write = len(self.__snapshots) > 0 or self.__shared
+        for item in items:
+            if ATTRIBUTES not in item:
+                item[ATTRIBUTES] = {}
+            elif copy_on_write:
+                item[ATTRIBUTES] = dict(item[ATTRIBUTES])
+            item[ATTRIBUTES][att_entry] = item[entry]
+            item.pop(entry)
@@ -1,4 +1,5 @@
 from .TreeBuilder import TreeBuilder
-from .expand import expand
-from .cross import cross
+from .SqliteTreeBuilder import SqliteTreeBuilder
+from .expand import expand, expand_columns, expand_records
+from .cross import cross, cross_product, FactorizedCross
 from .nest import nest
\ No newline at end of file
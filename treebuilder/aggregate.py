@@ -0,0 +1,102 @@
+from typing import Any, Dict, Hashable, Iterable, Tuple
+
+from treebuilder.traversal import to_number
+
+
+AGGREGATES = ('count', 'sum', 'min', 'max', 'distinct')
+
+
+def __check(function: str):
+    if function not in AGGREGATES:
+        raise Exception(f'Unknown aggregate function: {function}, expected one of {AGGREGATES}')
+
+
+def __to_value(value: Any) -> Any:
+    # Numbers stored as text are aggregated by value, like the filters compare them
+    if isinstance(value, str):
+        number = to_number(value)
+        if number is not None:
+            return number
+    return value
+
+
+def __to_term(value: Any) -> Any:
+    if isinstance(value, str):
+        number = to_number(value)
+        if number is None:
+            raise Exception(f'Only numbers can be summed, but was: {value!r}')
+        return number
+    return value
+
+
+def aggregate(values: Iterable[Any], function: str) -> Any:
+    """Fold values with an aggregate function.
+
+    The values are consumed one by one, so an iterator is aggregated without being held in memory.
+    `count` gives the number of values, `sum`, `min` and `max` their sum, minimum and maximum
+    (None without values), and `distinct` the list of distinct values in their first seen order.
+    Like in the filters, numbers stored as text are summed and compared by value.
+
+    Args:
+        values (Iterable[Any]): The values to fold.
+        function (str): `count`, `sum`, `min`, `max` or `distinct`.
+
+    Returns:
+        Any: The aggregated value.
+
+    Examples:
+        >>> from treebuilder.aggregate import aggregate
+        >>> print(aggregate([9.99, 19.99, 29.99], 'max'))
+        29.99
+    """
+    __check(function)
+
+    if function == 'count':
+        return sum(1 for _ in values)
+    if function == 'sum':
+        return sum(__to_term(x) for x in values)
+    if function == 'min':
+        return min((__to_value(x) for x in values), default=None)
+    if function == 'max':
+        return max((__to_value(x) for x in values), default=None)
+    return list(dict.fromkeys(values))
+
+
+def aggregate_by(pairs: Iterable[Tuple[Hashable, Any]], function: str) -> Dict[Hashable, Any]:
+    """Fold values by group with an aggregate function.
+
+    Like `aggregate` for each group, the groups are kept in their first seen order.
+
+    Args:
+        pairs (Iterable[Tuple[Hashable, Any]]): The group and value pairs to fold.
+        function (str): `count`, `sum`, `min`, `max` or `distinct`.
+
+    Returns:
+        Dict[Hashable, Any]: The aggregated value by group.
+
+    Examples:
+        >>> from treebuilder.aggregate import aggregate_by
+        >>> print(aggregate_by([('en', 10), ('fr', 20), ('en', 30)], 'sum'))
+        {'en': 40, 'fr': 20}
+    """
+    __check(function)
+
+    groups = {}
+    if function == 'count':
+        for group, _ in pairs:
+            groups[group] = groups.get(group, 0) + 1
+    elif function == 'sum':
+        for group, value in pairs:
+            groups[group] = groups.get(group, 0) + __to_term(value)
+    elif function in ('min', 'max'):
+        is_better = (lambda x, y: x < y) if function == 'min' else (lambda x, y: x > y)
+        for group, value in pairs:
+            value = __to_value(value)
+            if group not in groups or is_better(value, groups[group]):
+                groups[group] = value
+    else:
+        for group, value in pairs:
+            groups.setdefault(group, {})[value] = None
+        groups = { group: list(values) for group, values in groups.items() }
+
+    return groups
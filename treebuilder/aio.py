@@ -0,0 +1,77 @@
+from typing import Any, Dict, Iterator
+from concurrent.futures import Executor
+import asyncio
+import inspect
+
+from treebuilder.compression import next_chunk
+from treebuilder.constants import DEFAULT_CHUNK_SIZE
+from treebuilder.xml import iter_xml
+from treebuilder.json import iter_json
+
+
+async def __write(pieces: Iterator[str], stream: Any, chunk_size: int, executor: Executor, encoding: str):
+    if encoding is None and isinstance(stream, asyncio.StreamWriter):
+        encoding = 'utf-8'
+    drain = getattr(stream, 'drain', None)
+    # get_running_loop only exists since Python 3.7
+    loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)()
+
+    while True:
+        if executor is not None:
+            chunk = await loop.run_in_executor(executor, next_chunk, pieces, chunk_size)
+        else:
+            chunk = next_chunk(pieces, chunk_size)
+        if len(chunk) == 0:
+            break
+
+        result = stream.write(chunk.encode(encoding) if encoding is not None else chunk)
+        if inspect.isawaitable(result):
+            await result
+        if drain is not None:
+            await drain()
+
+        # Give a chance to the other tasks of the loop to run between chunks
+        await asyncio.sleep(0)
+
+
+async def ato_xml(tree: Dict[str, Any], stream: Any, root: str = None, pretty: bool = True, 
+                  chunk_size: int = DEFAULT_CHUNK_SIZE, executor: Executor = None, encoding: str = None):
+    """Serialize a tree as XML into a stream without blocking the event loop.
+
+    The document is produced by chunks of about `chunk_size` characters and the 
+    control is given back to the event loop between each chunk.
+
+    Args:
+        tree (Dict[str, Any]): The tree to serialize.
+        stream (Any): Destination stream. It needs a `write` method which can be a coroutine.
+            If the stream has a `drain` coroutine, like `asyncio.StreamWriter`, it is awaited after each chunk.
+        root (str, optional): Additional xml root if needed. Defaults to None.
+        pretty (bool, optional): Define if you want a human reading output or not. Defaults to True.
+        chunk_size (int, optional): Approximative number of characters written at once. Defaults to 64k.
+        executor (Executor, optional): Executor used to produce the chunks outside of the event loop. 
+            Defaults to None which produces chunks on the loop itself.
+        encoding (str, optional): Encode chunks as bytes with this encoding. Defaults to None which 
+            writes str chunks, except for `asyncio.StreamWriter` which is written in utf-8.
+    """
+    await __write(iter_xml(tree, root=root, pretty=pretty), stream, chunk_size, executor, encoding)
+
+
+async def ato_json(tree: Dict[str, Any], stream: Any, pretty: bool = True, 
+                   chunk_size: int = DEFAULT_CHUNK_SIZE, executor: Executor = None, encoding: str = None):
+    """Serialize a tree as JSON into a stream without blocking the event loop.
+
+    The document is produced by chunks of about `chunk_size` characters and the 
+    control is given back to the event loop between each chunk.
+
+    Args:
+        tree (Dict[str, Any]): The tree to serialize.
+        stream (Any): Destination stream. It needs a `write` method which can be a coroutine.
+            If the stream has a `drain` coroutine, like `asyncio.StreamWriter`, it is awaited after each chunk.
+        pretty (bool, optional): Define if you want a human reading output or not. Defaults to True.
+        chunk_size (int, optional): Approximative number of characters written at once. Defaults to 64k.
+        executor (Executor, optional): Executor used to produce the chunks outside of the event loop. 
+            Defaults to None which produces chunks on the loop itself.
+        encoding (str, optional): Encode chunks as bytes with this encoding. Defaults to None which 
+            writes str chunks, except for `asyncio.StreamWriter` which is written in utf-8.
+    """
+    await __write(iter_json(tree, pretty=pretty), stream, chunk_size, executor, encoding)
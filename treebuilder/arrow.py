@@ -0,0 +1,163 @@
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List
+
+from treebuilder.constants import ATTRIBUTES, DEFAULT_BATCH_SIZE
+from treebuilder.cross import FactorizedCross
+from treebuilder.traversal import compile_xpath, filter_items, is_node_list
+
+if TYPE_CHECKING:
+    import pyarrow
+
+
+def __get_fields(node: Dict[str, Any], prefix: str) -> Dict[str, Any]:
+    # Leaves and attributes of a node, its node lists are not flattened
+    fields = {}
+    for entry, item in node.items():
+        if entry == ATTRIBUTES:
+            for attribute, value in item.items():
+                fields[f'{prefix}@{attribute}'] = value
+        elif not is_node_list(item):
+            fields[f'{prefix}{entry}'] = item
+    return fields
+
+
+def iter_columns(tree: Dict[str, Any], level: str, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Dict[str, List[Any]]]:
+    """Flatten the nodes of a tree level into batches of columns.
+
+    Each node selected by the `level` xpath is a row, with a column by leaf and by attribute
+    prefixed by `@`. The leaves and attributes of its ancestors are added as columns named by
+    their xpath, e.g. `bookstore/@lang`. Node lists below the level are not flattened.
+    A row without a column gets None.
+
+    The tree is walked once in the document order and the column buffers are yielded
+    each time they reach `batch_size` rows.
+
+    Args:
+        tree (Dict[str, Any]): The tree to flatten.
+        level (str): Xpath of the level, filters are supported e.g. `bookstore/book[price>10]`.
+        batch_size (int, optional): Number of rows by batch, None for a single batch. Defaults to 50000.
+
+    Returns:
+        Iterator[Dict[str, List[Any]]]: Batches of columns by name.
+
+    Examples:
+        >>> from treebuilder.arrow import iter_columns
+        >>> tree = {'bookstore': [{'name': 'Gibert', 'book': [{'title': 'Sapiens'}, {'title': 'Harry Potter'}]}]}
+        >>> print(next(iter_columns(tree, 'bookstore/book')))
+        {'bookstore/name': ['Gibert', 'Gibert'], 'title': ['Sapiens', 'Harry Potter']}
+    """
+    steps = [x for x in compile_xpath(level) if x is not None]
+    if len(steps) == 0:
+        raise Exception(f'A level xpath is expected, but was: {level}')
+    paths = ['/'.join(x[0] for x in steps[0:i + 1]) + '/' for i in range(len(steps))]
+
+    columns, size = {}, 0
+
+    # Nodes are walked depth first with the fields inherited from their ancestors
+    stack = [iter([(tree, {})])]
+    while len(stack) > 0:
+        child = next(stack[-1], None)
+        if child is None:
+            stack.pop()
+            continue
+
+        node, fields = child
+        depth = len(stack) - 1
+        if depth > 0:
+            fields = { **fields, **__get_fields(node, '' if depth == len(steps) else paths[depth - 1]) }
+
+        if depth < len(steps):
+            tag, filter = steps[depth]
+            children = node.get(tag)
+            if children is None or not is_node_list(children):
+                continue
+            if type(children) is FactorizedCross:
+                children = list(children)
+            if filter is not None:
+                children = [x for x, f in zip(children, filter_items(children, filter)) if f]
+            stack.append(iter([(x, fields) for x in children]))
+            continue
+
+        # It's a row, a new column is filled with None for the previous rows
+        for name, value in fields.items():
+            column = columns.get(name)
+            if column is None:
+                column = columns[name] = [None] * size
+            column.append(value)
+        size += 1
+        for column in columns.values():
+            if len(column) < size:
+                column.append(None)
+
+        if batch_size is not None and size >= batch_size:
+            yield columns
+            columns, size = { x: [] for x in columns }, 0
+
+    if size > 0:
+        yield columns
+
+
+def to_arrow(tree: Dict[str, Any], level: str) -> 'pyarrow.Table':
+    """Flatten the nodes of a tree level into an Arrow table.
+
+    The columns are built by `iter_columns`, see its documentation for the flattening.
+    It requires the `pyarrow` package.
+
+    Args:
+        tree (Dict[str, Any]): The tree to flatten.
+        level (str): Xpath of the level, e.g. `bookstore/book`.
+
+    Returns:
+        pyarrow.Table: The flattened level.
+    """
+    import pyarrow
+
+    # A single batch, so a column found only in the last rows has the same type everywhere
+    for columns in iter_columns(tree, level, batch_size=None):
+        return pyarrow.table(columns)
+    return pyarrow.table({})
+
+
+def to_parquet(tree: Dict[str, Any], file_path: str, level: str, row_group_size: int = DEFAULT_BATCH_SIZE,
+               compression: str = 'snappy'):
+    """Flatten the nodes of a tree level into a Parquet file.
+
+    The columns are built by `iter_columns`, see its documentation for the flattening.
+    Each batch of `row_group_size` rows is written as a row group, so only one batch is
+    held in memory. The level is flattened twice: a first pass gives the schema from the
+    non-null values of all the batches, so a column which is null or missing in the first
+    row groups keeps its type, then the second pass writes the row groups.
+    It requires the `pyarrow` package.
+
+    Args:
+        tree (Dict[str, Any]): The tree to flatten.
+        file_path (str): Parquet file path.
+        level (str): Xpath of the level, e.g. `bookstore/book`.
+        row_group_size (int, optional): Number of rows by row group. Defaults to 50000.
+        compression (str, optional): Parquet compression codec. Defaults to 'snappy'.
+    """
+    import pyarrow
+    import pyarrow.parquet
+
+    # The first value of each Python type is kept by column, e.g. an int and a float give a double
+    samples = {}
+    for columns in iter_columns(tree, level, batch_size=row_group_size):
+        for name, column in columns.items():
+            types = samples.setdefault(name, {})
+            for value in column:
+                if value is not None and type(value) not in types:
+                    types[type(value)] = value
+
+    if len(samples) == 0: # Nothing selected by the level
+        pyarrow.parquet.write_table(pyarrow.table({}), file_path, compression=compression)
+        return
+
+    schema = pyarrow.schema([(name, pyarrow.array(list(types.values())).type) for name, types in samples.items()])
+    writer = pyarrow.parquet.ParquetWriter(file_path, schema, compression=compression)
+    try:
+        for columns in iter_columns(tree, level, batch_size=row_group_size):
+            # A column which appears in a later batch is missing from the previous ones
+            size = len(next(iter(columns.values())))
+            batch = pyarrow.table({ x.name: columns.get(x.name, [None] * size) for x in schema }, schema=schema)
+            writer.write_table(batch, row_group_size=row_group_size)
+    finally:
+        writer.close()
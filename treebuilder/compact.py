@@ -0,0 +1,99 @@
+from typing import Any, Dict, Tuple
+from hashlib import blake2b
+
+from treebuilder.constants import ATTRIBUTES
+from treebuilder.diff import DIGEST_SIZE, hash_tree, hash_value
+
+
+def __canonical_value(value: Any, canonical: Dict[bytes, Any]) -> Any:
+    digest = hash_value(value)
+    shared = canonical.setdefault(digest, value)
+    # Equality is checked in case of hash collision
+    return shared if shared is value or shared == value else value
+
+
+def __forget(node: Dict[str, Any], hashes: Dict[int, Tuple[Dict[str, Any], bytes]]):
+    # The replaced subtree has been hashed, the cache must not keep it alive
+    stack = [node]
+    while len(stack) > 0:
+        node = stack.pop()
+        cached = hashes.get(id(node))
+        if cached is not None and cached[0] is node:
+            del hashes[id(node)]
+        for item in node.values():
+            if isinstance(item, list):
+                stack.extend(x for x in item if isinstance(x, dict))
+
+
+def compact(tree: Dict[str, Any], hashes: Dict[int, Tuple[Dict[str, Any], bytes]] = None,
+            canonical: Dict[bytes, Any] = None) -> Dict[str, Any]:
+    """Share identical subtrees of a tree.
+
+    Nodes, node lists and dictionary leaves (like attributes) equal to a previous one are 
+    replaced by this previous instance, so the tree holds each distinct subtree only once.
+    Identical subtrees are found by their content hash, then checked for equality.
+
+    The shared subtrees must not be modified in place anymore, a `TreeBuilder` copies
+    them on write after a compaction. Factorized crosses are kept as they are.
+
+    Args:
+        tree (Dict[str, Any]): The tree to compact in place.
+        hashes (Dict[int, Tuple[Dict[str, Any], bytes]], optional): Hash cache of the tree, see `hash_tree`. Defaults to None.
+        canonical (Dict[bytes, Any], optional): Shared instances by content hash. Given again to the
+            next call, the subtrees already shared are skipped. Defaults to None.
+
+    Returns:
+        Dict[str, Any]: The compacted tree.
+
+    Examples:
+        >>> from treebuilder.compact import compact
+        >>> policy = {'carrier': 'UPS', 'days': 3}
+        >>> tree = {'orders': [{'order': [{'id': 1, 'shipping': [dict(policy)]}, {'id': 2, 'shipping': [dict(policy)]}]}]}
+        >>> compact(tree)
+        >>> orders = tree['orders'][0]['order']
+        >>> print(orders[0]['shipping'][0] is orders[1]['shipping'][0])
+        True
+    """
+    hashes = {} if hashes is None else hashes
+    canonical = {} if canonical is None else canonical
+
+    stack = [tree]
+    while len(stack) > 0:
+        node = stack.pop()
+
+        for entry, item in node.items():
+            if entry == ATTRIBUTES or isinstance(item, dict):
+                node[entry] = __canonical_value(item, canonical)
+                continue
+
+            if not isinstance(item, list):
+                continue
+
+            digests = []
+            for i, child in enumerate(item):
+                if not isinstance(child, dict):
+                    digests.append(hash_value(child))
+                    continue
+
+                digest = hash_tree(child, hashes)
+                digests.append(digest)
+                shared = canonical.get(digest)
+                if shared is child: # Already compacted by a previous call
+                    continue
+
+                if shared is None:
+                    canonical[digest] = child
+                    stack.append(child)
+                elif shared == child:
+                    item[i] = shared
+                    __forget(child, hashes)
+                else: # Hash collision
+                    stack.append(child)
+
+            # Lists are shared too, a single item list is very common
+            digest = blake2b(b'['.join(digests), digest_size=DIGEST_SIZE).digest()
+            shared = canonical.setdefault(digest, item)
+            if shared is not item and shared == item:
+                node[entry] = shared
+
+    return tree
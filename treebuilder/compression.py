@@ -0,0 +1,122 @@
+from typing import TYPE_CHECKING, Any, Iterator
+import os
+
+from treebuilder.constants import DEFAULT_CHUNK_SIZE
+
+if TYPE_CHECKING:
+    import queue
+
+
+COMPRESSIONS = ('gzip', 'bz2', 'zstd')
+EXTENSIONS = { '.gz': 'gzip', '.gzip': 'gzip', '.bz2': 'bz2', '.zst': 'zstd', '.zstd': 'zstd' }
+
+# Number of chunks waiting to be compressed, it bounds the memory used when the compression is slower
+__QUEUE_SIZE = 8
+
+
+def get_compression(file_path: str, compression: str = 'infer') -> str:
+    """Resolve the compression to use for a file.
+
+    Args:
+        file_path (str): Output file path.
+        compression (str, optional): `gzip`, `bz2`, `zstd`, None for no compression or `infer`
+            to deduce it from the file extension (`.gz`, `.bz2`, `.zst`). Defaults to 'infer'.
+
+    Returns:
+        str: The compression name or None if the file isn't compressed.
+    """
+    if compression == 'infer':
+        _, extension = os.path.splitext(file_path)
+        return EXTENSIONS.get(extension.lower())
+    if compression is not None and compression not in COMPRESSIONS:
+        raise Exception(f'Unknown compression: {compression}, expected one of {COMPRESSIONS}')
+    return compression
+
+
+def __open(file_path: str, compression: str) -> Any:
+    if compression == 'gzip':
+        import gzip
+        return gzip.open(file_path, mode='wb')
+    if compression == 'bz2':
+        import bz2
+        return bz2.open(file_path, mode='wb')
+
+    try:
+        import zstandard
+    except ImportError as error:
+        raise ImportError('The zstd compression requires the zstandard package: pip install treebuilder[zstd]') from error
+    return zstandard.open(file_path, mode='wb')
+
+
+def next_chunk(pieces: Iterator[str], chunk_size: int) -> str:
+    """Gather the next text pieces until they reach a chunk size.
+
+    Args:
+        pieces (Iterator[str]): Text pieces.
+        chunk_size (int): Minimum number of characters of the chunk, except for the last one.
+
+    Returns:
+        str: The chunk, empty once all the pieces are consumed.
+    """
+    chunk, size = [], 0
+    for piece in pieces:
+        chunk.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            break
+    return ''.join(chunk)
+
+
+def __compress(chunks: 'queue.Queue', f: Any, errors: list):
+    while True:
+        chunk = chunks.get()
+        if chunk is None:
+            return
+        # Keeps consuming after a failure so the producer is never blocked
+        if len(errors) == 0:
+            try:
+                f.write(chunk)
+            except BaseException as e:
+                errors.append(e)
+
+
+def write_compressed(pieces: Iterator[str], file_path: str, compression: str,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE, encoding: str = 'utf-8'):
+    """Write text pieces into a compressed file.
+
+    The pieces are gathered into chunks which are compressed and written by a background thread,
+    so the production of the next chunks, e.g. a tree walk, overlaps the compression.
+    The compressors release the GIL while they work on a chunk.
+
+    Args:
+        pieces (Iterator[str]): Text pieces to write.
+        file_path (str): Output file path.
+        compression (str): `gzip`, `bz2` or `zstd`. The `zstd` compression requires the `zstd` extra.
+        chunk_size (int, optional): Approximative number of characters compressed at once. Defaults to 64k.
+        encoding (str, optional): Text encoding. Defaults to 'utf-8'.
+
+    Examples:
+        >>> from treebuilder.xml import iter_xml
+        >>> tree = {'bookstore': [{'book': [{'title': 'Sapiens'}, {'title': 'Harry Potter'}]}]}
+        >>> write_compressed(iter_xml(tree), 'bookstore.xml.gz', 'gzip')
+    """
+    import queue
+    import threading
+
+    chunks, errors = queue.Queue(maxsize=__QUEUE_SIZE), []
+
+    with __open(file_path, compression) as f:
+        worker = threading.Thread(target=__compress, args=(chunks, f, errors), daemon=True)
+        worker.start()
+        try:
+            while len(errors) == 0:
+                chunk = next_chunk(pieces, chunk_size)
+                if len(chunk) == 0:
+                    break
+                chunks.put(chunk.encode(encoding))
+        finally:
+            chunks.put(None)
+            worker.join()
+
+    if len(errors) > 0:
+        raise errors[0]
@@ -1,2 +1,6 @@
 ATTRIBUTES = '__ATTRIBUTES__'
-PARENT = '__PARENT__'
\ No newline at end of file
+PARENT = '__PARENT__'
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_BATCH_SIZE = 50000
+QUERY_CACHE_SIZE = 256
+SCALARS = (str, int, float, bool, bytes, type(None))
@@ -1,6 +1,10 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List
+from collections.abc import Sequence
+from itertools import product
 import copy
 
+from treebuilder.constants import SCALARS
+
 
 # Todo: maybe it should be better to returns an iterable instead of a list
 def cross(source: List[Dict[str, Any]], entry: str, values: List[Any], deep_copy: bool = True) -> List[Dict[str, Any]]:
@@ -48,5 +52,158 @@ def cross(source: List[Dict[str, Any]], entry: str, values: List[Any], deep_copy
             result.append(clone)
 
     return result
+
+
+def cross_product(source: List[Dict[str, Any]], values: Dict[str, List[Any]], deep_copy: bool = True) -> List[Dict[str, Any]]:
+    """Cross source with several values lists at once
+
+    It gives the same result than successive crosses, one by entry in the `values` order,
+    but each source item is cloned only once per combination of values.
+
+    Examples:
+        >>> import treebuilder as tb
+        >>> x = [{'Name': 'foo'}, {'Name': 'bar'}]
+
+        >>> y = tb.cross_product(x, {'Size': ['S', 'M'], 'Color': ['red', 'blue']})
+        >>> print(y)
+
+    Args:
+        source (List[Dict[str, Any]]): Source list to cross.
+        values (Dict[str, List[Any]]): Values to cross by entry key.
+        deep_copy (bool): Make a deep copy on values for each usages. Default is True.
+
+    Returns:
+        List[Dict[str, Any]]: The crossed list with `length = S x V1 x V2 x ...`.
+    """
+    if len(source) == 0:
+        source = [{}]
+    if any(len(x) == 0 for x in values.values()):
+        return []
+
+    # The last entry varies the slowest, like for successive crosses
+    entries = list(values)
+    combinations = [x[::-1] for x in product(*reversed(list(values.values())))]
+
+    # Clones are made before the source items get their values
+    rows = [source] + [[copy.deepcopy(item) if deep_copy else item.copy() for item in source] for _ in combinations[1:]]
+
+    result = []
+    for combination, row in zip(combinations, rows):
+        # Scalars are immutable, they don't need to be copied for each item
+        assignments = [(entry, value, deep_copy and not isinstance(value, SCALARS)) for entry, value in zip(entries, combination)]
+        for item in row:
+            for entry, value, is_copied in assignments:
+                item[entry] = copy.deepcopy(value) if is_copied else value
+            result.append(item)
+
+    return result
     
         
+
+
+class FactorizedCross(Sequence):
+    """Cross of source with values which is materialized only when iterated.
+
+    Iterating gives the same items, in the same order, than the `cross` function but
+    they are built on the fly, so the `S x V` items are never held in memory together.
+    The source can be itself a `FactorizedCross` to represent successive crosses.
+
+    The source items must not be modified while the factorized cross is used.
+
+    Examples:
+        >>> import treebuilder as tb
+        >>> x = [{'Name': 'foo'}, {'Name': 'bar'}]
+        >>> y = tb.FactorizedCross(x, 'Value', [1, 2, 3])
+        >>> print(len(y))
+        >>> print(list(y))
+
+    Args:
+        source (Sequence[Dict[str, Any]]): Source list to cross.
+        entry (str): Entry key under which values are stored.
+        values (List[Any]): List of values to cross.
+        deep_copy (bool): Make a deep copy on values for each usages. Default is True.
+    """
+    @property
+    def source(self) -> Sequence:
+        """[Sequence[Dict[str, Any]]]: Gets the crossed source."""
+        return self.__source
+
+    @property
+    def entry(self) -> str:
+        """[str]: Gets the entry key under which values are stored."""
+        return self.__entry
+
+    @property
+    def values(self) -> List[Any]:
+        """[List[Any]]: Gets the crossed values."""
+        return self.__values
+
+    def __init__(self, source: Sequence, entry: str, values: List[Any], deep_copy: bool = True):
+        self.__source = source
+        self.__entry = entry
+        self.__values = values
+        self.__deep_copy = deep_copy
+        # Keys added later on the source items have to stay after the entry
+        self.__sizes = [len(item) for item in source]
+
+    def __len__(self) -> int:
+        if len(self.__source) == 0:
+            return len(self.__values)
+        return len(self.__source) * len(self.__values)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        entry, deep_copy = self.__entry, self.__deep_copy
+        
+        if len(self.__source) == 0:
+            for value in self.__values:
+                yield { entry: value }
+            return
+
+        # A factorized source builds new items for each iteration, no need to copy them again
+        is_fresh = isinstance(self.__source, FactorizedCross)
+        for value in self.__values:
+            for item, size in zip(self.__source, self.__sizes):
+                yield self.__clone(item, size, value, is_fresh)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('FactorizedCross index out of range')
+
+        if len(self.__source) == 0:
+            return { self.__entry: self.__values[index] }
+
+        value = self.__values[index // len(self.__source)]
+        index %= len(self.__source)
+        return self.__clone(self.__source[index], self.__sizes[index], value, isinstance(self.__source, FactorizedCross))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, FactorizedCross)):
+            return len(self) == len(other) and all(x == y for x, y in zip(self, other))
+        return False
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f'FactorizedCross({self.__source!r}, {self.__entry!r}, {self.__values!r})'
+
+    def __clone(self, item: Dict[str, Any], size: int, value: Any, is_fresh: bool) -> Dict[str, Any]:
+        entry = self.__entry
+        if not is_fresh:
+            item = copy.deepcopy(item) if self.__deep_copy else item.copy()
+        value = copy.deepcopy(value) if self.__deep_copy else value
+
+        if entry in item or len(item) <= size:
+            item[entry] = value
+            return item
+        
+        # Puts the entry where the cross would have added it
+        entries = list(item.items())
+        clone = dict(entries[:size])
+        clone[entry] = value
+        clone.update(entries[size:])
+        return clone
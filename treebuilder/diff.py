@@ -0,0 +1,175 @@
+from typing import Any, Dict, List, Tuple
+from hashlib import blake2b
+
+from treebuilder.cross import FactorizedCross
+
+
+DIGEST_SIZE = 16
+
+
+def __hash_leaf(value: Any) -> bytes:
+    h = blake2b(digest_size=DIGEST_SIZE)
+    if isinstance(value, dict):
+        h.update(b'{')
+        for key, x in value.items():
+            h.update(repr(key).encode())
+            h.update(__hash_leaf(x))
+    elif isinstance(value, (list, tuple)):
+        h.update(b'[')
+        for x in value:
+            h.update(__hash_leaf(x))
+    else:
+        h.update(type(value).__name__.encode())
+        h.update(repr(value).encode())
+    return h.digest()
+
+
+def __hash_node(node: Dict[str, Any], cache: Dict[int, Tuple[Dict[str, Any], bytes]]) -> bytes:
+    if cache is not None:
+        cached = cache.get(id(node))
+        if cached is not None and cached[0] is node:
+            return cached[1]
+
+    h = blake2b(digest_size=DIGEST_SIZE)
+    h.update(b'<')
+    for key, item in node.items():
+        h.update(repr(key).encode())
+        h.update(__hash_item(item, cache))
+    digest = h.digest()
+
+    if cache is not None:
+        # The node is kept with its hash, so its id can't be reused by another node
+        cache[id(node)] = (node, digest)
+    return digest
+
+
+def __hash_item(item: Any, cache: Dict[int, Tuple[Dict[str, Any], bytes]]) -> bytes:
+    if not isinstance(item, (list, FactorizedCross)): # It's a leaf
+        return __hash_leaf(item)
+
+    h = blake2b(digest_size=DIGEST_SIZE)
+    h.update(b'[')
+    # Items of a factorized cross are built on each iteration, they can't be cached
+    node_cache = None if isinstance(item, FactorizedCross) else cache
+    for x in item:
+        h.update(__hash_node(x, node_cache) if isinstance(x, dict) else __hash_leaf(x))
+    return h.digest()
+
+
+def hash_tree(tree: Dict[str, Any], cache: Dict[int, Tuple[Dict[str, Any], bytes]] = None) -> bytes:
+    """Compute the content hash of a tree.
+
+    The hash of a node combines its entries, in order, with the hashes of its children.
+    Two trees have the same hash when they give the same XML or JSON output.
+
+    With a cache, the hashes of the nodes are stored by node id and reused by the next calls.
+    The hash of a modified node, and of all its ancestors, has to be removed from the cache.
+
+    Args:
+        tree (Dict[str, Any]): The tree to hash.
+        cache (Dict[int, Tuple[Dict[str, Any], bytes]], optional): Nodes and their hash by node id. Defaults to None.
+
+    Returns:
+        bytes: The tree hash.
+    """
+    return __hash_node(tree, cache)
+
+
+def hash_value(value: Any) -> bytes:
+    """Compute the content hash of a leaf value.
+
+    Args:
+        value (Any): The value to hash, scalars and nested dictionaries or lists of scalars.
+
+    Returns:
+        bytes: The value hash.
+    """
+    return __hash_leaf(value)
+
+
+def __escape(key: Any) -> str:
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+
+def __value(item: Any) -> Any:
+    return list(item) if isinstance(item, FactorizedCross) else item
+
+
+def __diff_node(source: Dict[str, Any], target: Dict[str, Any], path: str,
+                source_hashes: Dict, target_hashes: Dict, delta: List[Dict[str, Any]]):
+    for key in source:
+        if key not in target:
+            delta.append({ 'op': 'remove', 'path': f'{path}/{__escape(key)}' })
+
+    for key, item in target.items():
+        item_path = f'{path}/{__escape(key)}'
+        if key not in source:
+            delta.append({ 'op': 'add', 'path': item_path, 'value': __value(item) })
+        elif isinstance(item, (list, FactorizedCross)):
+            __diff_item(source[key], item, item_path, source_hashes, target_hashes, delta)
+        else:
+            # Only nodes are cached, a leaf like the attributes dictionary is updated in place
+            __diff_item(source[key], item, item_path, None, None, delta)
+
+
+def __diff_item(source: Any, target: Any, path: str,
+                source_hashes: Dict, target_hashes: Dict, delta: List[Dict[str, Any]]):
+    source_is_node, target_is_node = isinstance(source, (list, FactorizedCross)), isinstance(target, (list, FactorizedCross))
+
+    if source_is_node and target_is_node:
+        if __hash_item(source, source_hashes) == __hash_item(target, target_hashes):
+            return
+
+        # Materializes factorized crosses to compare their items one by one, without caching them
+        if isinstance(source, FactorizedCross):
+            source, source_hashes = list(source), None
+        if isinstance(target, FactorizedCross):
+            target, target_hashes = list(target), None
+        for index, (x, y) in enumerate(zip(source, target)):
+            __diff_item(x, y, f'{path}/{index}', source_hashes, target_hashes, delta)
+        for index in range(len(source), len(target)):
+            delta.append({ 'op': 'add', 'path': f'{path}/{index}', 'value': target[index] })
+        # Removed from the end to keep the previous indices valid
+        for index in reversed(range(len(target), len(source))):
+            delta.append({ 'op': 'remove', 'path': f'{path}/{index}' })
+    elif isinstance(source, dict) and isinstance(target, dict):
+        if __hash_node(source, source_hashes) != __hash_node(target, target_hashes):
+            __diff_node(source, target, path, source_hashes, target_hashes, delta)
+    elif source_is_node or target_is_node or __hash_leaf(source) != __hash_leaf(target):
+        delta.append({ 'op': 'replace', 'path': path, 'value': __value(target) })
+
+
+def diff(source: Dict[str, Any], target: Dict[str, Any],
+         source_hashes: Dict[int, Tuple[Dict[str, Any], bytes]] = None,
+         target_hashes: Dict[int, Tuple[Dict[str, Any], bytes]] = None) -> List[Dict[str, Any]]:
+    """Compute the operations which transform a source tree into a target tree.
+
+    The operations follow the JSON Patch format (RFC 6902): `add`, `remove` and `replace`
+    with a JSON pointer path into the tree, where node lists are indexed.
+    Applied in order they give the target tree.
+
+    Subtrees with the same hash are skipped, so with the hash caches of both trees
+    the cost is proportional to the changes and their depth.
+
+    The values of the operations are the target subtrees themselves, they are not copied.
+
+    Args:
+        source (Dict[str, Any]): The tree to transform.
+        target (Dict[str, Any]): The expected tree.
+        source_hashes (Dict[int, Tuple[Dict[str, Any], bytes]], optional): Hash cache of the source tree. Defaults to None.
+        target_hashes (Dict[int, Tuple[Dict[str, Any], bytes]], optional): Hash cache of the target tree. Defaults to None.
+
+    Returns:
+        List[Dict[str, Any]]: The operations list, empty if both trees are the same.
+
+    Examples:
+        >>> from treebuilder.diff import diff
+        >>> x = {'bookstore': [{'book': [{'title': 'Sapiens'}, {'title': 'Harry Potter'}]}]}
+        >>> y = {'bookstore': [{'book': [{'title': 'Sapiens'}, {'title': 'Harry Potter 2'}]}]}
+        >>> print(diff(x, y))
+        [{'op': 'replace', 'path': '/bookstore/0/book/1/title', 'value': 'Harry Potter 2'}]
+    """
+    delta = []
+    if __hash_node(source, source_hashes) != __hash_node(target, target_hashes):
+        __diff_node(source, target, '', source_hashes, target_hashes, delta)
+    return delta
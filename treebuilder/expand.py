@@ -1,6 +1,8 @@
 from typing import Any, Dict, List
 import copy
 
+from treebuilder.constants import SCALARS
+
 
 # Todo: maybe it should be better to returns an iterable instead of a list
 def expand(source: List[Dict[str, Any]], entry: str, values: List[Any], deep_copy: bool = True) -> List[Dict[str, Any]]:
@@ -76,3 +78,128 @@ def expand(source: List[Dict[str, Any]], entry: str, values: List[Any], deep_cop
                 index += 1
     
     return result
+
+
+def __copy(value: Any, deep_copy: bool) -> Any:
+    # Scalars are immutable, they don't need to be copied
+    return copy.deepcopy(value) if deep_copy and not isinstance(value, SCALARS) else value
+
+
+def __clone_rows(source: List[Dict[str, Any]], templates: List[int], deep_copy: bool) -> List[Dict[str, Any]]:
+    # New items are cloned from their source item before it gets its values
+    clones = []
+    for template in templates[len(source):]:
+        if template is None:
+            clones.append({})
+        else:
+            clones.append(copy.deepcopy(source[template]) if deep_copy else source[template].copy())
+    return source + clones
+
+
+def __clone_grouped_rows(source: List[Dict[str, Any]], rows: List[int], templates: List[int], deep_copy: bool) -> List[Dict[str, Any]]:
+    # Rows are sorted, the first row of each source item is the item itself and the next ones are its clones
+    result, used = [], set()
+    for row in rows:
+        template = templates[row]
+        if template not in used:
+            used.add(template)
+            result.append(source[template])
+        else:
+            result.append(copy.deepcopy(source[template]) if deep_copy else source[template].copy())
+    return result
+
+
+def expand_columns(source: List[Dict[str, Any]], columns: Dict[str, List[Any]], deep_copy: bool = True, 
+                   groups: List[Any] = None) -> List[Dict[str, Any]]:
+    """Expand source by several values lists at once
+
+    It gives the same result than successive expands, one by column in the `columns` order,
+    but the values are applied row by row and each new item is cloned only once.
+
+    The `groups` give a sort key by source item, e.g. the rank of its parent list in a tree.
+    Successive expands of a tree walk it again before each column, so the items and their
+    clones come grouped by parent list: with `groups`, the rows are sorted the same way 
+    before each column, and the result is given in this order.
+
+    Exemples:
+        >>> import treebuilder as tb
+        >>> x = [{'Name': 'foo'}, {'Name': 'bar'}]
+        >>> y = tb.expand_columns(x, {'Id': [1, 2, 3], 'Price': [9.99, 19.99]})
+        >>> print(y)
+
+    Args:
+        source (List[Dict[str, Any]]): Source list to expand.
+        columns (Dict[str, List[Any]]): Values to expand by entry key.
+        deep_copy (bool): Make a deep copy on values for each usages. Default is True.
+        groups (List[Any], optional): Sort key of each source item. Defaults to None.
+
+    Returns:
+        List[Dict[str, Any]]: The expanded list.
+    """
+    columns = { entry: values for entry, values in columns.items() if len(values) > 0 }
+    if groups is not None and len(source) == 0:
+        groups = None
+
+    # Source item cloned by each row, and the values index of each column for the row
+    templates, indices = list(range(len(source))), [[] for _ in source]
+    for values in columns.values():
+        if groups is not None: # The rows as a new walk of the tree gives them
+            order = sorted(range(len(templates)), key=lambda x: groups[templates[x]])
+            templates, indices = [templates[x] for x in order], [indices[x] for x in order]
+
+        length = len(templates)
+        for i in range(length, len(values)):
+            # Rows added by a column are clones of the previous rows, with their previous values
+            template = i % length if length > 0 else None
+            templates.append(templates[template] if template is not None else None)
+            indices.append(list(indices[template]) if template is not None else [])
+        for i, row in enumerate(indices):
+            row.append(i % len(values))
+
+    if groups is None:
+        result = __clone_rows(source, templates, deep_copy)
+    else:
+        order = sorted(range(len(templates)), key=lambda x: groups[templates[x]])
+        result = __clone_grouped_rows(source, order, templates, deep_copy)
+        indices = [indices[x] for x in order]
+
+    columns = list(columns.items())
+    for item, row in zip(result, indices):
+        for (entry, values), index in zip(columns, row):
+            item[entry] = __copy(values[index], deep_copy)
+
+    return result
+
+
+def expand_records(source: List[Dict[str, Any]], records: List[Dict[str, Any]], deep_copy: bool = True) -> List[Dict[str, Any]]:
+    """Expand source by a records list
+
+    Each record gives the entries of an item, like `expand` gives the entry of an item
+    for each value, with the same ring logic between source and records. An entry missing 
+    from a record is left as it is on its item.
+
+    Exemples:
+        >>> import treebuilder as tb
+        >>> x = [{'Name': 'foo'}, {'Name': 'bar'}]
+        >>> y = tb.expand_records(x, [{'Id': 1, 'Price': 9.99}, {'Id': 2, 'Price': 19.99}, {'Id': 3}])
+        >>> print(y)
+
+    Args:
+        source (List[Dict[str, Any]]): Source list to expand.
+        records (List[Dict[str, Any]]): Entries and values of each item.
+        deep_copy (bool): Make a deep copy on values for each usages. Default is True.
+
+    Returns:
+        List[Dict[str, Any]]: The expanded list.
+    """
+    if len(records) == 0:
+        return source
+
+    length = len(source)
+    templates = list(range(length)) + [i % length if length > 0 else None for i in range(length, len(records))]
+    result = __clone_rows(source, templates, deep_copy)
+    for i, item in enumerate(result):
+        for entry, value in records[i % len(records)].items():
+            item[entry] = __copy(value, deep_copy)
+
+    return result
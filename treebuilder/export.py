@@ -0,0 +1,256 @@
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Tuple, Union
+import os
+
+from treebuilder.compression import EXTENSIONS, get_compression, write_compressed
+from treebuilder.traversal import iter_events
+from treebuilder.xml import format_xml
+from treebuilder.json import format_json, format_jsonl, format_records
+
+if TYPE_CHECKING:
+    import queue
+    import threading
+
+
+# Number of events formatted at once, their text is handed to the writers
+__EVENTS_BY_CHUNK = 4096
+
+# Number of chunks waiting to be written by sink, it bounds the memory used when a sink is slower
+__QUEUE_SIZE = 8
+
+
+def xml_sink(file_path: str, root: str = None, pretty: bool = True, compression: str = 'infer') -> Dict[str, Any]:
+    """Define a XML output of `export`.
+
+    Args:
+        file_path (str): Xml file path
+        root (str, optional): Additional xml root if needed. Defaults to None.
+        pretty (bool, optional): Define if you want a human reading output or not. Defaults to True.
+        compression (str, optional): `gzip`, `bz2`, `zstd`, None or `infer` to deduce it
+            from the file extension. Defaults to 'infer'.
+
+    Returns:
+        Dict[str, Any]: The sink definition.
+    """
+    return { 'file_path': file_path, 'compression': compression, 'format': lambda tree: format_xml(tree, root=root, pretty=pretty) }
+
+
+def json_sink(file_path: str, pretty: bool = True, compression: str = 'infer') -> Dict[str, Any]:
+    """Define a JSON output of `export`.
+
+    Args:
+        file_path (str): JSON file path
+        pretty (bool, optional): Define if you want a human reading output or not. Defaults to True.
+        compression (str, optional): `gzip`, `bz2`, `zstd`, None or `infer` to deduce it
+            from the file extension. Defaults to 'infer'.
+
+    Returns:
+        Dict[str, Any]: The sink definition.
+    """
+    return { 'file_path': file_path, 'compression': compression, 'format': lambda tree: format_json(pretty=pretty) }
+
+
+def jsonl_sink(file_path: str, level: str, include_ancestors: bool = False, compression: str = 'infer') -> Dict[str, Any]:
+    """Define a JSON Lines output of `export`, with a line by node of a level.
+
+    Args:
+        file_path (str): JSON Lines file path
+        level (str): Xpath of the records, e.g. `bookstore/book`.
+        include_ancestors (bool, optional): Add the leaves and attributes of the ancestors to each
+            record, named by their xpath e.g. `bookstore/@city`. Defaults to False.
+        compression (str, optional): `gzip`, `bz2`, `zstd`, None or `infer` to deduce it
+            from the file extension. Defaults to 'infer'.
+
+    Returns:
+        Dict[str, Any]: The sink definition.
+    """
+    return { 'file_path': file_path, 'compression': compression, 'format': lambda tree: format_jsonl(level, include_ancestors=include_ancestors) }
+
+
+# Formats which can be deduced from a file path, JSON Lines needs a level
+SINKS = { '.xml': xml_sink, '.json': json_sink }
+
+
+def __get_sink(sink: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+    if not isinstance(sink, str):
+        return sink
+
+    # The format is given by the extension, before the compression one
+    name, extension = os.path.splitext(sink)
+    if extension.lower() in EXTENSIONS:
+        name, extension = os.path.splitext(name)
+    if extension.lower() not in SINKS:
+        raise Exception(f'Unknown output format for: {sink}, expected one of {tuple(SINKS)} or a sink')
+    return SINKS[extension.lower()](sink)
+
+
+def __write(chunks: 'queue.Queue', file_path: str, compression: str, errors: list):
+    pieces = iter(chunks.get, None)
+    try:
+        if compression is not None:
+            write_compressed(pieces, file_path, compression)
+        else:
+            with open(file_path, mode='w') as f:
+                for piece in pieces:
+                    f.write(piece)
+    except BaseException as e:
+        errors.append(e)
+        # Keeps consuming after a failure so the producer is never blocked
+        for _ in pieces:
+            pass
+
+
+def __start_writers(outputs: List[Tuple[str, str]], errors: list) -> List[Tuple['queue.Queue', 'threading.Thread']]:
+    import queue
+    import threading
+
+    # A writer thread by (file path, compression) output, fed by a bounded queue of texts
+    writers = []
+    for file_path, compression in outputs:
+        chunks = queue.Queue(maxsize=__QUEUE_SIZE)
+        compression = get_compression(file_path, compression)
+        worker = threading.Thread(target=__write, args=(chunks, file_path, compression, errors), daemon=True)
+        worker.start()
+        writers.append((chunks, worker))
+    return writers
+
+
+def __stop_writers(writers: List[Tuple['queue.Queue', 'threading.Thread']]):
+    for chunks, worker in writers:
+        chunks.put(None)
+        worker.join()
+
+
+def __iter_batches(tree: Dict[str, Any], errors: list) -> Iterator[List[Tuple[int, str, Any]]]:
+    # Events are formatted by batches, so each formatter is switched to once by batch.
+    # The walk stops early when a writer failed, the last batch may be empty.
+    events = []
+    for event in iter_events(tree):
+        events.append(event)
+        if len(events) == __EVENTS_BY_CHUNK:
+            if len(errors) > 0:
+                break
+            yield events
+            events = []
+    yield events
+
+
+def export(tree: Dict[str, Any], sinks: List[Union[str, Dict[str, Any]]]):
+    """Serialize a tree into several outputs with a single walk.
+
+    The tree is walked once by `treebuilder.traversal.iter_events` and each event is formatted
+    by every sink. Each output is written by its own thread, and compressed by it when asked,
+    so the writes and compressions overlap each other and the walk.
+    The XML and JSON outputs are the same than the ones of `to_xml` and `to_json`.
+
+    Args:
+        tree (Dict[str, Any]): The tree to serialize.
+        sinks (List[Union[str, Dict[str, Any]]]): Outputs defined by `xml_sink`, `json_sink` or 
+            `jsonl_sink`, or by a file path for the XML and JSON default options, the format is 
+            deduced from the file extension, e.g. `bookstore.xml` or `bookstore.json.gz`.
+
+    Examples:
+        >>> from treebuilder.export import export, xml_sink
+        >>> tree = {'bookstore': [{'book': [{'title': 'Sapiens'}, {'title': 'Harry Potter'}]}]}
+        >>> export(tree, [xml_sink('bookstore.xml', pretty=False), 'bookstore.json.gz'])
+    """
+    sinks = [__get_sink(x) for x in sinks]
+    formatters = [x['format'](tree) for x in sinks]
+    headers = [next(x) for x in formatters]
+
+    errors = []
+    writers = __start_writers([(x['file_path'], x['compression']) for x in sinks], errors)
+    try:
+        for (chunks, _), header in zip(writers, headers):
+            chunks.put(header)
+
+        for events in __iter_batches(tree, errors):
+            for (chunks, _), formatter in zip(writers, formatters):
+                chunks.put(formatter.send(events))
+
+        for (chunks, _), formatter in zip(writers, formatters):
+            chunks.put(formatter.send(None))
+    finally:
+        __stop_writers(writers)
+
+    if len(errors) > 0:
+        raise errors[0]
+
+
+def get_part_path(file_path: str, part: int) -> str:
+    """Give the file path of a part of a split output, the part number is added before the extensions.
+
+    Args:
+        file_path (str): Path of the output, e.g. `books.jsonl.gz`.
+        part (int): Part number.
+
+    Returns:
+        str: Path of the part, e.g. `books-00001.jsonl.gz`.
+    """
+    name, extension = os.path.splitext(file_path)
+    if extension.lower() in EXTENSIONS:
+        name, format = os.path.splitext(name)
+        extension = format + extension
+    return f'{name}-{part:05d}{extension}'
+
+
+def to_jsonl(tree: Dict[str, Any], file_path: str, level: str, include_ancestors: bool = False, files: int = 1,
+             key: str = None, compression: str = 'infer'):
+    """Serialize the nodes of a tree level as JSON Lines, a record by line.
+
+    Each node selected by the `level` xpath is written as a compact JSON object on its own line.
+    The tree is walked once by `treebuilder.traversal.iter_events`, and only the current record
+    and a few batches of lines by file are held in memory.
+
+    The records can be split into several files, named by `get_part_path` e.g. `books-00000.jsonl`,
+    so they can be read in parallel. They are dealt in turns, or by a hash of their `key` entry
+    so the records with the same key are in the same file. The hash is stable between runs.
+    Each file is written, and compressed when asked, by its own thread.
+
+    Args:
+        tree (Dict[str, Any]): The tree to serialize.
+        file_path (str): JSON Lines file path
+        level (str): Xpath of the records, filters are supported e.g. `bookstore/book[price>10]`.
+        include_ancestors (bool, optional): Add the leaves and attributes of the ancestors to each
+            record, named by their xpath e.g. `bookstore/@city`. Defaults to False.
+        files (int, optional): Number of files to split the records into. Defaults to 1.
+        key (str, optional): Entry of the records to split them by hash, None to deal them in turns.
+            Defaults to None.
+        compression (str, optional): `gzip`, `bz2`, `zstd`, None or `infer` to deduce it
+            from the file extension. Defaults to 'infer'.
+
+    Examples:
+        >>> from treebuilder.export import to_jsonl
+        >>> tree = {'bookstore': [{'book': [{'title': 'Sapiens'}, {'title': 'Harry Potter'}]}]}
+        >>> to_jsonl(tree, 'books.jsonl.gz', 'bookstore/book', files=2)
+    """
+    if files < 1:
+        raise Exception(f'At least one file is expected, but was: {files}')
+    if files == 1:
+        export(tree, [jsonl_sink(file_path, level, include_ancestors=include_ancestors, compression=compression)])
+        return
+
+    import zlib
+
+    records = format_records(level, include_ancestors=include_ancestors)
+    next(records)
+
+    errors, count = [], 0
+    writers = __start_writers([(get_part_path(file_path, x), compression) for x in range(files)], errors)
+    try:
+        for events in __iter_batches(tree, errors):
+            parts = [[] for _ in range(files)]
+            for node, line in records.send(events):
+                if key is None:
+                    part, count = count, (count + 1) % files
+                else:
+                    part = zlib.crc32(str(node.get(key)).encode()) % files
+                parts[part].append(line)
+
+            for (chunks, _), lines in zip(writers, parts):
+                if len(lines) > 0:
+                    chunks.put(''.join(lines))
+    finally:
+        __stop_writers(writers)
+
+    if len(errors) > 0:
+        raise errors[0]
@@ -1,35 +1,278 @@
-from typing import Any, Dict
-from collections import deque
+from typing import Any, Dict, Generator, Iterator, List, Tuple
 import json
+import math
+from json.encoder import encode_basestring_ascii
+
+from treebuilder.compression import get_compression, write_compressed
+from treebuilder.constants import ATTRIBUTES
+from treebuilder.traversal import compile_xpath, filter_items, is_node_list, iter_formatted, walk, OPEN, CLOSE, LEAF, LIST, END_LIST
 
 
 def to_json_tree(tree: Dict[str, Any], root: str = None) -> Dict[str, Any]:
     
     json_root = {}
-    
-    stack = deque()
-    stack.append((tree, json_root))
-    while len(stack) > 0:
-        data, json_node = stack.pop()
-
-        for entry in data:
-            item = data[entry]
-
-            if isinstance(item, list): # It's a node
-                if len(item) == 1:
-                    child = {}
-                    json_node[entry] = child
-                    stack.append((item[0], child))
-                else: 
-                    children = [{} for i in range(len(item))]
-                    json_node[entry] = children
-                    [stack.append((x, child)) for x, child in zip(item, children)]
-            else: # It's a leaf
-                json_node[entry] = data[entry]
 
+    def visit_nodes(entry, nodes, json_node):
+        # A node with a single child is written as an object, otherwise as an array
+        children = [{} for _ in nodes]
+        json_node[entry] = children[0] if len(children) == 1 else children
+        return children
+
+    def visit_leaf(entry, value, json_node):
+        json_node[entry] = value
+
+    walk(tree, json_root, visit_nodes, visit_leaf)
     return json_root
 
 
+__FLAT_TYPES = (str, int, bool, type(None))
+
+
+def __encode_leaf(value: Any, encoder: json.JSONEncoder) -> str:
+    # Shortcuts the encoder for the common scalars, it goes through its python implementation when indented
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if type(value) is int:
+        return int.__repr__(value)
+    if type(value) is float and math.isfinite(value):
+        return float.__repr__(value)
+    if type(value) is dict and all(type(k) is str and type(v) in __FLAT_TYPES for k, v in value.items()):
+        # Flat dictionaries, like the attributes, are written like the encoder does
+        if len(value) == 0:
+            return '{}'
+        items = [encode_basestring_ascii(k) + ': ' + __encode_leaf(v, encoder) for k, v in value.items()]
+        if encoder.indent is None:
+            return '{' + ', '.join(items) + '}'
+        return '{\n' + encoder.indent + (',\n' + encoder.indent).join(items) + '\n}'
+    return encoder.encode(value)
+
+
+def iter_json(tree: Dict[str, Any], root: str = None, pretty: bool = True) -> Iterator[str]:
+    """Serialize a tree as a stream of JSON text pieces.
+
+    The pieces are formatted by `format_json` while walking the tree, so neither the 
+    intermediate json tree nor the whole document are held in memory. Joined together 
+    they give the same document than `to_json_string`.
+
+    Args:
+        tree (Dict[str, Any]): The tree to serialize.
+        root (str, optional): Not used, kept for symmetry with `to_json_string`.
+        pretty (bool, optional): Define if you want a human reading output or not. Defaults to True.
+
+    Returns:
+        Iterator[str]: JSON text pieces.
+    """
+    return iter_formatted(tree, format_json(pretty=pretty))
+
+
+def __encode_array(values: List[Any], level: int, pretty: bool, separator: str, encoder: json.JSONEncoder) -> str:
+    # A list of leaves is written like a container, with an item by line when pretty
+    if len(values) == 0:
+        return '[]'
+
+    pieces = ['[']
+    for i, value in enumerate(values):
+        prefix = '' if i == 0 else separator
+        if pretty:
+            prefix += '\n' + '\t' * (level + 1)
+        if isinstance(value, list):
+            text = __encode_array(value, level + 1, pretty, separator, encoder)
+        else:
+            text = __encode_leaf(value, encoder)
+            if pretty and '\n' in text:
+                text = text.replace('\n', '\n' + '\t' * (level + 1))
+        pieces.append(prefix + text)
+    pieces.append('\n' + '\t' * level + ']' if pretty else ']')
+    return ''.join(pieces)
+
+
+def format_json(pretty: bool = True) -> Generator[str, List[Tuple[int, str, Any]], None]:
+    """Format the events of `treebuilder.traversal.iter_events` as JSON text pieces.
+
+    It's a generator which gives the document opening when it's started, then the text 
+    of each list of events sent, and the document closing once None is sent. `iter_json` 
+    drives it with the events of a single tree, the walk can also be shared between 
+    serializations, see `treebuilder.export`. Events are sent by lists to save a generator 
+    switch by event.
+
+    Args:
+        pretty (bool, optional): Define if you want a human reading output or not. Defaults to True.
+
+    Returns:
+        Generator[str, List[Tuple[int, str, Any]], None]: The JSON texts.
+    """
+    indent, separator = ('\t', ',') if pretty else (None, ', ')
+    encoder = json.JSONEncoder(indent=indent)
+
+    # A frame by open container as [closing, is_empty, is_array]
+    frames = [['}', True, False]]
+    # Encoded keys and line paddings by level are reused
+    keys, paddings = {}, ['\n']
+    events = yield '{'
+    while events is not None:
+        pieces = []
+        for kind, entry, item in events:
+            if kind == CLOSE or kind == END_LIST:
+                if kind == CLOSE or len(item) != 1: # A node list with a single node is written as its node
+                    closing, is_empty, _ = frames.pop()
+                    pieces.append(closing if is_empty or not pretty else paddings[len(frames)] + closing)
+                continue
+
+            if kind == LIST and len(item) == 1:
+                continue
+
+            frame, level = frames[-1], len(frames)
+            prefix = '' if frame[1] else separator
+            if pretty:
+                if level == len(paddings):
+                    paddings.append('\n' + '\t' * level)
+                prefix += paddings[level]
+            if not frame[2]:
+                key = keys.get(entry)
+                if key is None:
+                    key = keys[entry] = __encode_leaf(entry, encoder) + ': '
+                prefix += key
+            frame[1] = False
+
+            if kind == LEAF:
+                if isinstance(item, list):
+                    pieces.append(prefix + __encode_array(item, level, pretty, separator, encoder))
+                else:
+                    text = __encode_leaf(item, encoder)
+                    if pretty and '\n' in text:
+                        text = text.replace('\n', paddings[level])
+                    pieces.append(prefix + text)
+            elif kind == OPEN:
+                frames.append(['}', True, False])
+                pieces.append(prefix + '{')
+            else:
+                frames.append([']', True, True])
+                pieces.append(prefix + '[')
+
+        events = yield ''.join(pieces)
+
+    # The root frame is closed
+    yield '}' if frames[0][1] or not pretty else '\n}'
+
+
+def __get_ancestor_fields(node: Dict[str, Any], prefix: str) -> List[Tuple[int, str, Any]]:
+    # Leaves and attributes of an ancestor as leaf events named by their xpath
+    fields = []
+    for entry, item in node.items():
+        if entry == ATTRIBUTES:
+            fields.extend((LEAF, f'{prefix}@{attribute}', value) for attribute, value in item.items())
+        elif not is_node_list(item):
+            fields.append((LEAF, f'{prefix}{entry}', item))
+    return fields
+
+
+def format_records(level: str, include_ancestors: bool = False) -> Generator[List[Tuple[Dict[str, Any], str]], List[Tuple[int, str, Any]], None]:
+    """Format the nodes of a level from the events of `treebuilder.traversal.iter_events` as JSON lines.
+
+    Each node selected by the `level` xpath is a record written as a compact JSON object,
+    like `format_json` writes the tree root, ended by a new line. Only the events of the
+    current record are held in memory. The protocol is the one of `format_json`, but each
+    batch of events gives the list of the records closed by it, as (node, line) tuples.
+
+    Args:
+        level (str): Xpath of the records, filters are supported e.g. `bookstore/book[price>10]`.
+        include_ancestors (bool, optional): Add the leaves and attributes of the ancestors to each
+            record, named by their xpath e.g. `bookstore/@city`. Defaults to False.
+
+    Returns:
+        Generator[List[Tuple[Dict[str, Any], str]], List[Tuple[int, str, Any]], None]: The records.
+    """
+    steps = [x for x in compile_xpath(level) if x is not None]
+    if len(steps) == 0:
+        raise Exception(f'A level xpath is expected, but was: {level}')
+    paths = ['/'.join(x[0] for x in steps[0:i + 1]) + '/' for i in range(len(steps))]
+
+    # Number of level steps matched by each open node, -1 out of the level path, with the ancestor
+    # fields, and [matched steps, filter flags, node index] by open node list
+    nodes, lists = [(0, [])], []
+    record, header, node, depth, buffer = None, '', None, 0, []
+
+    events = yield []
+    while events is not None:
+        records = []
+        for event in events:
+            kind, entry, item = event
+
+            if record is not None: # Events of a record are given to its formatter once it's closed
+                if kind == OPEN:
+                    depth += 1
+                elif kind == CLOSE:
+                    if depth == 0:
+                        records.append((node, header + record.send(buffer) + record.send(None) + '\n'))
+                        record, node, buffer = None, None, []
+                        continue
+                    depth -= 1
+                buffer.append(event)
+                continue
+
+            if kind == LIST:
+                matched = nodes[-1][0]
+                if 0 <= matched < len(steps) and entry == steps[matched][0]:
+                    filter = steps[matched][1]
+                    lists.append([matched, filter_items(list(item), filter) if filter is not None else None, 0])
+                else:
+                    lists.append([-1, None, 0])
+            elif kind == END_LIST:
+                lists.pop()
+            elif kind == OPEN:
+                frame = lists[-1]
+                matched, flags, index = frame
+                frame[2] += 1
+                if matched < 0 or (flags is not None and not flags[index]):
+                    nodes.append((-1, None))
+                elif matched + 1 < len(steps):
+                    fields = nodes[-1][1]
+                    if include_ancestors:
+                        fields = fields + __get_ancestor_fields(item, paths[matched])
+                    nodes.append((matched + 1, fields))
+                else:
+                    record, node, depth = format_json(pretty=False), item, 0
+                    header = next(record)
+                    if include_ancestors:
+                        buffer.extend(nodes[-1][1])
+            elif kind == CLOSE:
+                nodes.pop()
+
+        events = yield records
+
+    yield []
+
+
+def format_jsonl(level: str, include_ancestors: bool = False) -> Generator[str, List[Tuple[int, str, Any]], None]:
+    """Format the events of `treebuilder.traversal.iter_events` as JSON Lines.
+
+    Each node selected by the `level` xpath is written on its own line, see `format_records`.
+    The protocol is the one of `format_json`.
+
+    Args:
+        level (str): Xpath of the records, filters are supported e.g. `bookstore/book[price>10]`.
+        include_ancestors (bool, optional): Add the leaves and attributes of the ancestors to each
+            record, named by their xpath e.g. `bookstore/@city`. Defaults to False.
+
+    Returns:
+        Generator[str, List[Tuple[int, str, Any]], None]: The JSON Lines texts.
+    """
+    records = format_records(level, include_ancestors=include_ancestors)
+    next(records)
+
+    events = yield ''
+    while events is not None:
+        events = yield ''.join(x for _, x in records.send(events))
+
+    yield ''
+
+
 def to_json_string(tree: Dict[str, Any], root: str = None, pretty: bool = True) -> str:
     tree = to_json_tree(tree, root)
     if pretty:
@@ -37,7 +280,24 @@ def to_json_string(tree: Dict[str, Any], root: str = None, pretty: bool = True)
     return json.dumps(tree)
 
 
-def to_json(tree: Dict, file_path: str, root: str = None, pretty: bool = True):
+def to_json(tree: Dict, file_path: str, root: str = None, pretty: bool = True, compression: str = 'infer'):
+    """Serialize a tree to a JSON file.
+
+    A compressed file is written from `iter_json` while a background thread compresses it.
+
+    Args:
+        tree (Dict[str, Any]): The tree to serialize.
+        file_path (str): JSON file path
+        root (str, optional): Additional json root if needed. Defaults to None.
+        pretty (bool, optional): Define if you want a human reading output or not. Defaults to True.
+        compression (str, optional): `gzip`, `bz2`, `zstd`, None or `infer` to deduce it 
+            from the file extension. Defaults to 'infer'.
+    """
+    compression = get_compression(file_path, compression)
+    if compression is not None:
+        write_compressed(iter_json(tree, root=root, pretty=pretty), file_path, compression)
+        return
+
     json_string = to_json_string(tree, root=root, pretty=pretty)
     with open(file_path, mode='w') as f:
         f.write(json_string)
\ No newline at end of file
@@ -0,0 +1,142 @@
+from typing import TYPE_CHECKING, Any, Dict
+import json
+import os
+
+from treebuilder.constants import ATTRIBUTES, DEFAULT_BATCH_SIZE, SCALARS
+from treebuilder.traversal import is_node_list
+
+if TYPE_CHECKING:
+    import sqlite3
+
+
+ID, PARENT_ID = '_id', '_parent_id'
+
+# SQLite compares table and column names ignoring the case of ASCII letters only
+__FOLD = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+
+def __quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def __unique_name(name: str, names: set) -> str:
+    # A name already used under another case is suffixed by its rank, e.g. `title~2`
+    candidate, rank = name, 1
+    while candidate.translate(__FOLD) in names:
+        rank += 1
+        candidate = f'{name}~{rank}'
+    names.add(candidate.translate(__FOLD))
+    return candidate
+
+
+def __to_column(value: Any) -> Any:
+    if type(value) in SCALARS:
+        return value
+    return json.dumps(value) # Lists and dictionaries of leaves are stored as JSON text
+
+
+def __new_table(name: str) -> Dict[str, Any]:
+    # Rows waiting to be written, columns map the entries to their column names once the table is created
+    return { 'name': name, 'next_id': 1, 'columns': None, 'names': set((ID, PARENT_ID)), 'rows': [] }
+
+
+def __flush(connection: 'sqlite3.Connection', table: Dict[str, Any]):
+    name = __quote(table['name'])
+    if table['columns'] is None:
+        connection.execute(f'CREATE TABLE {name} ({ID} INTEGER PRIMARY KEY, {PARENT_ID} INTEGER)')
+        table['columns'] = {}
+
+    # Rows of a level have usually the same entries, so they are inserted by groups of same entries
+    groups = {}
+    for node_id, parent_id, row in table['rows']:
+        groups.setdefault(tuple(row), []).append((node_id, parent_id, *row.values()))
+
+    for entries, rows in groups.items():
+        columns = [ID, PARENT_ID]
+        for entry in entries:
+            column = table['columns'].get(entry)
+            if column is None:
+                column = table['columns'][entry] = __unique_name(entry, table['names'])
+                connection.execute(f'ALTER TABLE {name} ADD COLUMN {__quote(column)}')
+            columns.append(column)
+        statement = f'INSERT INTO {name} ({", ".join(__quote(x) for x in columns)}) VALUES ({", ".join("?" * len(columns))})'
+        connection.executemany(statement, rows)
+    table['rows'] = []
+
+
+def to_sqlite(tree: Dict[str, Any], file_path: str, batch_size: int = DEFAULT_BATCH_SIZE):
+    """Export a tree as relational tables into a SQLite database.
+
+    The tree is shredded in one table by xpath level, named by its xpath from the root,
+    e.g. `bookstore/book`. Each node is a row with a surrogate `_id`, the `_id` of its
+    parent node in `_parent_id`, NULL for the root level, a column by leaf and a column
+    by attribute prefixed by `@`. Leaves which are lists or dictionaries are stored as JSON text.
+    SQLite names ignore the case, so a table or a column whose name is already used under
+    another case, or a leaf named `_id` or `_parent_id`, is suffixed by its rank, e.g. `title~2`.
+
+    The rows are written by batches of prepared statements, one transaction by batch.
+    Columns are added as they are met, and the `_parent_id` columns are indexed at the end.
+    The leaves of the tree root are not exported, only its nodes.
+
+    Args:
+        tree (Dict[str, Any]): The tree to export.
+        file_path (str): SQLite database path, an existing file is replaced.
+        batch_size (int, optional): Number of rows written by transaction. Defaults to 50000.
+
+    Examples:
+        >>> from treebuilder.sqlite import to_sqlite
+        >>> to_sqlite({'bookstore': [{'book': [{'title': 'Sapiens', '__ATTRIBUTES__': {'lang': 'en'}}]}]}, 'bookstore.db')
+    """
+    import sqlite3
+
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+    connection = sqlite3.connect(file_path)
+    try:
+        # The database is written once from scratch, a failed export is done again
+        connection.execute('PRAGMA journal_mode = OFF')
+        connection.execute('PRAGMA synchronous = OFF')
+
+        # The node lists to export are stacked with their table name and their parent id
+        tables, names, pending, scalars = {}, set(), 0, frozenset(SCALARS)
+        stack = [(entry, None, item) for entry, item in tree.items() if entry != ATTRIBUTES and is_node_list(item)]
+        while len(stack) > 0:
+            name, parent_id, nodes = stack.pop()
+            table = tables.get(name)
+            if table is None:
+                table = tables[name] = __new_table(__unique_name(name, names))
+
+            rows, next_id = table['rows'], table['next_id']
+            for node in nodes:
+                row = {}
+                for entry, item in node.items():
+                    # Scalars are checked first by type, they are most of the entries
+                    if type(item) in scalars:
+                        row[entry] = item
+                    elif entry == ATTRIBUTES:
+                        for attribute, value in item.items():
+                            row[f'@{attribute}'] = __to_column(value)
+                    elif is_node_list(item):
+                        stack.append((f'{name}/{entry}', next_id, item))
+                    else:
+                        row[entry] = __to_column(item)
+                rows.append((next_id, parent_id, row))
+                next_id += 1
+
+            pending += next_id - table['next_id']
+            table['next_id'] = next_id
+            if pending >= batch_size:
+                with connection:
+                    for x in tables.values():
+                        __flush(connection, x)
+                pending = 0
+
+        with connection:
+            # Indexes share the namespace of the tables, their names are made unique the same way
+            for table in tables.values():
+                __flush(connection, table)
+                index = __unique_name(f'{table["name"]}/{PARENT_ID}', names)
+                connection.execute(f'CREATE INDEX {__quote(index)} ON {__quote(table["name"])} ({PARENT_ID})')
+    finally:
+        connection.close()
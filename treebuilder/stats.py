@@ -0,0 +1,123 @@
+from typing import Any, Dict, Hashable
+import sys
+
+from treebuilder.constants import ATTRIBUTES
+from treebuilder.cross import FactorizedCross
+
+
+def __new_level() -> Dict[str, int]:
+    return { 'nodes': 0, 'leaves': 0, 'distinct_values': 0, 'bytes': 0, 'duplicate_bytes': 0 }
+
+
+def __sizeof(value: Any) -> int:
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(__sizeof(x) for x in value.values())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(__sizeof(x) for x in value)
+    return size
+
+
+def __distinct_key(value: Any) -> Hashable:
+    # Hashable is true for a tuple holding a list, only hash tells it
+    try:
+        hash(value)
+    except TypeError:
+        return (type(value), repr(value))
+    return (type(value), value)
+
+
+def __add_leaf(stats: Dict[str, Dict[str, int]], seen: Dict[str, Dict[Hashable, int]], path: str, value: Any):
+    level = stats.get(path)
+    if level is None:
+        level = stats[path] = __new_level()
+        seen[path] = {}
+
+    size = __sizeof(value)
+    level['leaves'] += 1
+    level['bytes'] += size
+
+    # Equal values held by different objects, e.g. deep copies of a list, could be shared
+    key, values = __distinct_key(value), seen[path]
+    if key not in values:
+        values[key] = id(value)
+        level['distinct_values'] += 1
+    elif values[key] != id(value):
+        level['duplicate_bytes'] += size
+
+
+def memory_stats(tree: Dict[str, Any], depth: int = None) -> Dict[str, Dict[str, int]]:
+    """Measure the memory used by each xpath level of a tree in a single walk.
+
+    Each level reports its number of `nodes` and `leaves`, the number of `distinct_values`
+    of its leaves, an approximation of the `bytes` it holds and the `duplicate_bytes`
+    used by leaves equal to a previous leaf of the level but held by another object,
+    like deep copies of mutable values.
+
+    A node level counts the node dictionaries, their list and their attributes dictionary.
+    Leaves and attributes (`@name`) have their own levels. The keys are not counted,
+    they are shared between the nodes.
+
+    A factorized cross is counted as stored: the source nodes and the crossed values,
+    not the `S x V` nodes it represents.
+
+    Args:
+        tree (Dict[str, Any]): The tree to measure.
+        depth (int, optional): Deepest level reported, starting at 1 for the root. The deeper 
+            levels are added to their ancestor at this depth. Defaults to None for all levels.
+
+    Returns:
+        Dict[str, Dict[str, int]]: Statistics by xpath level, in the walk order.
+
+    Examples:
+        >>> from treebuilder.stats import memory_stats
+        >>> tree = {'bookstore': [{'book': [{'title': 'Sapiens'}, {'title': 'Harry Potter'}]}]}
+        >>> stats = memory_stats(tree)
+        >>> print(stats['/bookstore/book'])
+        >>> print(stats['/bookstore/book/title'])
+    """
+    if depth is not None and depth < 1:
+        raise Exception(f'Depth has to be greater than 0, but was: {depth}')
+
+    stats, seen = {}, {}
+
+    stack = [(tree, '', 0)]
+    while len(stack) > 0:
+        node, path, level = stack.pop()
+
+        for entry, item in node.items():
+            child_path = path if depth is not None and level >= depth else f'{path}/{entry}'
+
+            if entry == ATTRIBUTES:
+                stats[path]['bytes'] += sys.getsizeof(item)
+                for name, value in item.items():
+                    attribute_path = path if depth is not None and level >= depth else f'{path}/@{name}'
+                    __add_leaf(stats, seen, attribute_path, value)
+                continue
+
+            if not isinstance(item, (list, FactorizedCross)): # It's a leaf
+                __add_leaf(stats, seen, child_path, item)
+                continue
+
+            if child_path not in stats:
+                stats[child_path] = __new_level()
+                seen[child_path] = {}
+
+            # Stored items of a factorized cross are its source and its values
+            while isinstance(item, FactorizedCross):
+                stats[child_path]['bytes'] += sys.getsizeof(item) + sys.getsizeof(item.values)
+                value_path = child_path if depth is not None and level + 1 >= depth else f'{child_path}/{item.entry}'
+                for value in item.values:
+                    __add_leaf(stats, seen, value_path, value)
+                item = item.source
+
+            stats[child_path]['bytes'] += sys.getsizeof(item)
+            for x in reversed(item):
+                if isinstance(x, dict):
+                    stats[child_path]['nodes'] += 1
+                    stats[child_path]['bytes'] += sys.getsizeof(x)
+                    stack.append((x, child_path, level + 1))
+                else:
+                    __add_leaf(stats, seen, child_path, x)
+
+    return stats
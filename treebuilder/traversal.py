@@ -0,0 +1,218 @@
+from typing import Any, Callable, Dict, Generator, Iterator, List, Tuple
+from functools import lru_cache
+
+from treebuilder.cross import FactorizedCross
+
+
+def to_number(x: Any) -> Any:
+    """Read a value as a number, numbers stored as text included.
+
+    Args:
+        x (Any): The value.
+
+    Returns:
+        Any: The number, None when the value isn't a number, e.g. a boolean even if True == 1.
+    """
+    if type(x) is bool:
+        return None
+    if isinstance(x, (int, float)):
+        return x
+    if isinstance(x, str):
+        try:
+            return float(x)
+        except ValueError:
+            pass
+    return None
+
+
+def split_step(step: str) -> Tuple[str, str]:
+    """Split a xpath step into its tag and its filter.
+
+    Args:
+        step (str): The xpath step, e.g. `book[title=Sapiens]`.
+
+    Returns:
+        Tuple[str, str]: The tag and the filter, None without filter.
+    """
+    split = step.split('[')
+    tag, filter = split[0], None
+
+    if len(split) > 1 and split[-1].endswith(']'):
+        split[-1] = split[-1][0:-1]
+        filter = '['.join(split[1:len(split)])
+
+    return tag, filter
+
+
+# Created on first use, so threading isn't imported without filters
+__local = None
+
+
+def filter_items(items: List[Dict[str, Any]], syntax: str) -> List[bool]:
+    """Evaluate a xpath filter on a node list.
+
+    Args:
+        items (List[Dict[str, Any]]): The node list.
+        syntax (str): The filter, e.g. `title=Sapiens and @lang=en`.
+
+    Returns:
+        List[bool]: True for each selected node.
+    """
+    # Lexer and parser keep a parsing state, so each thread uses its own instances
+    global __local
+    if __local is None:
+        import threading
+        __local = threading.local()
+
+    local = __local
+    if not hasattr(local, 'parser'):
+        # Imported on first use, sly builds the parsing tables when the parser class is created
+        from treebuilder.FilterLexer import FilterLexer
+        from treebuilder.FilterParser import FilterParser
+        local.lexer, local.parser = FilterLexer(), FilterParser()
+
+    local.parser.items = items
+    tokens = local.lexer.tokenize(syntax)
+    return local.parser.parse(tokens)
+
+
+@lru_cache(maxsize=1024)
+def compile_xpath(xpath: str) -> Tuple[Tuple[str, str]]:
+    """Compile a xpath into its steps plan.
+
+    The plan has a (tag, filter) pair by `/` separated step, or None for an empty step.
+    Plans are cached, so the walks don't parse the steps again for each visited node.
+
+    Args:
+        xpath (str): The xpath to compile.
+
+    Returns:
+        Tuple[Tuple[str, str]]: The steps plan.
+    """
+    return tuple(split_step(x) if x != '' else None for x in xpath.split('/'))
+
+
+def is_node_list(value: Any) -> bool:
+    """Tell if an item of a node is a node list, otherwise it's a leaf.
+
+    A list of leaves is a leaf, lists are not mixed so the first item tells it.
+
+    Args:
+        value (Any): The item.
+
+    Returns:
+        bool: True for a node list, including an empty list and a factorized cross.
+    """
+    return type(value) is FactorizedCross or isinstance(value, list) and (len(value) == 0 or isinstance(value[0], dict))
+
+
+def walk(tree: Dict[str, Any], state: Any, visit_nodes: Callable[[str, List[Dict[str, Any]], Any], List[Any]],
+         visit_leaf: Callable[[str, Any, Any], None], skip: str = None):
+    """Walk all the nodes of a tree, depth first.
+
+    For each entry of a node, `visit_nodes(entry, nodes, state)` is called with the node
+    list and gives the state of each child node, or `visit_leaf(entry, value, state)` with
+    the leaf value. The nodes and their states are kept in two stacks, so nothing is
+    allocated by visited node.
+
+    Args:
+        tree (Dict[str, Any]): The tree to walk.
+        state (Any): State of the tree root, e.g. the output container it's written into.
+        visit_nodes (Callable[[str, List[Dict[str, Any]], Any], List[Any]]): Visits a node list and gives the children states.
+        visit_leaf (Callable[[str, Any, Any], None]): Visits a leaf.
+        skip (str, optional): Entry which is not visited. Defaults to None.
+    """
+    nodes, states = [tree], [state]
+    while len(nodes) > 0:
+        node, state = nodes.pop(), states.pop()
+
+        for entry, item in node.items():
+            if entry == skip:
+                continue
+
+            # FactorizedCross is checked by type, an abstract class check is slow
+            if isinstance(item, list) or type(item) is FactorizedCross: # It's a node
+                if type(item) is FactorizedCross: # Its items are built once for both visits
+                    item = list(item)
+                children = visit_nodes(entry, item, state)
+                nodes.extend(item)
+                states.extend(children)
+            else: # It's a leaf
+                visit_leaf(entry, item, state)
+
+
+# Events of `iter_events`
+OPEN, CLOSE, LEAF, LIST, END_LIST = range(5)
+
+
+def iter_events(tree: Dict[str, Any]) -> Iterator[Tuple[int, str, Any]]:
+    """Walk all the nodes of a tree in the document order as a stream of events.
+
+    Each event is a (kind, entry, item) tuple:
+    `LIST` and `END_LIST` surround a node list with the list as item,
+    `OPEN` and `CLOSE` surround a node with the node as item,
+    and `LEAF` gives a leaf value, including the attributes dictionary.
+
+    A list is a node list when its first item is a node. Factorized crosses are iterated
+    without being materialized. Several serializations can be driven by the same events,
+    see `treebuilder.export`.
+
+    Args:
+        tree (Dict[str, Any]): The tree to walk.
+
+    Returns:
+        Iterator[Tuple[int, str, Any]]: The events.
+    """
+    # Each frame iterates either the entries of a node or the nodes of a list
+    stack = [(False, iter(tree.items()), None)]
+    while len(stack) > 0:
+        is_list, children, closing = stack[-1]
+        child = next(children, None)
+
+        if child is None:
+            stack.pop()
+            if closing is not None:
+                yield closing
+            continue
+
+        if is_list: # It's a node of the list
+            entry = closing[1]
+            yield OPEN, entry, child
+            stack.append((False, iter(child.items()), (CLOSE, entry, child)))
+            continue
+
+        entry, item = child
+        if is_node_list(item):
+            yield LIST, entry, item
+            stack.append((True, iter(item), (END_LIST, entry, item)))
+        else:
+            yield LEAF, entry, item
+
+
+def iter_formatted(tree: Dict[str, Any], formatter: Generator[str, List[Tuple[int, str, Any]], None], 
+                   batch_size: int = 256) -> Iterator[str]:
+    """Walk a tree with `iter_events` and give the texts of a formatter, e.g. `treebuilder.xml.format_xml`.
+
+    Events are sent to the formatter by lists of `batch_size`, it keeps the texts small 
+    enough to be streamed by chunks.
+
+    Args:
+        tree (Dict[str, Any]): The tree to walk.
+        formatter (Generator[str, List[Tuple[int, str, Any]], None]): The formatter of the events, not started.
+        batch_size (int, optional): Number of events sent at once. Defaults to 256.
+
+    Returns:
+        Iterator[str]: The texts of the formatter.
+    """
+    yield next(formatter)
+
+    events = []
+    for event in iter_events(tree):
+        events.append(event)
+        if len(events) == batch_size:
+            yield formatter.send(events)
+            events = []
+
+    if len(events) > 0:
+        yield formatter.send(events)
+    yield formatter.send(None)
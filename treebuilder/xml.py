@@ -1,9 +1,15 @@
-from collections import deque
-from typing import Any, Dict
-from xml.etree.ElementTree import ElementTree, Element, SubElement, tostring
-from xml.dom import minidom
+from typing import TYPE_CHECKING, Any, Dict, Generator, Iterator, List, Tuple
 
 from treebuilder.constants import ATTRIBUTES
+from treebuilder.compression import get_compression, write_compressed
+from treebuilder.cross import FactorizedCross
+from treebuilder.traversal import iter_formatted, walk, OPEN, CLOSE, LEAF
+
+if TYPE_CHECKING:
+    from xml.etree.ElementTree import ElementTree
+
+BACKENDS = ('stdlib', 'lxml')
+
 
 def __to_xml_text(x):
     if type(x) is bool:
@@ -11,7 +17,120 @@ def __to_xml_text(x):
     return str(x)
 
 
-def to_xml_tree(tree: Dict[str, Any], root: str = None) -> ElementTree:
+def __escape_text(x: str, pretty: bool) -> str:
+    x = x.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    if pretty: # Like minidom, which also gives a re-parsed text where \r are read as \n
+        x = x.replace('"', '&quot;')
+        if '\r' in x:
+            x = x.replace('\r\n', '\n').replace('\r', '\n')
+    return x
+
+
+def __escape_attribute(x: str) -> str:
+    # Like ElementTree, white spaces are kept as character references, otherwise a parser normalizes them
+    x = x.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+    return x.replace('\r', '&#13;').replace('\n', '&#10;').replace('\t', '&#09;')
+
+
+def __to_ascii(x: str, pretty: bool) -> str:
+    # Like ElementTree, the compact output is ascii with the other characters as references, minidom keeps them
+    return x if pretty else x.encode('ascii', 'xmlcharrefreplace').decode('ascii')
+
+
+def __format_attributes(node: Dict[str, Any]) -> str:
+    if ATTRIBUTES not in node:
+        return ''
+    return ''.join(f' {k}="{__escape_attribute(__to_xml_text(v))}"' for k, v in node[ATTRIBUTES].items())
+
+
+def __iter_children(data: Dict[str, Any]) -> Iterator[Tuple[str, Any, bool]]:
+    for entry, item in data.items():
+        if entry == ATTRIBUTES:
+            continue
+
+        if isinstance(item, (list, FactorizedCross)): # It's a node
+            for x in item:
+                yield entry, x, True
+        else: # It's a leaf
+            yield entry, item, False
+
+
+def iter_xml(tree: Dict[str, Any], root: str = None, pretty: bool = True) -> Iterator[str]:
+    """Serialize a tree as a stream of XML text pieces.
+
+    The pieces are formatted by `format_xml` while walking the tree, so the whole document 
+    is never held in memory. Joined together they give the same document than `to_xml_string`,
+    except for the new lines, carriage returns and tabs of the attribute values once pretty:
+    they are written as character references so they are not lost when the document is parsed,
+    where `minidom` writes them as they are. Like `to_xml_string`, the compact document is ascii,
+    the other characters are written as character references.
+
+    Args:
+        tree (Dict[str, Any]): The tree to serialize.
+        root (str, optional): Additional xml root if needed. Defaults to None.
+        pretty (bool, optional): Define if you want a human reading output or not. Defaults to True.
+
+    Returns:
+        Iterator[str]: XML text pieces.
+    """
+    return iter_formatted(tree, format_xml(tree, root=root, pretty=pretty))
+
+
+def format_xml(tree: Dict[str, Any], root: str = None, pretty: bool = True) -> Generator[str, List[Tuple[int, str, Any]], None]:
+    """Format the events of `treebuilder.traversal.iter_events` as XML text pieces.
+
+    It's a generator which gives the XML header when it's started, then the text of each
+    list of events sent, and the XML footer once None is sent. `iter_xml` drives it with 
+    the events of a single tree, the walk can also be shared between serializations, see 
+    `treebuilder.export`. Events are sent by lists to save a generator switch by event.
+
+    Args:
+        tree (Dict[str, Any]): The tree which is walked.
+        root (str, optional): Additional xml root if needed. Defaults to None.
+        pretty (bool, optional): Define if you want a human reading output or not. Defaults to True.
+
+    Returns:
+        Generator[str, List[Tuple[int, str, Any]], None]: The XML texts.
+    """
+    if root is None and len(tree) > 1:
+        raise Exception(f'Xml root has to be unique, but was: {tree.keys()}')
+
+    indent, newline, empty = ('\t', '\n', '/>') if pretty else ('', '', ' />')
+
+    header, depth = '<?xml version="1.0" ?>\n' if pretty else '', 0
+    if root is not None:
+        header += f'<{root}>{newline}'
+        depth = 1
+
+    # True by open node when it has been written with children, so it has a closing tag
+    opened = []
+    events = yield __to_ascii(header, pretty)
+    while events is not None:
+        pieces = []
+        for kind, entry, item in events:
+            if kind == OPEN:
+                padding = indent * (depth + len(opened))
+                has_children = len(item) > (1 if ATTRIBUTES in item else 0)
+                pieces.append(f'{padding}<{entry}{__format_attributes(item)}{">" if has_children else empty}{newline}')
+                opened.append(has_children)
+            elif kind == CLOSE:
+                if opened.pop():
+                    pieces.append(f'{indent * (depth + len(opened))}</{entry}>{newline}')
+            elif kind == LEAF and entry != ATTRIBUTES:
+                padding = indent * (depth + len(opened))
+                text = __to_xml_text(item)
+                if len(text) > 0:
+                    pieces.append(f'{padding}<{entry}>{__escape_text(text, pretty)}</{entry}>{newline}')
+                else:
+                    pieces.append(f'{padding}<{entry}{empty}{newline}')
+
+        events = yield __to_ascii(''.join(pieces), pretty)
+
+    yield __to_ascii(f'</{root}>{newline}', pretty) if root is not None else ''
+
+
+def to_xml_tree(tree: Dict[str, Any], root: str = None) -> 'ElementTree':
+    from xml.etree.ElementTree import Element, SubElement
 
     if root is None:
         if len(tree) > 1:
@@ -20,44 +139,150 @@ def to_xml_tree(tree: Dict[str, Any], root: str = None) -> ElementTree:
     else:
         xml_root = Element(root)
 
-    stack = deque()
-    stack.append((tree, xml_root))
-    while len(stack) > 0:
-        data, xml = stack.pop()
-
-        for entry in data:
-            if entry == ATTRIBUTES:
-                continue
-
-            item = data[entry]
-
-            if isinstance(item, list): # It's a node
-                for x in item:
-                    attributes = x[ATTRIBUTES] if ATTRIBUTES in x else {}
+    def visit_nodes(entry, nodes, xml):
+        nonlocal xml_root
+        children = []
+        for x in nodes:
+            attributes = { k: __to_xml_text(v) for k, v in x[ATTRIBUTES].items() } if ATTRIBUTES in x else {}
+            if xml_root is None:
+                xml_root = xml_child = Element(entry, attrib=attributes)
+            else:
+                xml_child = SubElement(xml, entry, attrib=attributes)
+            children.append(xml_child)
+        return children
 
-                    if xml_root is None:
-                        xml_root = xml_child = Element(entry, attrib=attributes)
-                    else:
-                        xml_child = SubElement(xml, entry, attrib=attributes)
+    def visit_leaf(entry, value, xml):
+        xml_child = SubElement(xml, entry)
+        xml_child.text = __to_xml_text(value)
 
-                    stack.append((x, xml_child))                    
-            else: # It's a leaf
-                xml_child = SubElement(xml, entry)
-                xml_child.text = __to_xml_text(item)
-    
+    walk(tree, xml_root, visit_nodes, visit_leaf, skip=ATTRIBUTES)
     return xml_root
 
 
 def to_xml_string(tree: Dict[str, Any], root: str = None, pretty: bool = True) -> str:
+    from xml.etree.ElementTree import tostring
     xml = to_xml_tree(tree, root)
     xml_string = tostring(xml)
     if pretty:
+        from xml.dom import minidom
         reparsed = minidom.parseString(xml_string)
         return reparsed.toprettyxml(indent='\t')
     return xml_string
 
 
-def to_xml(tree: Dict, file_path: str, root: str = None, pretty: bool = True):
+def __get_backend(backend: str) -> str:
+    if backend is None: # lxml is opt-in, so the output doesn't depend on the installed packages
+        return 'stdlib'
+    if backend not in BACKENDS:
+        raise Exception(f'Unknown xml backend: {backend}, expected one of {BACKENDS}')
+    return backend
+
+
+def __to_xml_stdlib(tree: Dict[str, Any], file_path: str, root: str, pretty: bool):
     xml_string = to_xml_string(tree, root=root, pretty=pretty)
+    if isinstance(xml_string, bytes):
+        xml_string = xml_string.decode()
     with open(file_path, mode='w') as f:
-        f.write(xml_string)
\ No newline at end of file
+        f.write(xml_string)
+
+
+def __write_lxml_element(xf, etree, tag: str, attributes: Dict[str, str], text: str):
+    if ':' in tag or any(':' in k for k in attributes):
+        # lxml elements reject prefixed names without their namespace uri, the writer accepts them
+        with xf.element(tag, attributes):
+            if len(text) > 0:
+                xf.write(text)
+        return
+    
+    element = etree.Element(tag, attributes)
+    if len(text) > 0:
+        element.text = text
+    xf.write(element)
+
+
+def __to_xml_lxml(tree: Dict[str, Any], file_path: str, root: str, pretty: bool):
+    from lxml import etree
+
+    if root is None and len(tree) > 1:
+        raise Exception(f'Xml root has to be unique, but was: {tree.keys()}')
+
+    indent, newline = ('\t', '\n') if pretty else ('', '')
+
+    with open(file_path, mode='wb') as f:
+        if pretty:
+            f.write(b'<?xml version="1.0" ?>\n')
+
+        with etree.xmlfile(f, encoding='utf-8') as xf:
+            # Elements are opened and closed by hand to walk the tree without recursion
+            element = None
+            if root is not None:
+                element = xf.element(root)
+                element.__enter__()
+                xf.write(newline)
+
+            # Texts can only be written inside the document element
+            depth = 0 if root is None else 1
+            stack = [(__iter_children(tree), element)]
+            while len(stack) > 0:
+                children, element = stack[-1]
+                child = next(children, None)
+
+                if child is None:
+                    stack.pop()
+                    if element is not None:
+                        xf.write(indent * (depth + len(stack) - 1))
+                        element.__exit__(None, None, None)
+                        if len(stack) > 1 - depth:
+                            xf.write(newline)
+                    continue
+
+                entry, item, is_node = child
+                xf.write(indent * (depth + len(stack) - 1))
+
+                if is_node:
+                    attributes = { k: __to_xml_text(v) for k, v in item[ATTRIBUTES].items() } if ATTRIBUTES in item else {}
+                    if len(item) > (1 if ATTRIBUTES in item else 0):
+                        element = xf.element(entry, attributes)
+                        element.__enter__()
+                        xf.write(newline)
+                        stack.append((__iter_children(item), element))
+                        continue
+                    __write_lxml_element(xf, etree, entry, attributes, '')
+                else:
+                    __write_lxml_element(xf, etree, entry, {}, __to_xml_text(item))
+
+                if len(stack) > 1 - depth:
+                    xf.write(newline)
+
+        f.write(newline.encode())
+
+
+def to_xml(tree: Dict, file_path: str, root: str = None, pretty: bool = True, backend: str = None, 
+           compression: str = 'infer'):
+    """Serialize a tree to a XML file.
+
+    The `stdlib` backend builds an `ElementTree` then formats it with `minidom`. 
+    The `lxml` backend writes the elements incrementally while walking the tree, 
+    which is faster and doesn't hold the XML document in memory. Both give the same document 
+    once parsed, but not the same bytes: e.g. lxml writes `<x/>` where the compact stdlib 
+    output has `<x />`, and it doesn't escape quotes in texts.
+
+    A compressed file is written from `iter_xml` while a background thread compresses it,
+    the backend isn't used in this case.
+
+    Args:
+        tree (Dict[str, Any]): The tree to serialize.
+        file_path (str): Xml file path
+        root (str, optional): Additional xml root if needed. Defaults to None.
+        pretty (bool, optional): Define if you want a human reading output or not. Defaults to True.
+        backend (str, optional): XML backend, `stdlib` or `lxml`. Defaults to None for `stdlib`.
+        compression (str, optional): `gzip`, `bz2`, `zstd`, None or `infer` to deduce it 
+            from the file extension. Defaults to 'infer'.
+    """
+    compression = get_compression(file_path, compression)
+    if compression is not None:
+        write_compressed(iter_xml(tree, root=root, pretty=pretty), file_path, compression)
+    elif __get_backend(backend) == 'lxml':
+        __to_xml_lxml(tree, file_path, root, pretty)
+    else:
+        __to_xml_stdlib(tree, file_path, root, pretty)
\ No newline at end of file